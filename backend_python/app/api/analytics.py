@@ -0,0 +1,88 @@
+"""
+API de analytics para dashboards
+Lee los agregados precalculados (sql/005) y cachea cada respuesta por parámetros;
+el cache se limpia cuando el job de refresh encuentra datos nuevos
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from app.schemas.analytics import (
+    DrawerThroughputResponse,
+    QuarantineRateResponse,
+    ScansPerHourResponse,
+    StatusDistributionResponse,
+)
+from app.services.analytics import (
+    analytics_cache,
+    drawer_throughput,
+    quarantine_rates,
+    refresh_analytics,
+    scans_per_hour,
+    status_distribution,
+)
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+async def cached_response(key: tuple, fn, *args):
+    data = analytics_cache.get(key)
+    if data is not None:
+        return {**data, "cached": True}
+    try:
+        data = await run_in_threadpool(fn, *args)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculando analytics: {e}")
+    analytics_cache.set(key, data)
+    return data
+
+@router.get("/scans/hourly", response_model=ScansPerHourResponse)
+async def read_scans_per_hour(
+    hours_back: int = Query(24, ge=1, le=24 * 31),
+    flight_id: Optional[str] = None
+):
+    """Scans por hora (UTC) con desglose valid / warning / expired"""
+    return await cached_response(("scans_hourly", hours_back, flight_id), scans_per_hour, hours_back, flight_id)
+
+@router.get("/expiry/flights", response_model=StatusDistributionResponse)
+async def read_status_distribution(
+    days_back: int = Query(7, ge=1, le=365),
+    flight_ids: Optional[str] = Query(None, description="Lista separada por comas")
+):
+    """Distribución de estados de caducidad por vuelo"""
+    ids = sorted({f.strip() for f in (flight_ids or "").split(",") if f.strip()}) or None
+    return await cached_response(
+        ("status_distribution", days_back, tuple(ids or ())), status_distribution, days_back, ids
+    )
+
+@router.get("/quarantine/products", response_model=QuarantineRateResponse)
+async def read_quarantine_rates(
+    days_back: int = Query(30, ge=1, le=365),
+    min_scans: int = Query(10, ge=1),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Tasa de cuarentena (en cuarentena / escaneados) por producto"""
+    return await cached_response(
+        ("quarantine_rates", days_back, min_scans, limit), quarantine_rates, days_back, min_scans, limit
+    )
+
+@router.get("/drawers/throughput", response_model=DrawerThroughputResponse)
+async def read_drawer_throughput(
+    days_back: int = Query(7, ge=1, le=365),
+    site: Optional[str] = None
+):
+    """Drawers completados por site y día"""
+    return await cached_response(("drawer_throughput", days_back, site), drawer_throughput, days_back, site)
+
+@router.post("/refresh")
+async def trigger_refresh(full: bool = False):
+    """Refresca los agregados ahora (full=true recalcula todo el historial)"""
+    try:
+        result = await run_in_threadpool(refresh_analytics, full)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refrescando analytics: {e}")
+    analytics_cache.invalidate()
+    return {"status": "success", **result}
+
+@router.get("/cache")
+def read_cache_stats():
+    return analytics_cache.stats()
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from app.schemas.assembly import AssemblyEvent, AssemblyEventBatch
+from app.services.change_feed import employee_site
+from app.services.event_bus import event_bus, event_topics
+from app.services.live_metrics import live_metrics
+
+router = APIRouter()
+
+def ingest_events(events):
+    completed = 0
+    for event in events:
+        if live_metrics.ingest(event) is not None:
+            completed += 1
+        # Eventos del mismo drawer se coalescen en el feed en vivo
+        event_bus.publish(
+            event_topics(event.flight_id, employee_site(event.employee_id)),
+            {"type": "assembly", "data": event.model_dump(mode="json")},
+            key=f"assembly:{event.drawer_id}",
+        )
+    return {"accepted": len(events), "completed_drawers": completed}
+
+@router.post("/assembly/events")
+async def post_assembly_events(batch: AssemblyEventBatch):
+    """Lote de eventos de ensamblaje (start / item_scanned / complete)"""
+    return {"status": "success", **ingest_events(batch.events)}
+
+@router.websocket("/assembly/events/ws")
+async def assembly_events_ws(websocket: WebSocket):
+    """
+    Cada mensaje es un evento o {"events": [...]}; se responde con un ack
+    por mensaje: {"accepted": n, "completed_drawers": n} o {"error": ...}
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_json()
+            try:
+                if isinstance(message, dict) and "events" in message:
+                    events = AssemblyEventBatch(**message).events
+                else:
+                    events = [AssemblyEvent(**message)]
+            except (ValidationError, TypeError) as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+            await websocket.send_json(ingest_events(events))
+    except WebSocketDisconnect:
+        pass
+
+# async y no def: live_metrics se modifica en el event loop; leerlo desde el
+# threadpool puede fallar con "changed size during iteration"
+@router.get("/assembly/live")
+async def read_live_metrics():
+    """Métricas en memoria (EWMA y última hora) por empleado y estación"""
+    return live_metrics.snapshot()
+
+@router.get("/assembly/live/employees/{employee_id}")
+async def read_live_employee(employee_id: str):
+    snapshot = live_metrics.employee_snapshot(employee_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Sin eventos recientes para el empleado")
+    return {"employee_id": employee_id, **snapshot}
@@ -1,5 +1,5 @@
 from typing import List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from app.schemas.employee import EmployeeCreate, EmployeeOut, EmployeeUpdate
 from app.services.employee import (
     create_employee,
@@ -8,6 +8,7 @@ from app.services.employee import (
     update_employee,
     delete_employee,
 )
+from app.utils.negotiation import negotiated
 
 router = APIRouter()
 
@@ -21,9 +22,9 @@ def post_employee(employee: EmployeeCreate):
 
 
 @router.get("/employees", response_model=List[EmployeeOut])
-def read_employees():
+def read_employees(request: Request):
     try:
-        return get_all_employees()
+        return negotiated(request, get_all_employees(), List[EmployeeOut])
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
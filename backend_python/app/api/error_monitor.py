@@ -0,0 +1,43 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from app.services.error_monitor import error_monitor, is_authorized, persist_errors
+
+def require_error_token(x_error_token: Optional[str] = Header(None)):
+    if not is_authorized(x_error_token):
+        raise HTTPException(status_code=403, detail="Token del monitor de errores inválido o no configurado")
+
+router = APIRouter(dependencies=[Depends(require_error_token)])
+
+# Lecturas async: capture() modifica grupos y eventos en el event loop;
+# iterarlos desde el threadpool puede fallar con "mutated during iteration"
+
+@router.get("/errors")
+async def read_errors(
+    minutes: int = Query(60, ge=1, le=24 * 60),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Errores agrupados por fingerprint, ordenados por ocurrencias recientes"""
+    return error_monitor.summary(minutes=min(minutes, error_monitor.window_minutes), limit=limit)
+
+@router.get("/errors/recent")
+async def read_recent_errors(
+    limit: int = Query(50, ge=1, le=500),
+    fingerprint: Optional[str] = None,
+    route: Optional[str] = None
+):
+    """Últimos errores del ring buffer (más reciente primero)"""
+    return {"events": error_monitor.recent(limit=limit, fingerprint=fingerprint, route=route)}
+
+@router.get("/errors/{fingerprint}")
+async def read_error_group(fingerprint: str):
+    """Detalle de un fingerprint: conteo por minuto y eventos recientes"""
+    group = error_monitor.group(fingerprint)
+    if group is None:
+        raise HTTPException(status_code=404, detail="Fingerprint no encontrado")
+    return group
+
+@router.post("/errors/reset")
+async def reset_errors():
+    error_monitor.reset()
+    await persist_errors()
+    return {"status": "success"}
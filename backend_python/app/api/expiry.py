@@ -0,0 +1,122 @@
+"""
+Consultas de caducidad sobre el índice en memoria (sin leer scanned_products)
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from app.services.expiry_index import expiry_index, rebuild_expiry_index
+from app.services.validation import (
+    get_flight_cutoffs,
+    get_unfinished_flight_ids,
+    parse_datetime,
+    parse_expiry,
+)
+
+router = APIRouter(prefix="/api/expiry", tags=["expiry"])
+
+MAX_LIMIT = 5000
+
+def _serialize(items):
+    return [{**i, "expiry_date": i["expiry_date"].isoformat()} for i in items]
+
+def _parse_date(value: Optional[str], name: str) -> Optional[date]:
+    if value is None:
+        return None
+    parsed = parse_expiry(value)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail=f"{name} debe ser una fecha ISO")
+    return parsed
+
+@router.get("/range")
+def expiry_range(
+    start: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    flight_id: Optional[str] = None,
+    drawer_id: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_LIMIT)
+):
+    """Items con caducidad entre start y end, ordenados por fecha"""
+    start_day, end_day = _parse_date(start, "start"), _parse_date(end, "end")
+    filters = {"flight_id": flight_id, "drawer_id": drawer_id}
+    items = expiry_index.range(start_day, end_day, limit=limit, **filters)
+    return {
+        "total": expiry_index.count_range(start_day, end_day, **filters),
+        "items": _serialize(items),
+    }
+
+@router.get("/before")
+def expiring_before(
+    ts: Optional[str] = Query(None, description="ISO datetime; por defecto ahora"),
+    days: Optional[int] = Query(None, ge=0, le=3650, description="Alternativa: ahora + N días"),
+    flight_id: Optional[str] = None,
+    drawer_id: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_LIMIT)
+):
+    """Items que caducan antes de ts (o dentro de los próximos N días)"""
+    if ts is not None:
+        moment = parse_datetime(ts)
+        if moment is None:
+            raise HTTPException(status_code=400, detail="ts debe ser un datetime ISO")
+    else:
+        moment = datetime.now(timezone.utc) + timedelta(days=days or 0)
+
+    cutoff = moment.date()
+    filters = {"flight_id": flight_id, "drawer_id": drawer_id}
+    items = expiry_index.before(cutoff, limit=limit, **filters)
+    end_day = date.fromordinal(cutoff.toordinal() - 1)
+    return {
+        "before": cutoff.isoformat(),
+        "total": expiry_index.count_range(end=end_day, **filters),
+        "items": _serialize(items),
+    }
+
+@router.get("/at-risk")
+async def expiring_before_landing(
+    flight_id: Optional[str] = None,
+    include_finished: bool = False,
+    route_duration_minutes: Optional[int] = Query(None, ge=0, le=24 * 60),
+    limit: int = Query(500, ge=1, le=MAX_LIMIT)
+):
+    """
+    Items que caducan antes de que termine su vuelo (mismo corte que /api/validation)
+    Por defecto solo vuelos que no han terminado
+    """
+    if flight_id:
+        flight_ids = [flight_id]
+    elif include_finished:
+        flight_ids = expiry_index.flight_ids()
+    else:
+        # Solo vuelos con llegada reciente o próxima, no todo el historial escaneado
+        unfinished = await run_in_threadpool(get_unfinished_flight_ids, route_duration_minutes)
+        flight_ids = expiry_index.flight_ids(unfinished)
+    cutoffs = await run_in_threadpool(get_flight_cutoffs, flight_ids, route_duration_minutes)
+    now = datetime.now(timezone.utc)
+
+    flights = []
+    for fid in flight_ids:
+        flight_cutoffs = cutoffs.get(fid)
+        if flight_cutoffs is None or (not include_finished and flight_cutoffs.ends_at < now):
+            continue
+        items = expiry_index.before(flight_cutoffs.expired_before, flight_id=fid, limit=limit)
+        if items:
+            flights.append({
+                **flight_cutoffs.as_dict(),
+                "total": expiry_index.count_range(
+                    end=date.fromordinal(flight_cutoffs.expired_before.toordinal() - 1), flight_id=fid
+                ),
+                "items": _serialize(items),
+            })
+
+    flights.sort(key=lambda f: f["flight_ends_at"])
+    return {"flights": flights, "total": sum(f["total"] for f in flights)}
+
+@router.get("/stats")
+def expiry_stats():
+    return expiry_index.stats()
+
+@router.post("/rebuild")
+async def expiry_rebuild():
+    """Fuerza la reconstrucción desde scanned_products"""
+    return await rebuild_expiry_index()
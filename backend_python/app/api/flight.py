@@ -1,5 +1,5 @@
 from typing import List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from app.schemas.flight import FlightCreate, FlightOut, FlightUpdate
 from app.services.flight import (
     create_flight,
@@ -8,6 +8,7 @@ from app.services.flight import (
     update_flight,
     delete_flight,
 )
+from app.utils.negotiation import negotiated
 
 router = APIRouter()
 
@@ -20,9 +21,9 @@ def post_flight(flight: FlightCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/flights", response_model=List[FlightOut])
-def read_flights():
+def read_flights(request: Request):
     try:
-        return get_all_flights()
+        return negotiated(request, get_all_flights(), List[FlightOut])
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.services.event_bus import event_bus
+from app.utils.sse import SSE_HEADERS, sse_event
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+def parse_topics(flights: Optional[str], sites: Optional[str]) -> set:
+    """flights=a,b&sites=x -> {"flight:a", "flight:b", "site:x"}; sin filtros -> {"all"}"""
+    topics = {f"flight:{f.strip()}" for f in (flights or "").split(",") if f.strip()}
+    topics |= {f"site:{s.strip()}" for s in (sites or "").split(",") if s.strip()}
+    return topics or {"all"}
+
+@router.websocket("/live/ws")
+async def live_ws(websocket: WebSocket, flights: Optional[str] = None, sites: Optional[str] = None):
+    """
+    Feed en vivo de escaneos, cuarentena y drawers
+    Cada mensaje: {"events": [...], "dropped": n} (dropped > 0 -> volver a consultar)
+    """
+    await websocket.accept()
+    sub = event_bus.subscribe(parse_topics(flights, sites))
+    # Detecta la desconexión aunque no lleguen eventos
+    receiver = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            batch_task = asyncio.ensure_future(sub.next_batch())
+            done, _ = await asyncio.wait({batch_task, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                batch_task.cancel()
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+                continue
+            await websocket.send_json(batch_task.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        sub.close()
+
+@router.get("/live/stream")
+async def live_stream(
+    request: Request,
+    flights: Optional[str] = Query(None),
+    sites: Optional[str] = Query(None)
+):
+    """Mismo feed como Server-Sent Events (event: batch), con keepalive"""
+    sub = event_bus.subscribe(parse_topics(flights, sites))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    batch = await asyncio.wait_for(sub.next_batch(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event("batch", batch)
+        finally:
+            sub.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# async: el estado del bus solo se modifica (y se lee) en el event loop
+@router.get("/live/stats")
+async def live_stats():
+    return event_bus.stats()
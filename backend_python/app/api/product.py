@@ -1,5 +1,5 @@
 from typing import List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from app.schemas.product import ProductCreate, ProductOut, ProductUpdate
 from app.services.product import (
     create_product,
@@ -8,6 +8,7 @@ from app.services.product import (
     update_product,
     delete_product,
 )
+from app.utils.negotiation import negotiated
 
 router = APIRouter()
 
@@ -20,9 +21,9 @@ def post_product(product: ProductCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/products", response_model=List[ProductOut])
-def read_products():
+def read_products(request: Request):
     try:
-        return get_all_products()
+        return negotiated(request, get_all_products(), List[ProductOut])
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -0,0 +1,25 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from app.utils.profiler import get_profile_path, is_authorized, list_profiles
+
+router = APIRouter()
+
+def require_profiler_token(token: Optional[str]):
+    if not is_authorized(token):
+        raise HTTPException(status_code=403, detail="Token de profiler inválido o no configurado")
+
+@router.get("/profiles")
+def read_profiles(x_profile_token: Optional[str] = Header(None)):
+    """Perfiles guardados, del más reciente al más viejo"""
+    require_profiler_token(x_profile_token)
+    return {"profiles": list_profiles()}
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, x_profile_token: Optional[str] = Header(None)):
+    """Archivo collapsed stacks (flamegraph.pl o speedscope.app)"""
+    require_profiler_token(x_profile_token)
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -0,0 +1,22 @@
+"""
+Ingesta de productos escaneados desde la app móvil
+"""
+
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.schemas.vision import ScannedProductBatch
+from app.services.scans import ingest_scan_batch
+
+router = APIRouter(prefix="/api/scans", tags=["scans"])
+
+@router.post("/batch")
+async def create_scans_batch(batch: ScannedProductBatch):
+    """
+    Guarda un lote de scans en un solo insert
+    Reintentos con la misma llave (barcode + drawer + scanned_at) no duplican filas;
+    cada item regresa como created, duplicate o rejected
+    """
+    try:
+        return await run_in_threadpool(ingest_scan_batch, batch.scans)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
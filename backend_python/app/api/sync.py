@@ -0,0 +1,51 @@
+"""
+Sincronización offline de la app móvil
+Cada respuesta trae version: guardarla y mandarla como since en la siguiente
+llamada; repetir mientras has_more sea true
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from app.schemas.vision import ScannedProductBatch
+from app.services.scans import ingest_scan_batch
+from app.services.sync import fetch_changes
+from app.utils.negotiation import negotiated
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+async def _changes(request: Request, table: str, since: Optional[str], limit: int):
+    try:
+        changes = await run_in_threadpool(fetch_changes, table, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error sincronizando {table}: {e}")
+    return negotiated(request, changes)
+
+@router.get("/products")
+async def sync_products(
+    request: Request,
+    since: Optional[str] = Query(None, description="version de la sincronización anterior"),
+    limit: int = Query(1000, ge=1, le=5000)
+):
+    """Productos creados o modificados y ids borrados desde since"""
+    return await _changes(request, "products", since, limit)
+
+@router.get("/flights")
+async def sync_flights(
+    request: Request,
+    since: Optional[str] = Query(None, description="version de la sincronización anterior"),
+    limit: int = Query(1000, ge=1, le=5000)
+):
+    """Vuelos creados o modificados y ids borrados desde since"""
+    return await _changes(request, "flights", since, limit)
+
+@router.post("/scans")
+async def sync_scans(request: Request, batch: ScannedProductBatch):
+    """Cola offline de scans; mismo comportamiento idempotente que /api/scans/batch"""
+    try:
+        result = await run_in_threadpool(ingest_scan_batch, batch.scans)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return negotiated(request, result)
@@ -0,0 +1,51 @@
+"""
+API de validación de caducidad y cuarentena
+Misma regla para web y móvil: vigencia hasta el fin del vuelo
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.schemas.validation import DrawerValidationRequest, ScanValidationRequest
+from app.services.error_checker import DrawerNotFound, check_drawer
+from app.services.validation import get_flight_cutoffs, summarize_statuses, validate_items
+
+router = APIRouter(prefix="/api/validation", tags=["validation"])
+
+@router.post("/scans")
+async def validate_scans(request: ScanValidationRequest):
+    """
+    Clasifica items como valid / warning / expired sin escribir nada
+    Los cortes se calculan una vez por vuelo distinto
+    """
+    items = [item.model_dump() for item in request.items]
+    cutoffs = await run_in_threadpool(
+        get_flight_cutoffs, {i["flight_id"] for i in items}, request.route_duration_minutes
+    )
+    results = validate_items(items, cutoffs)
+    return {
+        "summary": summarize_statuses(results),
+        "items": results,
+        "cutoffs": {fid: c.as_dict() for fid, c in cutoffs.items() if fid},
+    }
+
+@router.post("/drawers/{drawer_id}")
+async def validate_drawer(drawer_id: str, request: Optional[DrawerValidationRequest] = None):
+    """
+    Valida todo el drawer contra su vuelo, revisa contra drawer_content y
+    manda los caducados a cuarentena en un solo insert
+    """
+    request = request or DrawerValidationRequest()
+    try:
+        return await run_in_threadpool(
+            check_drawer,
+            drawer_id,
+            request.quarantine,
+            request.rejected_by,
+            request.rejected_by_name,
+            request.route_duration_minutes,
+        )
+    except DrawerNotFound:
+        raise HTTPException(status_code=404, detail="Drawer no encontrado")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -3,17 +3,34 @@ API endpoints para procesamiento de imágenes con OCR
 Extracción de fechas de caducidad y LOT numbers
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Query, Request
+from fastapi.responses import JSONResponse
 from typing import Optional
 from app.schemas.vision import OCRResponse
 from app.services.ocr_service import process_expiry_date_ocr, extract_lot_from_image
+from app.utils.negotiation import negotiated, wants_msgpack
 
 router = APIRouter(prefix="/api/vision", tags=["vision"])
 
+# Campos pesados que se omiten con verbose=false
+VERBOSE_FIELDS = {"extracted_text", "all_dates_found", "detected_formats"}
+
+def compact_ocr_response(response: OCRResponse, verbose: bool, fields: Optional[str]) -> dict:
+    """fields=a,b limita la respuesta a esos campos (success siempre va)"""
+    include = None
+    if fields:
+        include = {f.strip() for f in fields.split(",") if f.strip() in OCRResponse.model_fields}
+        include.add("success")
+    exclude = None if verbose else VERBOSE_FIELDS
+    return response.model_dump(include=include, exclude=exclude, exclude_none=not verbose or bool(fields))
+
 @router.post("/expiry-date", response_model=OCRResponse)
 async def extract_expiry_date(
+    request: Request,
     image: UploadFile = File(...),
-    product_id: Optional[str] = Form(None)
+    product_id: Optional[str] = Form(None),
+    verbose: bool = Query(True, description="false omite texto crudo y candidatos"),
+    fields: Optional[str] = Query(None, description="Lista de campos a regresar, p. ej. expiry_date,lot_number")
 ):
     """
     Extrae la fecha de caducidad de una imagen de etiqueta de producto
@@ -21,9 +38,12 @@ async def extract_expiry_date(
     Args:
         image: Imagen de la etiqueta (JPG, PNG)
         product_id: ID del producto (opcional, ayuda a optimizar)
+        verbose: False para respuesta compacta (sin extracted_text ni all_dates_found)
+        fields: Campos a incluir (el resto se omite)
 
     Returns:
         OCRResponse con fecha extraída, LOT number y confianza
+        (JSON o MessagePack según Accept)
     """
     try:
         # Validar tipo de archivo
@@ -45,8 +65,13 @@ async def extract_expiry_date(
 
         # Procesar OCR
         result = process_expiry_date_ocr(image_bytes)
+        response = OCRResponse(**result)
 
-        return OCRResponse(**result)
+        if verbose and not fields:
+            return negotiated(request, response)
+        # Respuesta directa: el response_model volvería a agregar los campos omitidos
+        compact = compact_ocr_response(response, verbose, fields)
+        return negotiated(request, compact) if wants_msgpack(request) else JSONResponse(compact)
 
     except HTTPException:
         raise
@@ -1,13 +1,30 @@
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from typing import List
 import os
 
+from app.utils.metrics import instrument_httpx_client
+
 load_dotenv()  # Carga las variables desde un archivo .env si existe
 
 url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 
 supabase: Client = create_client(url, key)
+# Tiempos de cada llamada a PostgREST en /metrics
+instrument_httpx_client(supabase.postgrest.session, "supabase")
 
 print("URL:", url)
 print("KEY:", key[:10], "...")  # Solo para confirmar sin imprimir todo
+
+
+def fetch_all_rows(table: str, columns: str = "*", page_size: int = 1000) -> List[dict]:
+    """Lee una tabla completa paginando con range() (PostgREST limita cada respuesta)"""
+    rows = []
+    start = 0
+    while True:
+        page = supabase.table(table).select(columns).range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
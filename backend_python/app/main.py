@@ -1,9 +1,26 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from dotenv import load_dotenv  # <-- nuevo
-from app.api import flight, employee, product, vision
+from app.api import flight, employee, product, vision, assembly, live, validation, expiry, scans, sync, metrics, profiles, error_monitor, analytics
 from app.routes import predict, productivity
+from app.services.analytics import start_analytics_job, stop_analytics_job
+from app.services.change_feed import start_change_feed, stop_change_feed
+from app.services.error_monitor import (
+    ErrorMonitorMiddleware,
+    monitored_http_exception_handler,
+    start_error_monitor,
+    stop_error_monitor,
+)
+from app.services.expiry_index import start_expiry_index, stop_expiry_index
+from app.services.live_metrics import start_live_metrics, stop_live_metrics
+from app.services.llm_client import llm_client
+from app.services.prediction import load_demand_model
+from app.utils.compression import CompressionMiddleware
+from app.utils.metrics import MetricsMiddleware
+from app.utils.profiler import ProfilerMiddleware
+from app.services.productivity_rollup import start_rollup_job, stop_rollup_job
 
 load_dotenv()  # <-- carga variables de entorno desde .env
 
@@ -35,6 +52,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprime respuestas grandes (brotli o gzip, desde COMPRESSION_MIN_SIZE bytes)
+app.add_middleware(CompressionMiddleware)
+# Perfiles por muestreo bajo demanda o de requests lentos (ver app/utils/profiler.py)
+app.add_middleware(ProfilerMiddleware)
+# Registra excepciones no manejadas; queda dentro de MetricsMiddleware para ver los upstreams
+app.add_middleware(ErrorMonitorMiddleware)
+app.add_exception_handler(StarletteHTTPException, monitored_http_exception_handler)
+# Va al final para quedar por fuera: mide el tiempo total y los bytes ya comprimidos
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def startup():
+    await start_error_monitor()
+    load_demand_model()
+    start_rollup_job()
+    start_live_metrics()
+    start_change_feed()
+    start_expiry_index()
+    start_analytics_job()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_rollup_job()
+    await stop_live_metrics()
+    await stop_change_feed()
+    await stop_expiry_index()
+    await stop_analytics_job()
+    await llm_client.aclose()
+    await stop_error_monitor()
+
+
 @app.get("/")
 def root():
     return {
@@ -50,3 +99,13 @@ app.include_router(product.router)
 app.include_router(predict.router)
 app.include_router(productivity.router)
 app.include_router(vision.router)
+app.include_router(assembly.router)
+app.include_router(live.router)
+app.include_router(validation.router)
+app.include_router(expiry.router)
+app.include_router(scans.router)
+app.include_router(sync.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(error_monitor.router)
+app.include_router(analytics.router)
@@ -1,14 +1,28 @@
 # routes/predict.py
-from fastapi import APIRouter, Query
-from openai import OpenAI
-import os, json, random, re
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from dataclasses import replace
+from typing import List, Optional, Tuple
+import asyncio, json, re
 
-router = APIRouter()
+from app.schemas.prediction import BatchPredictRequest
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY")
+from app.services.llm_client import llm_client
+from app.services.prediction import (
+    FlightFeatures,
+    demand_model_type,
+    demand_model_version,
+    get_demand_model,
+    predict_catalog_demand,
 )
+from app.services.flight import get_flights_between
+from app.services.product import get_product_catalog
+from app.utils.llm_json import llm_parse_stats
+from app.utils.sse import SSE_HEADERS, sse_event
+from app.services.prediction_cache import passenger_bucket, prediction_cache, prediction_cache_key
+
+router = APIRouter()
 
 def parse_duration(duration_str: str) -> str:
     try:
@@ -48,87 +62,423 @@ def format_report_text(report: str) -> str:
     return formatted.strip()
 
 
-def try_parse_json_with_fix(raw: str) -> dict:
+class ReportStreamFormatter:
+    """
+    Versión incremental de format_report_text para texto en streaming
+
+    Emite el texto en cuanto es seguro (fin de línea o último espacio) y
+    aplica la misma limpieza: escapes \\n, negritas, viñetas, sangrías,
+    separación de secciones "1. Producto" y a lo más una línea en blanco.
+    """
+
+    SECTION_RE = re.compile(r"^\d+\.\s+\w+")
+    # Inicio de línea con al menos dos palabras: basta para saber si es sección
+    LINE_PREFIX_RE = re.compile(r"\s*\S+\s+\S")
+
+    def __init__(self):
+        self.buffer = ""
+        self.at_line_start = True
+        self.pending_newlines = 0
+        self.emitted_any = False
+
+    def _clean(self, text: str) -> str:
+        return text.replace("**", "").replace("* ", "")
+
+    def _emit(self, text: str, end_of_line: bool, line_hint: Optional[str] = None) -> str:
+        out = ""
+        if self.at_line_start:
+            text = text.lstrip()
+            if text.startswith("* "):
+                text = text[2:]
+            if not text:
+                if end_of_line:
+                    self.pending_newlines += 1
+                return ""
+            if self.emitted_any:
+                newlines = min(max(self.pending_newlines, 1), 2)
+                if self.SECTION_RE.match((line_hint or text).lstrip()):
+                    newlines = 2
+                out += "\n" * newlines
+            self.pending_newlines = 0
+            self.at_line_start = False
+
+        out += self._clean(text)
+        self.emitted_any = self.emitted_any or bool(out)
+        if end_of_line:
+            self.at_line_start = True
+            self.pending_newlines = 1
+        return out
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        # Un "\" final puede ser la mitad de un "\n" escapado
+        hold_escape = self.buffer.endswith("\\")
+        text = self.buffer[:-1] if hold_escape else self.buffer
+        text = text.replace("\\n", "\n")
+        out = ""
+
+        while "\n" in text:
+            line, text = text.split("\n", 1)
+            out += self._emit(line, end_of_line=True)
+
+        # Línea incompleta: emitir hasta el último espacio
+        if self.at_line_start and not self.LINE_PREFIX_RE.match(text):
+            pass
+        else:
+            cut = max(text.rfind(" "), text.rfind("\t"))
+            if cut > 0 and not text[:cut].rstrip().endswith("*"):
+                out += self._emit(text[:cut + 1], end_of_line=False, line_hint=text)
+                text = text[cut + 1:]
+
+        self.buffer = text + ("\\" if hold_escape else "")
+        return out
+
+    def flush(self) -> str:
+        text, self.buffer = self.buffer, ""
+        return self._emit(text.replace("\\n", "\n").rstrip(), end_of_line=False) if text.strip() else ""
+
+
+REPORT_TOP_PRODUCTS = 8
+
+
+async def load_catalog() -> list:
+    """Catálogo de productos; si Supabase falla, los productos que conoce el modelo"""
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        print("⚠️ JSON inválido. Intentando reparar...")
-        # Añadir llaves faltantes
-        if raw.count('{') > raw.count('}'):
-            raw += "}" * (raw.count('{') - raw.count('}'))
+        catalog = await run_in_threadpool(get_product_catalog)
+        if catalog:
+            return catalog
+    except Exception as e:
+        print(f"⚠️ No se pudo obtener el catálogo: {e}")
 
-        # Cerrar comillas de 'report' si están abiertas
-        match = re.search(r'"report":\s*"(.*)', raw)
-        if match and not raw.strip().endswith('"'):
-            raw = re.sub(r'"report":\s*"(.*)', r'"report": "\1..." }', raw)
+    model = get_demand_model()
+    if model is None:
+        return []
+    return [{"id": pid, "name": name} for pid, name in zip(model.product_ids, model.product_names)]
 
-        return json.loads(raw)
 
-@router.get("/predict")
-async def get_predictions(
-    origin_country: str = Query(...),
-    flight_duration: str = Query(...),
-    time_of_day: str = Query(...),
-    confirmed_passengers: int = Query(...),
-):
-    products = ["Galletas Oreo", "Agua Mineral 500ml", "Sandwich Club"]
-    readable_duration = parse_duration(flight_duration)
+async def predict_request_and_bucket(
+    origin_country: str,
+    flight_duration: str,
+    time_of_day: str,
+    confirmed_passengers: int,
+) -> Tuple[list, list]:
+    """
+    Cifras exactas del request y las del grupo de pasajeros de la llave de
+    cache (con las que se redacta el reporte cacheable), en una sola pasada
+    """
+    catalog = await load_catalog()
+    if not catalog:
+        return [], []
+    features = FlightFeatures.from_request(origin_country, flight_duration, time_of_day, confirmed_passengers)
+    bucket_features = replace(features, passengers=passenger_bucket(confirmed_passengers))
+    predictions, bucket_predictions = predict_catalog_demand([features, bucket_features], catalog)
+    return predictions, bucket_predictions
 
-    prompt = (
+
+def build_report_prompt(
+    origin_country: str,
+    flight_duration: str,
+    time_of_day: str,
+    confirmed_passengers: int,
+    predictions: list,
+    approximate: bool = False,
+) -> str:
+    """approximate: reporte para un grupo de pasajeros (se comparte vía cache)"""
+    readable_duration = parse_duration(flight_duration)
+    passengers = f"alrededor de {confirmed_passengers}" if approximate else str(confirmed_passengers)
+    figures_rule = (
+        "No cambie las cifras estimadas y preséntelas como aproximadas para ese número de pasajeros."
+        if approximate else "No cambie las cifras estimadas."
+    )
+    lines = "\n".join(
+        f"- {p['product']}: {p['predicted_demand']} unidades (tendencia {p['trend']})"
+        for p in predictions[:REPORT_TOP_PRODUCTS]
+    )
+    return (
         f"Eres un experto en análisis de consumo a bordo de vuelos internacionales. "
         f"Recibiste los siguientes parámetros:\n"
         f"- País de origen del vuelo: {origin_country}\n"
         f"- Duración estimada: {readable_duration}\n"
         f"- Hora del despegue: {time_of_day}\n"
-        f"- Pasajeros confirmados: {confirmed_passengers}\n\n"
-        f"Analiza el contexto y elabora un informe ejecutivo claro y profesional que incluya:\n"
-        f"1. Predicciones para estos productos: {', '.join(products)}, con su demanda esperada (número) y tendencia ('up', 'down', 'steady').\n"
-        f"2. Justificación detallada para cada producto, basada en duración, origen, número de pasajeros, preferencias culturales y horario del vuelo.\n"
-        f"3. Usa referencias o supuestos reales si es posible (como costumbres, hábitos o datos relevantes del país de origen).\n\n"
-        f"Devuelve un JSON con:\n"
-        f"- 'predictions': lista de objetos con 'product', 'predicted_demand' y 'trend'\n"
-        f"- 'report': párrafo extenso profesional y sin comillas ni formato de string literal (estilo texto libre, no encerrado en comillas)."
+        f"- Pasajeros confirmados: {passengers}\n\n"
+        f"Nuestro modelo histórico estimó esta demanda para los productos principales:\n"
+        f"{lines}\n\n"
+        f"Elabora un informe ejecutivo claro y profesional que:\n"
+        f"1. Justifique la demanda y tendencia de cada producto, basándote en duración, origen, número de pasajeros, preferencias culturales y horario del vuelo.\n"
+        f"2. Use referencias o supuestos reales si es posible (como costumbres, hábitos o datos relevantes del país de origen).\n"
+        f"3. {figures_rule}\n\n"
+        f"Responde solo con el texto del informe, en párrafos, sin JSON ni formato Markdown."
     )
 
+
+REPORT_MODEL = "google/gemini-2.5-flash"
+
+
+def report_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "Eres un analista profesional redactando reportes para ejecutivos de aerolíneas."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def generate_report(prompt: str) -> Optional[str]:
+    """Narrativa del LLM; None si falla"""
     try:
-        response = client.chat.completions.create(
-            model="google/gemini-2.5-flash",
-            messages=[
-                {"role": "system", "content": "Eres un analista profesional redactando reportes para ejecutivos de aerolíneas."},
-                {"role": "user", "content": prompt}
-            ],
+        content = await llm_client.chat(
+            model=REPORT_MODEL,
+            messages=report_messages(prompt),
             max_tokens=850,
             temperature=0.4
         )
+        return format_report_text(content.strip())
+    except Exception as e:
+        print("❌ Error generando el reporte:", e)
+        return None
 
-        raw = response.choices[0].message.content.strip()
-        print("📥 Respuesta cruda de OpenAI:\n", raw)
 
-        if raw.startswith("```json"):
-            raw = raw.replace("```json", "").replace("```", "").strip()
-        elif raw.startswith("```"):
-            raw = raw.replace("```", "").strip()
+def fallback_report(predictions: list, confirmed_passengers: int) -> str:
+    if not predictions:
+        return (
+            "Reporte no disponible: el catálogo de productos no se pudo cargar, "
+            "así que no hay demanda estimada para este vuelo."
+        )
+    top = ", ".join(f"{p['product']} ({p['predicted_demand']})" for p in predictions[:3])
+    return (
+        f"Reporte generado sin asistencia de AI.\n\n"
+        f"Para {confirmed_passengers} pasajeros, los productos con mayor demanda estimada son: {top}. "
+        f"Las cifras provienen del modelo histórico de consumo por ruta, duración y horario."
+    )
 
-        json_data = try_parse_json_with_fix(raw)
-        predictions = json_data["predictions"]
-        report = format_report_text(json_data["report"])
 
-    except Exception as e:
-        print("❌ Error en la predicción:", e)
-        predictions = [
+@router.get("/predict")
+async def get_predictions(
+    origin_country: str = Query(...),
+    flight_duration: str = Query(...),
+    time_of_day: str = Query(...),
+    confirmed_passengers: int = Query(...),
+):
+    # Predicción numérica local (milisegundos): siempre con los pasajeros exactos
+    predictions, bucket_predictions = await predict_request_and_bucket(
+        origin_country, flight_duration, time_of_day, confirmed_passengers
+    )
+    model_type = demand_model_type(
+        FlightFeatures.from_request(origin_country, flight_duration, time_of_day, confirmed_passengers)
+    )
+
+    # Sin catálogo no hay nada que narrar: ni LLM ni cache (el reporte quedaría
+    # describiendo un catálogo vacío cuando éste vuelva)
+    if not predictions:
+        report = fallback_report(predictions, confirmed_passengers)
+        return {"predictions": predictions, "report": report, "model_type": model_type, "cached": False}
+
+    cache_key = prediction_cache_key(
+        origin_country, flight_duration, time_of_day, confirmed_passengers, demand_model_version()
+    )
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        return {"predictions": predictions, "report": cached["report"], "model_type": model_type, "cached": True}
+
+    # El LLM solo redacta la narrativa, con las cifras del grupo de pasajeros
+    prompt = build_report_prompt(
+        origin_country, flight_duration, time_of_day, passenger_bucket(confirmed_passengers),
+        bucket_predictions, approximate=True,
+    )
+    report = await generate_report(prompt)
+
+    if report is not None:
+        # Solo se cachean reportes reales, nunca el respaldo
+        prediction_cache.set(cache_key, {"report": report})
+    else:
+        report = fallback_report(predictions, confirmed_passengers)
+
+    return {"predictions": predictions, "report": report, "model_type": model_type, "cached": False}
+
+
+def _minutes_to_hhmm(minutes: str) -> str:
+    if not minutes.isdigit():
+        return minutes
+    return f"{int(minutes) // 60}:{int(minutes) % 60:02d}"
+
+
+async def resolve_batch_flights(request: BatchPredictRequest) -> List[dict]:
+    """Normaliza la entrada del batch a [{flight_id, flight_number, features, params}]"""
+    if request.flights:
+        return [
             {
-                "product": p,
-                "predicted_demand": random.randint(85, 150),
-                "trend": random.choice(["up", "down", "steady"])
+                "flight_id": f.flight_id,
+                "flight_number": f.flight_number,
+                "features": FlightFeatures.from_request(
+                    f.origin_country, f.flight_duration, f.time_of_day, f.confirmed_passengers
+                ),
+                "params": (f.origin_country, f.flight_duration, f.time_of_day, f.confirmed_passengers),
             }
-            for p in products
+            for f in request.flights
         ]
-        report = (
-            "Este reporte es genérico debido a un error inesperado.\n\n"
-            "Predicciones simuladas por respaldo, basadas en patrones históricos aleatorios."
+
+    if not request.date_from or not request.date_to:
+        raise HTTPException(status_code=400, detail="Envía 'flights' o 'date_from' y 'date_to'")
+
+    rows = await run_in_threadpool(get_flights_between, request.date_from, request.date_to)
+    resolved = []
+    for row in rows or []:
+        features = FlightFeatures.from_flight_row(row)
+        resolved.append({
+            "flight_id": row.get("id"),
+            "flight_number": row.get("flight_number"),
+            "features": features,
+            "params": (
+                row.get("origin_country") or row.get("route") or features.origin,
+                _minutes_to_hhmm(features.duration),
+                features.time_of_day,
+                features.passengers,
+            ),
+        })
+    return resolved
+
+
+@router.post("/predict/batch")
+async def predict_batch(request: BatchPredictRequest):
+    """
+    Predicción de demanda para muchos vuelos (p. ej. todo el día de mañana)
+
+    - Todas las predicciones numéricas se calculan en una sola pasada vectorizada
+    - Respuesta NDJSON: una línea por vuelo, en cuanto está lista
+    - Con include_reports=true los reportes del LLM se generan con concurrencia
+      acotada (max_report_concurrency) y cada vuelo se emite al terminar el suyo
+    """
+    flights = await resolve_batch_flights(request)
+    catalog = await load_catalog()
+    all_predictions = predict_catalog_demand([f["features"] for f in flights], catalog) if catalog else [[] for _ in flights]
+
+    def line(payload: dict) -> str:
+        return json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+    def flight_payload(flight: dict, predictions: list, report: Optional[str] = None) -> dict:
+        payload = {
+            "flight_id": flight["flight_id"],
+            "flight_number": flight["flight_number"],
+            "passengers": flight["features"].passengers,
+            "predictions": predictions,
+        }
+        if request.include_reports:
+            payload["report"] = report or fallback_report(predictions, flight["features"].passengers)
+        return payload
+
+    async def stream():
+        if not request.include_reports:
+            for flight, predictions in zip(flights, all_predictions):
+                yield line(flight_payload(flight, predictions))
+        else:
+            semaphore = asyncio.Semaphore(request.max_report_concurrency)
+
+            async def with_report(flight: dict, predictions: list) -> dict:
+                if not predictions:
+                    return flight_payload(flight, predictions)
+                async with semaphore:
+                    report = await generate_report(build_report_prompt(*flight["params"], predictions))
+                return flight_payload(flight, predictions, report)
+
+            tasks = [asyncio.ensure_future(with_report(f, p)) for f, p in zip(flights, all_predictions)]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield line(await finished)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        yield line({"done": True, "flights": len(flights)})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/predict/stream")
+async def stream_predictions(
+    origin_country: str = Query(...),
+    flight_duration: str = Query(...),
+    time_of_day: str = Query(...),
+    confirmed_passengers: int = Query(...),
+):
+    """
+    Igual que /predict pero como Server-Sent Events
+
+    - event: predictions -> cifras del modelo local, de inmediato
+    - event: report      -> {"delta": texto} conforme el LLM lo genera (ya formateado)
+    - event: done        -> {"report": texto completo}
+    """
+    cache_key = prediction_cache_key(
+        origin_country, flight_duration, time_of_day, confirmed_passengers, demand_model_version()
+    )
+    cached = prediction_cache.get(cache_key)
+
+    async def events():
+        predictions, bucket_predictions = await predict_request_and_bucket(
+            origin_country, flight_duration, time_of_day, confirmed_passengers
+        )
+        model_type = demand_model_type(
+            FlightFeatures.from_request(origin_country, flight_duration, time_of_day, confirmed_passengers)
+        )
+        if not predictions:
+            fallback = fallback_report(predictions, confirmed_passengers)
+            yield sse_event("predictions", {"predictions": predictions, "model_type": model_type, "cached": False})
+            yield sse_event("report", {"delta": fallback})
+            yield sse_event("done", {"report": fallback, "cached": False, "fallback": True})
+            return
+
+        yield sse_event("predictions", {
+            "predictions": predictions, "model_type": model_type, "cached": cached is not None,
+        })
+
+        if cached is not None:
+            yield sse_event("report", {"delta": cached["report"]})
+            yield sse_event("done", {"report": cached["report"], "cached": True})
+            return
+
+        prompt = build_report_prompt(
+            origin_country, flight_duration, time_of_day, passenger_bucket(confirmed_passengers),
+            bucket_predictions, approximate=True,
         )
+        formatter = ReportStreamFormatter()
+        report = ""
+        try:
+            async for chunk in llm_client.stream_chat(
+                model=REPORT_MODEL,
+                messages=report_messages(prompt),
+                max_tokens=850,
+                temperature=0.4
+            ):
+                delta = formatter.feed(chunk)
+                if delta:
+                    report += delta
+                    yield sse_event("report", {"delta": delta})
+            delta = formatter.flush()
+            if delta:
+                report += delta
+                yield sse_event("report", {"delta": delta})
+        except Exception as e:
+            print("❌ Error en streaming del reporte:", e)
+            if not report:
+                fallback = fallback_report(predictions, confirmed_passengers)
+                yield sse_event("report", {"delta": fallback})
+                yield sse_event("done", {"report": fallback, "cached": False, "fallback": True})
+                return
+            yield sse_event("done", {"report": report, "cached": False, "truncated": True})
+            return
+
+        prediction_cache.set(cache_key, {"report": report})
+        yield sse_event("done", {"report": report, "cached": False})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/predict/cache/stats")
+def prediction_cache_stats():
+    """Hits/misses del cache de predicciones (memoria y disco)"""
+    return prediction_cache.stats()
 
-    return {"predictions": predictions, "report": report}
+@router.get("/llm/stats")
+def llm_stats():
+    """Llamadas/reintentos al LLM y respuestas JSON ok, reparadas o perdidas"""
+    return {"client": llm_client.stats(), "parse": llm_parse_stats.as_dict()}
 
 @router.get("/trend-explanation")
 async def explain_trend(
@@ -150,7 +500,7 @@ async def explain_trend(
 
     try:
         print("📤 Enviando prompt a Gemini...")
-        response = client.chat.completions.create(
+        content = await llm_client.chat(
             model="google/gemini-2.5-flash",
             messages=[
                 {"role": "system", "content": "Responde como experto en análisis de consumo de aerolíneas. Sé profesional, breve y claro."},
@@ -159,7 +509,7 @@ async def explain_trend(
             max_tokens=300,
             temperature=0.5
         )
-        explanation = response.choices[0].message.content.strip()
+        explanation = content.strip()
         print("📥 Explicación generada:", explanation)
         return {"country": country, "trend": trend, "explanation": explanation}
 
@@ -5,157 +5,180 @@ Productivity ML Router - Enfoque Híbrido
 """
 
 from fastapi import APIRouter, Query, HTTPException
-from typing import Optional
-from datetime import datetime, timedelta
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+import asyncio
 import os
-from supabase import create_client, Client
-import httpx
+import hashlib
 import json
 
-router = APIRouter(prefix="/productivity", tags=["productivity"])
-
-# Inicializar Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
-
-# OpenRouter para Gemini
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-# ============================================
-# CONSTANTES DEL MODELO MATEMÁTICO
-# ============================================
+from app.db import supabase
+from app.schemas.productivity import BatchEstimateRequest, ScheduleRequest
+from app.services.build_time import (
+    COMPLEXITY_MULTIPLIERS,
+    EXPERIENCE_LEVELS,
+    FLIGHT_TYPES,
+    calculate_base_estimate,
+    estimate_batch,
+    get_coefficients,
+    get_flight_drawer_items,
+    group_totals,
+)
+from app.services.flight import get_flights_by_ids
+from app.services.llm_client import LLMError, llm_client
+from app.services.scheduler import ScheduleEmployee, ScheduleFlight, schedule_drawers
+from app.services.productivity_rollup import (
+    fetch_rollup_rows,
+    refresh_rollup,
+    summarize_rollups,
+    summarize_team_rollups,
+)
+from app.utils.cache import AsyncSingleFlightCache, TTLCache
+from app.utils.constants import TARGET_TIME_MINUTES
+from app.utils.datetime_tools import hour_to_time_of_day, normalize_time_of_day
+from app.utils.llm_json import IncrementalJSONParser, llm_parse_stats, parse_llm_json
+from app.utils.sse import SSE_HEADERS, sse_event
 
-BASE_TIME_PER_ITEM = 15  # segundos por item
-
-COMPLEXITY_MULTIPLIERS = {
-    "Economy": 1.0,
-    "Business": 1.3,
-    "First-Class": 1.6,
-    "Premium Economy": 1.15,
-    "International": 1.2,  # Vuelos internacionales
-    "Domestic": 0.95       # Vuelos domésticos
-}
+router = APIRouter(prefix="/productivity", tags=["productivity"])
 
-EXPERIENCE_ADJUSTMENTS = {
-    "novice": 1.4,       # < 3 meses
-    "intermediate": 1.2, # 3-6 meses
-    "experienced": 1.0,  # 6-12 meses
-    "expert": 0.85       # > 12 meses
-}
+# Cache de estadísticas históricas por (employee_id, days_back)
+RECENT_TIMES_LIMIT = 10
+historical_cache = TTLCache(
+    ttl_seconds=float(os.getenv("PRODUCTIVITY_STATS_TTL_SEC", "120")),
+    max_entries=2048
+)
+
+# Cache del leaderboard del equipo por (site, days_back)
+team_cache = TTLCache(
+    ttl_seconds=float(os.getenv("PRODUCTIVITY_TEAM_TTL_SEC", "300")),
+    max_entries=256
+)
+
+# Cache de insights de AI por (empleado, ventana, hash del snapshot)
+insights_cache = AsyncSingleFlightCache(
+    ttl_seconds=float(os.getenv("AI_INSIGHTS_TTL_SEC", "21600")),
+    stale_seconds=float(os.getenv("AI_INSIGHTS_STALE_SEC", "86400")),
+    max_entries=2048
+)
 
 # ============================================
 # FUNCIONES AUXILIARES
 # ============================================
 
-def get_experience_level(months: Optional[int]) -> str:
-    """Determina nivel de experiencia"""
-    if not months:
-        return "experienced"
-    if months < 3:
-        return "novice"
-    elif months < 6:
-        return "intermediate"
-    elif months <= 12:
-        return "experienced"
-    else:
-        return "expert"
+def to_minutes(seconds: Optional[float]) -> Optional[float]:
+    """Convierte segundos a minutos (1 decimal), respetando None"""
+    if seconds is None:
+        return None
+    return round(seconds / 60, 1)
 
 
-def calculate_base_estimate(item_count: int, flight_type: str, experience_months: Optional[int]) -> dict:
+def _historical_from_rollup(employee_id: str, days_back: int) -> Optional[dict]:
     """
-    MODELO MATEMÁTICO: Estimación rápida sin AI
+    Estadísticas desde productivity_daily_rollup: O(días) filas
+    None si el rollup no tiene filas (aún no se refresca o no hay datos)
     """
-    base_time = item_count * BASE_TIME_PER_ITEM
-    complexity_multiplier = COMPLEXITY_MULTIPLIERS.get(flight_type, 1.0)
-    adjusted_time = base_time * complexity_multiplier
-
-    experience_level = get_experience_level(experience_months)
-    experience_multiplier = EXPERIENCE_ADJUSTMENTS[experience_level]
-    final_time = adjusted_time * experience_multiplier
-
-    estimated_minutes = round(final_time / 60, 1)
+    rows = fetch_rollup_rows(days_back, employee_id=employee_id)
+    if not rows:
+        return None
+    summary = summarize_rollups(rows)
+    date_limit = (datetime.now() - timedelta(days=days_back)).isoformat()
+    recent = supabase.rpc("get_employee_recent_drawers", {
+        "p_employee_id": employee_id,
+        "p_since": date_limit,
+        "p_limit": RECENT_TIMES_LIMIT,
+    }).execute().data or []
 
     return {
-        "estimated_time_seconds": int(final_time),
-        "estimated_time_minutes": estimated_minutes,
-        "complexity_multiplier": complexity_multiplier,
-        "experience_multiplier": experience_multiplier,
-        "experience_level": experience_level
+        "completed_drawers": summary["count"],
+        "total_time_seconds": summary["sum_sec"],
+        "average_time_seconds": summary["mean_sec"],
+        "min_time_seconds": summary["min_sec"],
+        "max_time_seconds": summary["max_sec"],
+        "p50_time_seconds": summary["p50_sec"],
+        "p90_time_seconds": summary["p90_sec"],
+        "recent_drawers": recent,
     }
 
 
-async def get_historical_data(employee_id: str, days_back: int = 30):
-    """Obtiene datos históricos de Supabase"""
-    try:
-        date_limit = (datetime.now() - timedelta(days=days_back)).isoformat()
+def _historical_from_raw(employee_id: str, days_back: int) -> dict:
+    """Respaldo: agrega directamente sobre drawers_assembled vía RPC"""
+    date_limit = (datetime.now() - timedelta(days=days_back)).isoformat()
+    return supabase.rpc("get_employee_drawer_stats", {
+        "p_employee_id": employee_id,
+        "p_since": date_limit,
+        "p_recent": RECENT_TIMES_LIMIT,
+    }).execute().data
 
-        # Query drawers completados con JOIN a flights
-        # NOTA: Requiere foreign key configurada en Supabase
-        response = supabase.table("drawers_assembled") \
-            .select("id, drawer_number, total_assembly_time_sec, completed_at, flight_id, flights(flight_number, flight_type)") \
-            .eq("verified", True) \
-            .gte("completed_at", date_limit) \
-            .execute()
 
-        if not response.data:
-            return None
-
-        drawers = response.data
-        completed_count = len(drawers)
-
-        # Calcular métricas
-        times = [d.get("total_assembly_time_sec", 0) for d in drawers if d.get("total_assembly_time_sec")]
-        total_time = sum(times)
-        avg_time = total_time / len(times) if times else 0
+async def get_historical_data(employee_id: str, days_back: int = 30):
+    """
+    Obtiene estadísticas históricas del empleado
 
-        # Min y max tiempos
-        min_time = min(times) if times else 0
-        max_time = max(times) if times else 0
+    Lee los rollups diarios (sql/002_productivity_rollup.sql) y solo los
+    últimos drawers para el AI. Si los rollups no están disponibles o no
+    tienen filas del empleado, agrega en Postgres vía RPC
+    (sql/001_productivity_stats.sql). El resultado se cachea por
+    (empleado, ventana).
+    """
+    cache_key = (employee_id, days_back)
+    cached = historical_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-        # Últimos 5 drawers para el AI
-        recent_drawers = drawers[-5:] if len(drawers) >= 5 else drawers
+    try:
+        try:
+            stats = await run_in_threadpool(_historical_from_rollup, employee_id, days_back)
+        except Exception as e:
+            print(f"⚠️ Rollup no disponible ({e}), agregando sobre drawers_assembled")
+            stats = None
+        if stats is None:
+            stats = await run_in_threadpool(_historical_from_raw, employee_id, days_back)
+
+        if not stats:
+            return None
 
-        return {
-            "completed_drawers": completed_count,
-            "total_time_seconds": total_time,
-            "average_time_seconds": int(avg_time),
-            "min_time_seconds": min_time,
-            "max_time_seconds": max_time,
+        recent = stats.get("recent_drawers") or []
+        times = [d["total_assembly_time_sec"] for d in recent if d.get("total_assembly_time_sec")]
+
+        historical_data = {
+            "completed_drawers": stats["completed_drawers"],
+            "total_time_seconds": stats["total_time_seconds"],
+            "average_time_seconds": int(stats["average_time_seconds"]),
+            "min_time_seconds": stats["min_time_seconds"],
+            "max_time_seconds": stats["max_time_seconds"],
+            "p50_time_seconds": stats.get("p50_time_seconds"),
+            "p90_time_seconds": stats.get("p90_time_seconds"),
             "period_days": days_back,
-            "recent_drawers": recent_drawers,
-            "times_list": times[-10:]  # Últimos 10 tiempos para análisis
+            "recent_drawers": recent[-5:],  # Últimos 5 drawers para el AI
+            "times_list": times  # Últimos tiempos para análisis
         }
 
+        historical_cache.set(cache_key, historical_data)
+        return historical_data
+
     except Exception as e:
         print(f"Error getting historical data: {e}")
         return None
 
 
-async def get_ai_insights(employee_id: str, historical_data: dict) -> dict:
-    """
-    GEMINI AI: Genera insights profundos y personalizados
-    """
-    if not OPENROUTER_API_KEY:
-        return {
-            "error": "OpenRouter API key not configured",
-            "fallback": True
-        }
+INSIGHTS_MODEL = "google/gemini-2.0-flash-001"
 
-    try:
-        # Preparar datos para el prompt
-        avg_time_min = round(historical_data["average_time_seconds"] / 60, 1)
-        min_time_min = round(historical_data["min_time_seconds"] / 60, 1)
-        max_time_min = round(historical_data["max_time_seconds"] / 60, 1)
-        completed = historical_data["completed_drawers"]
-        days = historical_data["period_days"]
 
-        times_list = historical_data.get("times_list", [])
-        times_str = ", ".join([f"{round(t/60, 1)} min" for t in times_list])
+def build_insights_prompt(historical_data: dict) -> str:
+    """Prompt para Gemini a partir de las estadísticas del empleado"""
+    # Preparar datos para el prompt
+    avg_time_min = round(historical_data["average_time_seconds"] / 60, 1)
+    min_time_min = round(historical_data["min_time_seconds"] / 60, 1)
+    max_time_min = round(historical_data["max_time_seconds"] / 60, 1)
+    completed = historical_data["completed_drawers"]
+    days = historical_data["period_days"]
+
+    times_list = historical_data.get("times_list", [])
+    times_str = ", ".join([f"{round(t/60, 1)} min" for t in times_list])
 
-        # Prompt para Gemini
-        prompt = f"""Eres un analista de productividad experto en operaciones de catering de aerolíneas.
+    return f"""Eres un analista de productividad experto en operaciones de catering de aerolíneas.
 
 Analiza el desempeño de este empleado:
 
@@ -192,50 +215,50 @@ IMPORTANTE:
 
 Responde SOLO con JSON válido, sin texto adicional."""
 
-        # Llamada a Gemini via OpenRouter
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                OPENROUTER_URL,
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "google/gemini-2.0-flash-001",
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1000
-                }
-            )
 
-            if response.status_code != 200:
-                print(f"OpenRouter error: {response.status_code} - {response.text}")
-                return {"error": "API error", "fallback": True}
+def parse_insights_response(ai_response: str) -> dict:
+    """
+    Parsea el JSON de insights tolerando fences, texto extra y respuestas truncadas
+    Si se recupera sin efficiency_rating se considera perdido
+    """
+    insights, status = parse_llm_json(ai_response, record=False)
+    if not isinstance(insights, dict) or "efficiency_rating" not in insights:
+        llm_parse_stats.record("failed")
+        raise json.JSONDecodeError("No se pudo recuperar el JSON de insights", ai_response, 0)
 
-            result = response.json()
-            ai_response = result["choices"][0]["message"]["content"]
+    llm_parse_stats.record(status)
+    insights["ai_generated"] = True
+    insights["model"] = "gemini-2.0-flash"
+    if status == "repaired":
+        insights["repaired"] = True
+    return insights
 
-            # Limpiar markdown si existe
-            ai_response = ai_response.strip()
-            if ai_response.startswith("```json"):
-                ai_response = ai_response[7:]
-            if ai_response.startswith("```"):
-                ai_response = ai_response[3:]
-            if ai_response.endswith("```"):
-                ai_response = ai_response[:-3]
-            ai_response = ai_response.strip()
 
-            # Parse JSON
-            insights = json.loads(ai_response)
-            insights["ai_generated"] = True
-            insights["model"] = "gemini-2.0-flash"
+async def get_ai_insights(employee_id: str, historical_data: dict) -> dict:
+    """
+    GEMINI AI: Genera insights profundos y personalizados
+    """
+    if not llm_client.configured:
+        return {
+            "error": "OpenRouter API key not configured",
+            "fallback": True
+        }
+
+    ai_response = ""
+    try:
+        # Llamada a Gemini via OpenRouter (cliente compartido)
+        try:
+            ai_response = await llm_client.chat(
+                messages=[{"role": "user", "content": build_insights_prompt(historical_data)}],
+                model=INSIGHTS_MODEL,
+                max_tokens=1000,
+                temperature=0.3,
+            )
+        except LLMError as e:
+            print(f"{e}")
+            return {"error": "API error", "fallback": True}
 
-            return insights
+        return parse_insights_response(ai_response)
 
     except json.JSONDecodeError as e:
         print(f"Error parsing AI response: {e}")
@@ -246,6 +269,89 @@ Responde SOLO con JSON válido, sin texto adicional."""
         return {"error": str(e), "fallback": True}
 
 
+def historical_snapshot_hash(historical_data: dict) -> str:
+    """Hash de los datos que alimentan el prompt; si no cambian, el insight tampoco"""
+    snapshot = {
+        key: historical_data.get(key)
+        for key in (
+            "completed_drawers",
+            "average_time_seconds",
+            "min_time_seconds",
+            "max_time_seconds",
+            "period_days",
+            "times_list",
+        )
+    }
+    raw = json.dumps(snapshot, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+async def get_cached_ai_insights(employee_id: str, historical_data: dict) -> dict:
+    """
+    Insights de AI cacheados por snapshot de datos
+
+    Requests concurrentes del mismo empleado comparten una sola llamada a
+    OpenRouter, y pasado el TTL se sirve el resultado previo mientras se
+    regenera en background. Los fallbacks no se cachean.
+    """
+    return await insights_cache.get_or_compute(
+        insights_cache_key(employee_id, historical_data),
+        lambda: get_ai_insights(employee_id, historical_data),
+        should_cache=lambda insights: not insights.get("fallback"),
+    )
+
+
+def insights_cache_key(employee_id: str, historical_data: dict) -> tuple:
+    return (employee_id, historical_data["period_days"], historical_snapshot_hash(historical_data))
+
+
+# Parciales de cada stream de insights en curso, por llave de insights_cache:
+# el primer request hace la llamada (single-flight) y los concurrentes
+# reciben los mismos parciales
+_insights_partials: dict = {}
+
+
+async def stream_ai_insights(key: tuple, historical_data: dict) -> dict:
+    """
+    Igual que get_ai_insights pero con stream_chat, publicando cada parcial
+    (JSON reparado) a los requests suscritos a la llave
+    """
+    if not llm_client.configured:
+        return {"error": "OpenRouter API key not configured", "fallback": True}
+
+    broadcast = _insights_partials.setdefault(key, {"last": None, "listeners": set()})
+    broadcast["running"] = True
+    broadcast["last"] = None
+    parser = IncrementalJSONParser()
+    try:
+        async for chunk in llm_client.stream_chat(
+            messages=[{"role": "user", "content": build_insights_prompt(historical_data)}],
+            model=INSIGHTS_MODEL,
+            max_tokens=1000,
+            temperature=0.3,
+        ):
+            parser.feed(chunk)
+            partial = parser.snapshot()
+            if isinstance(partial, dict) and partial and partial != broadcast["last"]:
+                broadcast["last"] = partial
+                for queue in broadcast["listeners"]:
+                    queue.put_nowait(partial)
+        return parse_insights_response(parser.text)
+    except Exception as e:
+        print(f"Error streaming AI insights: {e}")
+        reason = "JSON parse error" if isinstance(e, json.JSONDecodeError) else str(e)
+        return {"error": reason, "fallback": True}
+    finally:
+        broadcast["running"] = False
+        _release_insights_broadcast(key, broadcast)
+
+
+def _release_insights_broadcast(key: tuple, broadcast: dict):
+    """Se elimina cuando ya no hay llamada en curso ni requests escuchando"""
+    if not broadcast.get("running") and not broadcast["listeners"] and _insights_partials.get(key) is broadcast:
+        del _insights_partials[key]
+
+
 # ============================================
 # ENDPOINTS
 # ============================================
@@ -280,9 +386,9 @@ async def estimate_build_time(
         elif employee_experience < 3:
             confidence = "low"
 
-    # Rango (±15%)
-    min_time = int(estimation["estimated_time_seconds"] * 0.85)
-    max_time = int(estimation["estimated_time_seconds"] * 1.15)
+    # Rango: intervalo de predicción calibrado (±15% sin calibración)
+    min_time = estimation["min_time_seconds"]
+    max_time = estimation["max_time_seconds"]
 
     # Recomendaciones simples
     recommendations = []
@@ -308,7 +414,231 @@ async def estimate_build_time(
             "complexity_multiplier": estimation["complexity_multiplier"]
         },
         "recommendations": recommendations,
-        "model_type": "mathematical"
+        "model_type": "calibrated" if estimation["model_version"] else "mathematical",
+        "model_version": estimation["model_version"]
+    }
+
+
+@router.get("/estimate/model")
+def get_estimation_model():
+    """Coeficientes vigentes del modelo (calibrados o constantes base)"""
+    return get_coefficients().to_dict()
+
+
+async def resolve_batch_drawers(request: BatchEstimateRequest) -> dict:
+    """
+    Convierte la petición en columnas (listas paralelas) para estimate_batch
+    Drawers de flight_ids: items de drawer_content, tipo y turno del vuelo
+    """
+    columns = {"item_count": [], "flight_type": [], "experience": [], "flight_id": [], "shift": []}
+
+    for d in request.drawers or []:
+        columns["item_count"].append(d.item_count)
+        columns["flight_type"].append(d.flight_type)
+        columns["experience"].append(d.employee_experience)
+        columns["flight_id"].append(d.flight_id or "sin_vuelo")
+        columns["shift"].append(normalize_time_of_day(d.shift) if d.shift else "sin_turno")
+
+    if request.flight_ids:
+        flights, drawers = await asyncio.gather(
+            run_in_threadpool(get_flights_by_ids, request.flight_ids),
+            run_in_threadpool(get_flight_drawer_items, request.flight_ids),
+        )
+        flights_by_id = {f["id"]: f for f in flights or []}
+        for d in drawers:
+            flight = flights_by_id.get(d["flight_id"], {})
+            arrival = flight.get("arrival_time")
+            columns["item_count"].append(d["item_count"])
+            columns["flight_type"].append(flight.get("flight_type") or "")
+            columns["experience"].append(request.employee_experience)
+            columns["flight_id"].append(d["flight_id"])
+            columns["shift"].append(
+                hour_to_time_of_day(datetime.fromisoformat(arrival).hour) if arrival else "sin_turno"
+            )
+
+    return columns
+
+
+@router.post("/estimate/batch")
+async def estimate_build_time_batch(request: BatchEstimateRequest):
+    """
+    MODELO MATEMÁTICO vectorizado: estima muchos drawers a la vez
+
+    - Recibe drawers explícitos y/o IDs de vuelos
+    - Una sola pasada NumPy (lookup de multiplicadores por índice)
+    - Totales por vuelo y por turno para planear el turno completo
+    """
+    if not request.drawers and not request.flight_ids:
+        raise HTTPException(status_code=400, detail="Envía 'drawers' o 'flight_ids'")
+
+    invalid = sorted({d.flight_type for d in request.drawers or []} - set(COMPLEXITY_MULTIPLIERS))
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"flight_type inválido: {', '.join(invalid)}. Debe ser: {', '.join(COMPLEXITY_MULTIPLIERS.keys())}"
+        )
+
+    columns = await resolve_batch_drawers(request)
+    coefficients = get_coefficients()
+    result = estimate_batch(columns["item_count"], columns["flight_type"], columns["experience"])
+    seconds = result["seconds"]
+    total_seconds = float(seconds.sum())
+
+    response = {
+        "total_drawers": len(seconds),
+        "total": {
+            "estimated_time_seconds": int(total_seconds),
+            "estimated_time_minutes": round(total_seconds / 60, 1),
+            "estimated_time_hours": round(total_seconds / 3600, 2),
+            "time_range": {
+                "min_hours": round(total_seconds * coefficients.interval["low"] / 3600, 2),
+                "max_hours": round(total_seconds * coefficients.interval["high"] / 3600, 2),
+            },
+        },
+        "by_flight": [
+            {"flight_id": g.pop("key"), **g} for g in group_totals(columns["flight_id"], seconds)
+        ],
+        "by_shift": [
+            {"shift": g.pop("key"), **g} for g in group_totals(columns["shift"], seconds)
+        ],
+        "unknown_flight_types": int((result["flight_type_index"] < 0).sum()),
+        "model_type": "calibrated" if coefficients.calibrated else "mathematical",
+        "model_version": coefficients.version,
+    }
+
+    if request.include_drawers:
+        type_idx = result["flight_type_index"]
+        response["drawers"] = {
+            "estimated_time_seconds": seconds.astype(int).tolist(),
+            "flight_id": columns["flight_id"],
+            "flight_type": [FLIGHT_TYPES[i] if i >= 0 else None for i in type_idx.tolist()],
+            "experience_level": [EXPERIENCE_LEVELS[i] for i in result["experience_level_index"].tolist()],
+        }
+
+    return response
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Fechas sin zona horaria se interpretan como UTC"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def resolve_schedule_flights(request: ScheduleRequest) -> List[ScheduleFlight]:
+    """Vuelos explícitos + vuelos de Supabase con sus drawers registrados"""
+    buffer = timedelta(minutes=request.buffer_minutes)
+    flights = [
+        ScheduleFlight(
+            flight_id=f.flight_id,
+            flight_type=f.flight_type,
+            deadline=_as_utc(f.arrival_time) - buffer,
+            item_counts=f.item_counts if f.item_counts is not None else [f.items_per_drawer] * (f.drawers or 0),
+        )
+        for f in request.flights or []
+    ]
+
+    if request.flight_ids:
+        rows, drawers = await asyncio.gather(
+            run_in_threadpool(get_flights_by_ids, request.flight_ids),
+            run_in_threadpool(get_flight_drawer_items, request.flight_ids),
+        )
+        items_by_flight = {}
+        for d in drawers:
+            if d["item_count"] > 0:
+                items_by_flight.setdefault(d["flight_id"], []).append(d["item_count"])
+        for row in rows or []:
+            if not row.get("arrival_time"):
+                continue
+            flights.append(ScheduleFlight(
+                flight_id=row["id"],
+                flight_type=row.get("flight_type") or "",
+                deadline=_as_utc(datetime.fromisoformat(row["arrival_time"])) - buffer,
+                item_counts=items_by_flight.get(row["id"], []),
+            ))
+
+    return flights
+
+
+@router.post("/schedule")
+async def schedule_shift(request: ScheduleRequest):
+    """
+    Asigna los drawers del turno a los empleados disponibles
+
+    - Costo: modelo de estimación (nivel de experiencia de cada empleado)
+    - Heurística EDF + LPT: cumple deadlines (llegada - buffer) y reduce el makespan
+    - Drawers que no alcanzan su deadline se marcan como tarde
+    """
+    if not request.flights and not request.flight_ids:
+        raise HTTPException(status_code=400, detail="Envía 'flights' o 'flight_ids'")
+
+    flights = await resolve_schedule_flights(request)
+    employees = [
+        ScheduleEmployee(
+            employee_id=e.employee_id,
+            experience_months=e.experience_months,
+            available_from=_as_utc(e.available_from) if e.available_from else None,
+        )
+        for e in request.employees
+    ]
+    shift_start = _as_utc(request.shift_start) if request.shift_start else datetime.now(timezone.utc)
+
+    plan = await run_in_threadpool(schedule_drawers, flights, employees, shift_start)
+    if not request.include_assignments:
+        for emp in plan["employees"]:
+            emp.pop("assignments")
+    return plan
+
+
+def no_data_response(employee_id: str, days_back: int) -> dict:
+    return {
+        "employee_id": employee_id,
+        "period_days": days_back,
+        "has_data": False,
+        "message": "Completa más drawers para ver análisis personalizado",
+        "efficiency_rating": "unknown",
+        "strengths": [],
+        "improvement_areas": ["Completar drawers para generar insights"],
+        "recommendations": ["Enfócate en mantener consistencia"]
+    }
+
+
+def build_statistics(historical_data: dict, days_back: int) -> dict:
+    """Estadísticas básicas (locales, sin AI)"""
+    return {
+        "completed_drawers": historical_data["completed_drawers"],
+        "average_time_minutes": round(historical_data["average_time_seconds"] / 60, 1),
+        "drawers_per_day": round(historical_data["completed_drawers"] / days_back, 1),
+        "best_time_minutes": round(historical_data["min_time_seconds"] / 60, 1),
+        "worst_time_minutes": round(historical_data["max_time_seconds"] / 60, 1),
+        "p50_time_minutes": to_minutes(historical_data.get("p50_time_seconds")),
+        "p90_time_minutes": to_minutes(historical_data.get("p90_time_seconds"))
+    }
+
+
+def fallback_insights(historical_data: dict, days_back: int, reason: str) -> dict:
+    """Insights simples por reglas cuando el AI no está disponible"""
+    avg_time_minutes = round(historical_data["average_time_seconds"] / 60, 1)
+    efficiency_rating = "medium"
+    if avg_time_minutes < 15:
+        efficiency_rating = "high"
+    elif avg_time_minutes > 20:
+        efficiency_rating = "low"
+
+    return {
+        "efficiency_rating": efficiency_rating,
+        "performance_label": "Alto" if efficiency_rating == "high" else "Medio",
+        "strengths": [f"Promedio de {avg_time_minutes} min/drawer"],
+        "improvement_areas": ["Analiza tus tiempos para encontrar patrones"],
+        "recommendations": ["Mantén consistencia en tu trabajo"],
+        "insights": f"Has completado {historical_data['completed_drawers']} drawers en {days_back} días.",
+        "ai_generated": False,
+        "fallback_reason": reason
+    }
+
+
+def build_benchmarks(statistics: dict) -> dict:
+    return {
+        "target_time_minutes": TARGET_TIME_MINUTES,
+        "your_vs_target": round(statistics["average_time_minutes"] - TARGET_TIME_MINUTES, 1)
     }
 
 
@@ -329,51 +659,22 @@ async def get_productivity_insights(
     historical_data = await get_historical_data(employee_id, days_back)
 
     if not historical_data or historical_data["completed_drawers"] == 0:
-        return {
-            "employee_id": employee_id,
-            "period_days": days_back,
-            "has_data": False,
-            "message": "Completa más drawers para ver análisis personalizado",
-            "efficiency_rating": "unknown",
-            "strengths": [],
-            "improvement_areas": ["Completar drawers para generar insights"],
-            "recommendations": ["Enfócate en mantener consistencia"]
-        }
+        return no_data_response(employee_id, days_back)
 
     # Calcular estadísticas básicas
-    avg_time_minutes = round(historical_data["average_time_seconds"] / 60, 1)
-    drawers_per_day = round(historical_data["completed_drawers"] / days_back, 1)
+    statistics = build_statistics(historical_data, days_back)
 
     # Intentar obtener insights de AI
-    ai_insights = await get_ai_insights(employee_id, historical_data)
+    ai_insights = await get_cached_ai_insights(employee_id, historical_data)
 
     # Si AI falló, usar fallback simple
     if ai_insights.get("fallback"):
-        efficiency_rating = "medium"
-        if avg_time_minutes < 15:
-            efficiency_rating = "high"
-        elif avg_time_minutes > 20:
-            efficiency_rating = "low"
-
         return {
             "employee_id": employee_id,
             "period_days": days_back,
             "has_data": True,
-            "statistics": {
-                "completed_drawers": historical_data["completed_drawers"],
-                "average_time_minutes": avg_time_minutes,
-                "drawers_per_day": drawers_per_day,
-                "best_time_minutes": round(historical_data["min_time_seconds"] / 60, 1),
-                "worst_time_minutes": round(historical_data["max_time_seconds"] / 60, 1)
-            },
-            "efficiency_rating": efficiency_rating,
-            "performance_label": "Alto" if efficiency_rating == "high" else "Medio",
-            "strengths": [f"Promedio de {avg_time_minutes} min/drawer"],
-            "improvement_areas": ["Analiza tus tiempos para encontrar patrones"],
-            "recommendations": ["Mantén consistencia en tu trabajo"],
-            "insights": f"Has completado {historical_data['completed_drawers']} drawers en {days_back} días.",
-            "ai_generated": False,
-            "fallback_reason": ai_insights.get("error", "AI not available")
+            "statistics": statistics,
+            **fallback_insights(historical_data, days_back, ai_insights.get("error", "AI not available"))
         }
 
     # Retornar insights de AI + estadísticas
@@ -381,21 +682,218 @@ async def get_productivity_insights(
         "employee_id": employee_id,
         "period_days": days_back,
         "has_data": True,
-        "statistics": {
-            "completed_drawers": historical_data["completed_drawers"],
-            "average_time_minutes": avg_time_minutes,
-            "drawers_per_day": drawers_per_day,
-            "best_time_minutes": round(historical_data["min_time_seconds"] / 60, 1),
-            "worst_time_minutes": round(historical_data["max_time_seconds"] / 60, 1)
-        },
+        "statistics": statistics,
         **ai_insights,  # Merge AI insights
-        "benchmarks": {
-            "target_time_minutes": 18,
-            "your_vs_target": round(avg_time_minutes - 18, 1)
-        }
+        "benchmarks": build_benchmarks(statistics)
     }
 
 
+@router.get("/insights/{employee_id}/stream")
+async def stream_productivity_insights(
+    employee_id: str,
+    days_back: int = Query(30, ge=7, le=90)
+):
+    """
+    Insights como Server-Sent Events
+
+    - event: statistics -> estadísticas locales, de inmediato
+    - event: partial    -> insights parciales (JSON reparado) conforme llega Gemini
+    - event: insights   -> análisis final (AI, cache o fallback)
+    - event: done
+    """
+    historical_data = await get_historical_data(employee_id, days_back)
+
+    async def events():
+        if not historical_data or historical_data["completed_drawers"] == 0:
+            yield sse_event("insights", no_data_response(employee_id, days_back))
+            yield sse_event("done", {})
+            return
+
+        statistics = build_statistics(historical_data, days_back)
+        yield sse_event("statistics", {
+            "employee_id": employee_id,
+            "period_days": days_back,
+            "has_data": True,
+            "statistics": statistics,
+            "benchmarks": build_benchmarks(statistics),
+        })
+
+        key = insights_cache_key(employee_id, historical_data)
+        cached = insights_cache.peek(key) is not None
+
+        # Pasa por el single-flight como /insights: requests concurrentes del
+        # mismo empleado comparten una llamada y aquí solo se escuchan parciales
+        queue: asyncio.Queue = asyncio.Queue()
+        broadcast = _insights_partials.setdefault(key, {"last": None, "listeners": set()})
+        broadcast["listeners"].add(queue)
+        if broadcast["last"] is not None:
+            queue.put_nowait(broadcast["last"])
+        result = asyncio.ensure_future(insights_cache.get_or_compute(
+            key,
+            lambda: stream_ai_insights(key, historical_data),
+            should_cache=lambda insights: not insights.get("fallback"),
+        ))
+        try:
+            while not result.done():
+                partial = asyncio.ensure_future(queue.get())
+                await asyncio.wait({partial, result}, return_when=asyncio.FIRST_COMPLETED)
+                if partial.done():
+                    yield sse_event("partial", partial.result())
+                else:
+                    partial.cancel()
+            insights = result.result()
+        finally:
+            result.cancel()
+            broadcast["listeners"].discard(queue)
+            _release_insights_broadcast(key, broadcast)
+
+        if insights.get("fallback"):
+            yield sse_event("insights", fallback_insights(historical_data, days_back, insights.get("error", "AI not available")))
+        else:
+            yield sse_event("insights", {**insights, "cached": True} if cached else insights)
+        yield sse_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+TEAM_SORT_FIELDS = {
+    "average": "average_time_minutes",
+    "p50": "p50_time_minutes",
+    "p90": "p90_time_minutes",
+    "drawers": "completed_drawers",
+    "drawers_per_day": "drawers_per_day",
+    "trend": "trend_minutes_per_week",
+    "vs_target": "vs_target_minutes",
+}
+
+
+def build_team_stats(site: Optional[str], days_back: int) -> dict:
+    """Una consulta de rollups para todo el equipo + pasada vectorizada"""
+    query = supabase.table("employees").select("id, name, role, site")
+    if site:
+        query = query.eq("site", site)
+    employees = {e["id"]: e for e in query.execute().data or []}
+
+    if not employees:
+        rows = []
+    elif site:
+        # Solo las filas del equipo: la consulta escala con el sitio, no con la empresa
+        rows = fetch_rollup_rows(days_back, employee_ids=list(employees))
+    else:
+        rows = [r for r in fetch_rollup_rows(days_back) if r.get("employee_id") in employees]
+    members = []
+    for stats in summarize_team_rollups(rows):
+        employee = employees[stats["employee_id"]]
+        # Sin drawers con tiempo registrado no hay promedio (no cuenta como 0)
+        average = None if stats["mean_sec"] is None else stats["mean_sec"] / 60
+        trend = stats["trend_sec_per_day"]
+        members.append({
+            "employee_id": stats["employee_id"],
+            "name": employee.get("name"),
+            "role": employee.get("role"),
+            "site": employee.get("site"),
+            "completed_drawers": stats["completed_drawers"],
+            "timed_drawers": stats["timed_drawers"],
+            "active_days": stats["active_days"],
+            "drawers_per_day": round(stats["completed_drawers"] / days_back, 1),
+            "average_time_minutes": None if average is None else round(average, 1),
+            "std_time_minutes": to_minutes(stats["std_sec"]),
+            "best_time_minutes": to_minutes(stats["min_sec"]),
+            "worst_time_minutes": to_minutes(stats["max_sec"]),
+            "p50_time_minutes": to_minutes(stats["p50_sec"]),
+            "p90_time_minutes": to_minutes(stats["p90_sec"]),
+            # Minutos por drawer que cambia el promedio cada semana (negativo = mejora)
+            "trend_minutes_per_week": None if trend is None else round(trend * 7 / 60, 2),
+            "vs_target_minutes": None if average is None else round(average - TARGET_TIME_MINUTES, 1),
+            "meets_target": None if average is None else average <= TARGET_TIME_MINUTES,
+        })
+
+    return {
+        "members": members,
+        "employees_without_data": len(employees) - len(members),
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+@router.get("/team")
+async def get_team_productivity(
+    site: Optional[str] = Query(None),
+    days_back: int = Query(30, ge=7, le=90),
+    sort_by: str = Query("average"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(25, ge=1, le=200)
+):
+    """
+    Leaderboard del equipo (todos los empleados de un sitio)
+
+    - Una sola consulta a productivity_daily_rollup + cálculo vectorizado
+    - count, promedio, p50/p90, tendencia y comparación contra el objetivo
+    - Paginado y ordenable; cacheado por (site, days_back)
+    """
+    if sort_by not in TEAM_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort_by debe ser: {', '.join(TEAM_SORT_FIELDS.keys())}"
+        )
+
+    key = (site, days_back)
+    team = team_cache.get(key)
+    cached = team is not None
+    if team is None:
+        team = await run_in_threadpool(build_team_stats, site, days_back)
+        team_cache.set(key, team)
+
+    field = TEAM_SORT_FIELDS[sort_by]
+    reverse = order == "desc"
+    # Los valores None (p. ej. tendencia con un solo día) siempre al final
+    with_value = [m for m in team["members"] if m[field] is not None]
+    without_value = [m for m in team["members"] if m[field] is None]
+    ranked = sorted(with_value, key=lambda m: m[field], reverse=reverse) + without_value
+
+    members = team["members"]
+    timed = [m for m in members if m["average_time_minutes"] is not None]
+    start = (page - 1) * page_size
+    return {
+        "site": site,
+        "period_days": days_back,
+        "target_time_minutes": TARGET_TIME_MINUTES,
+        "team_size": len(members),
+        "employees_without_data": team["employees_without_data"],
+        "team_average_minutes": round(
+            sum(m["average_time_minutes"] * m["timed_drawers"] for m in timed)
+            / max(sum(m["timed_drawers"] for m in timed), 1), 1
+        ),
+        "sort_by": sort_by,
+        "order": order,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": (len(ranked) + page_size - 1) // page_size,
+        "members": [
+            {"rank": start + i + 1, **m} for i, m in enumerate(ranked[start:start + page_size])
+        ],
+        "computed_at": team["computed_at"],
+        "cached": cached,
+    }
+
+
+@router.post("/rollup/refresh")
+async def refresh_productivity_rollup():
+    """
+    Fuerza el refresco de los rollups diarios (p. ej. al completar un drawer)
+    El job en background hace lo mismo cada PRODUCTIVITY_ROLLUP_INTERVAL_SEC
+    """
+    try:
+        result = await run_in_threadpool(refresh_rollup)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refrescando rollup: {e}")
+
+    if result.get("days_refreshed"):
+        historical_cache.invalidate()
+
+    return {"status": "success", **result}
+
+
 @router.get("/compare")
 async def compare_actual_vs_estimated(
     actual_time_seconds: int = Query(..., ge=1),
@@ -414,10 +912,11 @@ async def compare_actual_vs_estimated(
     difference_minutes = round(difference_seconds / 60, 1)
     difference_percent = round((difference_seconds / estimated_seconds) * 100, 1)
 
+    # Dentro del intervalo de predicción -> on_target
     performance = "on_target"
-    if difference_percent <= -15:
+    if actual_time_seconds < estimation["min_time_seconds"]:
         performance = "excellent"
-    elif difference_percent <= 15:
+    elif actual_time_seconds <= estimation["max_time_seconds"]:
         performance = "on_target"
     else:
         performance = "needs_improvement"
@@ -0,0 +1,60 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class HourlyScans(BaseModel):
+    hour: str  # ISO UTC, inicio de la hora
+    total: int
+    by_status: Dict[str, int]
+
+class ScansPerHourResponse(BaseModel):
+    hours_back: int
+    flight_id: Optional[str] = None
+    total: int
+    series: List[HourlyScans]
+    cached: bool = False
+
+class FlightStatusDistribution(BaseModel):
+    flight_id: Optional[str] = None
+    flight_number: Optional[str] = None
+    arrival_time: Optional[str] = None
+    total: int
+    by_status: Dict[str, int]
+    expired_rate: float
+
+class StatusDistributionResponse(BaseModel):
+    days_back: int
+    flights: List[FlightStatusDistribution]
+    cached: bool = False
+
+class ProductQuarantineRate(BaseModel):
+    product_id: str
+    name: Optional[str] = None
+    sku: Optional[str] = None
+    category: Optional[str] = None
+    scans: int
+    quarantined: int
+    quarantine_rate: float
+
+class QuarantineRateResponse(BaseModel):
+    days_back: int
+    total_scans: int
+    total_quarantined: int
+    products: List[ProductQuarantineRate]
+    cached: bool = False
+
+class DailyDrawers(BaseModel):
+    day: str
+    drawers: int
+
+class SiteThroughput(BaseModel):
+    site: Optional[str] = None
+    drawers: int
+    verified: int
+    drawers_per_day: float
+    avg_build_time_seconds: Optional[float] = None
+    daily: List[DailyDrawers]
+
+class DrawerThroughputResponse(BaseModel):
+    days_back: int
+    sites: List[SiteThroughput]
+    cached: bool = False
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Literal, Optional
+
+AssemblyEventType = Literal["drawer_started", "item_scanned", "drawer_completed"]
+
+class AssemblyEvent(BaseModel):
+    """Evento de ensamblaje enviado por la app móvil"""
+    type: AssemblyEventType
+    employee_id: str
+    drawer_id: str
+    flight_id: Optional[str] = None
+    station_id: Optional[str] = None
+    timestamp: Optional[datetime] = None     # si falta se usa la hora de llegada
+    quantity: int = Field(1, ge=1)           # item_scanned
+    build_time_sec: Optional[int] = Field(None, ge=0)  # drawer_completed (si no, se calcula)
+    trolley_type: str = "standard"
+
+class AssemblyEventBatch(BaseModel):
+    events: List[AssemblyEvent] = Field(..., min_length=1, max_length=1000)
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+class BatchFlightInput(BaseModel):
+    """Un vuelo a predecir (mismos parámetros que GET /predict)"""
+    flight_id: Optional[str] = None
+    flight_number: Optional[str] = None
+    origin_country: str
+    flight_duration: str  # HH:MM
+    time_of_day: str
+    confirmed_passengers: int = Field(..., ge=0)
+
+class BatchPredictRequest(BaseModel):
+    """Lista explícita de vuelos o rango de fechas contra la tabla flights"""
+    flights: Optional[List[BatchFlightInput]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    include_reports: bool = False
+    max_report_concurrency: int = Field(4, ge=1, le=16)
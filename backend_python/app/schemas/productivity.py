@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+class BatchDrawerInput(BaseModel):
+    """Un drawer a estimar (mismos parámetros que GET /productivity/estimate)"""
+    item_count: int = Field(..., ge=1, le=100)
+    flight_type: str
+    employee_experience: Optional[int] = Field(None, ge=0, le=240)
+    flight_id: Optional[str] = None
+    shift: Optional[str] = None  # mañana / tarde / noche
+
+class BatchEstimateRequest(BaseModel):
+    """Lista explícita de drawers o IDs de vuelos (se leen sus drawers de Supabase)"""
+    drawers: Optional[List[BatchDrawerInput]] = None
+    flight_ids: Optional[List[str]] = None
+    employee_experience: Optional[int] = Field(None, ge=0, le=240)  # para drawers de flight_ids
+    include_drawers: bool = False
+
+class ScheduleEmployeeInput(BaseModel):
+    employee_id: str
+    experience_months: Optional[int] = Field(None, ge=0, le=240)
+    available_from: Optional[datetime] = None
+
+class ScheduleFlightInput(BaseModel):
+    """Vuelo con sus drawers: item_counts por drawer, o drawers + items_per_drawer"""
+    flight_id: str
+    flight_type: str
+    arrival_time: datetime
+    item_counts: Optional[List[int]] = None
+    drawers: Optional[int] = Field(None, ge=0, le=1000)
+    items_per_drawer: int = Field(20, ge=1, le=100)
+
+class ScheduleRequest(BaseModel):
+    """Vuelos explícitos y/o IDs de vuelos (drawers registrados en drawers_assembled)"""
+    employees: List[ScheduleEmployeeInput] = Field(..., min_length=1)
+    flights: Optional[List[ScheduleFlightInput]] = None
+    flight_ids: Optional[List[str]] = None
+    shift_start: Optional[datetime] = None
+    buffer_minutes: int = Field(30, ge=0, le=240)  # drawers listos antes de la llegada
+    include_assignments: bool = True
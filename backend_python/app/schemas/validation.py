@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class ScanValidationItem(BaseModel):
+    """Un item a validar; expiry_date en ISO (YYYY-MM-DD)"""
+    product_id: Optional[str] = None
+    expiry_date: Optional[str] = None
+    lot_number: Optional[str] = None
+    flight_id: Optional[str] = None
+
+class ScanValidationRequest(BaseModel):
+    items: List[ScanValidationItem] = Field(..., min_length=1, max_length=5000)
+    route_duration_minutes: Optional[int] = Field(None, ge=0, le=24 * 60)
+
+class DrawerValidationRequest(BaseModel):
+    quarantine: bool = True
+    rejected_by: Optional[str] = None
+    rejected_by_name: Optional[str] = None
+    route_duration_minutes: Optional[int] = Field(None, ge=0, le=24 * 60)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import date
 
@@ -38,6 +38,11 @@ class ScannedProductCreate(BaseModel):
     status: str  # 'valid', 'warning', 'expired'
     image_url: Optional[str] = None
     confidence_score: Optional[float] = None
+    idempotency_key: Optional[str] = None  # si falta: barcode + drawer + scanned_at
+
+class ScannedProductBatch(BaseModel):
+    """Scans de un drawer (p. ej. la cola offline de la app móvil)"""
+    scans: List[ScannedProductCreate] = Field(..., min_length=1, max_length=1000)
 
 class ScannedProductOut(BaseModel):
     """Producto escaneado con información completa"""
@@ -0,0 +1,241 @@
+"""
+Analytics para dashboards sobre agregados precalculados
+- Tablas analytics_* (ver sql/005_analytics_aggregates.sql): scans por hora,
+  scans/cuarentena por producto y día, drawers por site y día
+- Job en background que las refresca desde sus watermarks y limpia el cache
+- Cada consulta lee O(cubetas) filas, no O(historial)
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.db import supabase
+from app.services.error_monitor import capture_exception
+from app.services.flight import get_flights_by_ids
+from app.utils.cache import TTLCache
+
+ANALYTICS_PAGE_SIZE = 1000
+EXPIRY_STATUSES = ("valid", "warning", "expired")
+
+REFRESH_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_REFRESH_INTERVAL_SEC", "120"))
+
+analytics_cache = TTLCache(
+    ttl_seconds=float(os.getenv("ANALYTICS_CACHE_TTL_SEC", "300")),
+    max_entries=512
+)
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+# ============================================
+# REFRESH
+# ============================================
+
+def refresh_analytics(full: bool = False) -> dict:
+    """Recalcula las cubetas con filas nuevas; si cambió algo se limpia el cache"""
+    result = supabase.rpc("refresh_analytics_aggregates", {"p_full": full}).execute().data or {}
+    if any(result.values()):
+        analytics_cache.invalidate()
+    return result
+
+
+async def _refresh_loop(interval: float):
+    while True:
+        try:
+            result = await run_in_threadpool(refresh_analytics)
+            if any(result.values()):
+                print(f"📊 Analytics actualizados: {result}")
+        except Exception as e:
+            print(f"⚠️ Error refrescando analytics: {e}")
+            capture_exception(e, route="analytics_refresh")
+        await asyncio.sleep(interval)
+
+
+def start_analytics_job():
+    """Arranca el job periódico (ANALYTICS_REFRESH_INTERVAL_SEC=0 lo desactiva)"""
+    global _refresh_task
+    if REFRESH_INTERVAL_SECONDS <= 0 or _refresh_task is not None:
+        return
+    _refresh_task = asyncio.create_task(_refresh_loop(REFRESH_INTERVAL_SECONDS))
+
+
+async def stop_analytics_job():
+    global _refresh_task
+    if _refresh_task is None:
+        return
+    _refresh_task.cancel()
+    try:
+        await _refresh_task
+    except asyncio.CancelledError:
+        pass
+    _refresh_task = None
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def _fetch_aggregate(table: str, columns: str, column: str, since: str, order: str, **filters) -> List[dict]:
+    """Filas de la tabla agregada desde since, paginando con range()"""
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns).gte(column, since)
+        for name, value in filters.items():
+            if isinstance(value, list):
+                query = query.in_(name, value)
+            elif value is not None:
+                query = query.eq(name, value)
+        page = query.order(order).range(start, start + ANALYTICS_PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < ANALYTICS_PAGE_SIZE:
+            return rows
+        start += ANALYTICS_PAGE_SIZE
+
+
+def _utc_today() -> date:
+    """Las tablas diarias agrupan por día UTC (sql/005)"""
+    return datetime.now(timezone.utc).date()
+
+
+def _empty_statuses() -> dict:
+    return {status: 0 for status in EXPIRY_STATUSES}
+
+
+def scans_per_hour(hours_back: int = 24, flight_id: Optional[str] = None) -> dict:
+    """Serie por hora (UTC) con desglose por estado; las horas sin scans van en 0"""
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    first = now - timedelta(hours=hours_back - 1)
+    rows = _fetch_aggregate(
+        "analytics_scans_hourly", "hour, status, scans", "hour", first.isoformat(), "hour",
+        flight_id=flight_id,
+    )
+
+    by_hour = defaultdict(_empty_statuses)
+    for row in rows:
+        hour = datetime.fromisoformat(row["hour"]).replace(tzinfo=None)
+        by_hour[hour][row["status"]] = by_hour[hour].get(row["status"], 0) + row["scans"]
+
+    series = []
+    for i in range(hours_back):
+        hour = first + timedelta(hours=i)
+        statuses = by_hour.get(hour, _empty_statuses())
+        series.append({"hour": hour.isoformat() + "Z", "total": sum(statuses.values()), "by_status": statuses})
+    return {
+        "hours_back": hours_back,
+        "flight_id": flight_id,
+        "total": sum(p["total"] for p in series),
+        "series": series,
+    }
+
+
+def status_distribution(days_back: int = 7, flight_ids: Optional[List[str]] = None) -> dict:
+    """valid / warning / expired por vuelo, con la tasa de caducados"""
+    since = (datetime.now(timezone.utc) - timedelta(days=days_back)).replace(tzinfo=None).isoformat()
+    rows = _fetch_aggregate(
+        "analytics_scans_hourly", "flight_id, status, scans", "hour", since, "hour", flight_id=flight_ids or None,
+    )
+
+    by_flight = defaultdict(_empty_statuses)
+    for row in rows:
+        statuses = by_flight[row["flight_id"]]
+        statuses[row["status"]] = statuses.get(row["status"], 0) + row["scans"]
+
+    flights = {f["id"]: f for f in get_flights_by_ids([fid for fid in by_flight if fid]) or []}
+    result = []
+    for flight_id, statuses in by_flight.items():
+        total = sum(statuses.values())
+        flight = flights.get(flight_id, {})
+        result.append({
+            "flight_id": flight_id,
+            "flight_number": flight.get("flight_number"),
+            "arrival_time": flight.get("arrival_time"),
+            "total": total,
+            "by_status": statuses,
+            "expired_rate": round(statuses.get("expired", 0) / total, 4) if total else 0.0,
+        })
+    result.sort(key=lambda f: (f["expired_rate"], f["total"]), reverse=True)
+    return {"days_back": days_back, "flights": result}
+
+
+def quarantine_rates(days_back: int = 30, min_scans: int = 1, limit: int = 20) -> dict:
+    """Productos con más cuarentena relativa a lo escaneado"""
+    since = (_utc_today() - timedelta(days=days_back)).isoformat()
+    rows = _fetch_aggregate("analytics_product_daily", "product_id, scans, quarantined", "day", since, "day")
+
+    totals = defaultdict(lambda: [0, 0])
+    for row in rows:
+        totals[row["product_id"]][0] += row["scans"]
+        totals[row["product_id"]][1] += row["quarantined"]
+
+    ranked = sorted(
+        (
+            (pid, scans, quarantined, quarantined / scans)
+            for pid, (scans, quarantined) in totals.items()
+            if pid and scans >= max(min_scans, 1)
+        ),
+        key=lambda r: (r[3], r[2]),
+        reverse=True,
+    )[:limit]
+
+    product_ids = [r[0] for r in ranked]
+    products = {
+        p["id"]: p for p in
+        (supabase.table("products").select("id, name, sku, category").in_("id", product_ids).execute().data or [])
+    } if product_ids else {}
+
+    return {
+        "days_back": days_back,
+        "total_scans": sum(v[0] for v in totals.values()),
+        "total_quarantined": sum(v[1] for v in totals.values()),
+        "products": [
+            {
+                "product_id": pid,
+                "name": products.get(pid, {}).get("name"),
+                "sku": products.get(pid, {}).get("sku"),
+                "category": products.get(pid, {}).get("category"),
+                "scans": scans,
+                "quarantined": quarantined,
+                "quarantine_rate": round(rate, 4),
+            }
+            for pid, scans, quarantined, rate in ranked
+        ],
+    }
+
+
+def drawer_throughput(days_back: int = 7, site: Optional[str] = None) -> dict:
+    """Drawers por día y site, con promedio diario y tiempo medio de ensamblaje"""
+    today = _utc_today()
+    since = (today - timedelta(days=days_back - 1)).isoformat()
+    rows = _fetch_aggregate(
+        "analytics_drawers_daily", "day, site, drawers, verified, timed, sum_build_sec", "day", since, "day",
+        site=site,
+    )
+
+    by_site = defaultdict(lambda: {"drawers": 0, "verified": 0, "timed": 0, "sum_build_sec": 0.0, "daily": {}})
+    for row in rows:
+        stats = by_site[row["site"]]
+        stats["drawers"] += row["drawers"]
+        stats["verified"] += row["verified"]
+        stats["timed"] += row["timed"]
+        stats["sum_build_sec"] += row["sum_build_sec"]
+        stats["daily"][row["day"]] = stats["daily"].get(row["day"], 0) + row["drawers"]
+
+    days = [(today - timedelta(days=i)).isoformat() for i in range(days_back - 1, -1, -1)]
+    sites = []
+    for site_name, stats in by_site.items():
+        sites.append({
+            "site": site_name,
+            "drawers": stats["drawers"],
+            "verified": stats["verified"],
+            "drawers_per_day": round(stats["drawers"] / days_back, 2),
+            "avg_build_time_seconds": round(stats["sum_build_sec"] / stats["timed"], 1) if stats["timed"] else None,
+            "daily": [{"day": day, "drawers": stats["daily"].get(day, 0)} for day in days],
+        })
+    sites.sort(key=lambda s: s["drawers"], reverse=True)
+    return {"days_back": days_back, "sites": sites}
@@ -0,0 +1,490 @@
+"""
+Modelo de tiempo de ensamblaje de drawers
+- Estimación individual (GET /productivity/estimate)
+- Estimación masiva vectorizada con NumPy: tablas de lookup indexadas por
+  tipo de vuelo y nivel de experiencia, sin loops de Python por drawer
+- Coeficientes calibrados con el historial de drawers_assembled
+  (scripts/calibrate_build_time.py); el archivo JSON se recarga en caliente
+  cuando cambia, sin reiniciar. Sin archivo se usan las constantes base
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.db import fetch_all_rows, supabase
+
+BUILD_TIME_COEFFICIENTS_PATH = os.getenv("BUILD_TIME_COEFFICIENTS_PATH", "models/build_time_coefficients.json")
+COEFFICIENTS_VERSION = 1
+RELOAD_CHECK_SECONDS = 30.0
+
+# ============================================
+# CONSTANTES DEL MODELO MATEMÁTICO
+# ============================================
+
+BASE_TIME_PER_ITEM = 15  # segundos por item
+
+COMPLEXITY_MULTIPLIERS = {
+    "Economy": 1.0,
+    "Business": 1.3,
+    "First-Class": 1.6,
+    "Premium Economy": 1.15,
+    "International": 1.2,  # Vuelos internacionales
+    "Domestic": 0.95       # Vuelos domésticos
+}
+
+EXPERIENCE_ADJUSTMENTS = {
+    "novice": 1.4,       # < 3 meses
+    "intermediate": 1.2, # 3-6 meses
+    "experienced": 1.0,  # 6-12 meses
+    "expert": 0.85       # > 12 meses
+}
+
+# Rango por defecto (±15%) mientras no haya intervalos calibrados
+DEFAULT_INTERVAL = {"low": 0.85, "high": 1.15}
+
+# Orden fijo de los índices usados por el cálculo vectorizado
+FLIGHT_TYPES = tuple(COMPLEXITY_MULTIPLIERS)
+EXPERIENCE_LEVELS = tuple(EXPERIENCE_ADJUSTMENTS)
+_FLIGHT_TYPE_INDEX = {t: i for i, t in enumerate(FLIGHT_TYPES)}
+_EXPERIENCED = EXPERIENCE_LEVELS.index("experienced")
+
+
+# ============================================
+# COEFICIENTES (DEFAULT O CALIBRADOS)
+# ============================================
+
+class BuildTimeCoefficients:
+    """Segundos por item, multiplicadores e intervalo de predicción"""
+
+    def __init__(
+        self,
+        base_time_per_item: float = BASE_TIME_PER_ITEM,
+        complexity_multipliers: Optional[Dict[str, float]] = None,
+        experience_adjustments: Optional[Dict[str, float]] = None,
+        interval: Optional[Dict[str, float]] = None,
+        version: Optional[str] = None,
+        trained_at: Optional[str] = None,
+        n_samples: int = 0,
+        metrics: Optional[dict] = None,
+    ):
+        self.base_time_per_item = float(base_time_per_item)
+        self.complexity_multipliers = {**COMPLEXITY_MULTIPLIERS, **(complexity_multipliers or {})}
+        self.experience_adjustments = {**EXPERIENCE_ADJUSTMENTS, **(experience_adjustments or {})}
+        self.interval = {**DEFAULT_INTERVAL, **(interval or {})}
+        self.version = version
+        self.trained_at = trained_at
+        self.n_samples = n_samples
+        self.metrics = metrics or {}
+        self.complexity_lookup = np.array([self.complexity_multipliers[t] for t in FLIGHT_TYPES])
+        self.experience_lookup = np.array([self.experience_adjustments[lvl] for lvl in EXPERIENCE_LEVELS])
+
+    @property
+    def calibrated(self) -> bool:
+        return self.version is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "schema_version": COEFFICIENTS_VERSION,
+            "version": self.version,
+            "trained_at": self.trained_at,
+            "n_samples": self.n_samples,
+            "base_time_per_item": self.base_time_per_item,
+            "complexity_multipliers": self.complexity_multipliers,
+            "experience_adjustments": self.experience_adjustments,
+            "interval": self.interval,
+            "metrics": self.metrics,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BuildTimeCoefficients":
+        if data.get("schema_version") != COEFFICIENTS_VERSION:
+            raise ValueError(f"Versión de coeficientes no soportada: {data.get('schema_version')}")
+        return cls(
+            base_time_per_item=data["base_time_per_item"],
+            complexity_multipliers=data.get("complexity_multipliers"),
+            experience_adjustments=data.get("experience_adjustments"),
+            interval=data.get("interval"),
+            version=data.get("version"),
+            trained_at=data.get("trained_at"),
+            n_samples=data.get("n_samples", 0),
+            metrics=data.get("metrics"),
+        )
+
+    def save(self, path: str):
+        """Escritura atómica + copia con la versión en el nombre (historial)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+        root, ext = os.path.splitext(path)
+        with open(f"{root}.{self.version}{ext}", "w", encoding="utf-8") as f:
+            f.write(payload)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def info(self) -> dict:
+        return {
+            "calibrated": self.calibrated,
+            "version": self.version,
+            "trained_at": self.trained_at,
+            "n_samples": self.n_samples,
+        }
+
+
+class CoefficientStore:
+    """Recarga el archivo de coeficientes cuando cambia su mtime (revisa cada RELOAD_CHECK_SECONDS)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._current = BuildTimeCoefficients()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def get(self) -> BuildTimeCoefficients:
+        now = time.monotonic()
+        if now - self._checked_at >= RELOAD_CHECK_SECONDS:
+            self.reload()
+        return self._current
+
+    def reload(self, force: bool = False) -> BuildTimeCoefficients:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if self._mtime is not None:
+                    print(f"⚠️ Coeficientes {self.path} eliminados, usando constantes base")
+                self._current, self._mtime = BuildTimeCoefficients(), None
+                return self._current
+
+            if force or mtime != self._mtime:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._current = BuildTimeCoefficients.from_dict(json.load(f))
+                    print(f"✅ Coeficientes de tiempo de ensamblaje cargados: {self._current.info()}")
+                except (OSError, ValueError, KeyError) as e:
+                    # Se conserva la versión anterior si el archivo nuevo está mal
+                    print(f"❌ Error cargando coeficientes de tiempo de ensamblaje: {e}")
+                self._mtime = mtime
+            return self._current
+
+
+coefficient_store = CoefficientStore(BUILD_TIME_COEFFICIENTS_PATH)
+
+
+def get_coefficients() -> BuildTimeCoefficients:
+    return coefficient_store.get()
+
+
+# ============================================
+# ESTIMACIÓN INDIVIDUAL
+# ============================================
+
+def get_experience_level(months: Optional[int]) -> str:
+    """Determina nivel de experiencia"""
+    if not months:
+        return "experienced"
+    if months < 3:
+        return "novice"
+    elif months < 6:
+        return "intermediate"
+    elif months <= 12:
+        return "experienced"
+    else:
+        return "expert"
+
+
+def calculate_base_estimate(item_count: int, flight_type: str, experience_months: Optional[int]) -> dict:
+    """
+    MODELO MATEMÁTICO: Estimación rápida sin AI
+    """
+    coefficients = get_coefficients()
+    base_time = item_count * coefficients.base_time_per_item
+    complexity_multiplier = coefficients.complexity_multipliers.get(flight_type, 1.0)
+    adjusted_time = base_time * complexity_multiplier
+
+    experience_level = get_experience_level(experience_months)
+    experience_multiplier = coefficients.experience_adjustments[experience_level]
+    final_time = adjusted_time * experience_multiplier
+
+    estimated_minutes = round(final_time / 60, 1)
+
+    return {
+        "estimated_time_seconds": int(final_time),
+        "estimated_time_minutes": estimated_minutes,
+        "min_time_seconds": int(final_time * coefficients.interval["low"]),
+        "max_time_seconds": int(final_time * coefficients.interval["high"]),
+        "complexity_multiplier": round(complexity_multiplier, 3),
+        "experience_multiplier": round(experience_multiplier, 3),
+        "experience_level": experience_level,
+        "model_version": coefficients.version,
+    }
+
+
+# ============================================
+# ESTIMACIÓN MASIVA (NUMPY)
+# ============================================
+
+def flight_type_indices(flight_types: Sequence[str]) -> np.ndarray:
+    """
+    Índices en FLIGHT_TYPES; -1 para tipos desconocidos
+    Se resuelven solo los valores únicos y se expanden con el inverso
+    """
+    if len(flight_types) == 0:
+        return np.zeros(0, dtype=np.int64)
+    uniques, inverse = np.unique(np.asarray(flight_types, dtype=object).astype(str), return_inverse=True)
+    unique_idx = np.array([_FLIGHT_TYPE_INDEX.get(t, -1) for t in uniques], dtype=np.int64)
+    return unique_idx[inverse]
+
+
+def experience_level_indices(experience_months: Sequence[Optional[int]]) -> np.ndarray:
+    """Índices en EXPERIENCE_LEVELS con las mismas reglas que get_experience_level"""
+    months = np.array([np.nan if m is None else m for m in experience_months], dtype=np.float64)
+    idx = np.select(
+        [months < 3, months < 6, months <= 12],
+        [0, 1, 2],
+        default=3,
+    )
+    # None o 0 meses -> "experienced" (igual que `if not months`)
+    idx[np.isnan(months) | (months == 0)] = _EXPERIENCED
+    return idx.astype(np.int64)
+
+
+def estimate_batch(
+    item_counts: Sequence[int],
+    flight_types: Sequence[str],
+    experience_months: Sequence[Optional[int]],
+) -> Dict[str, np.ndarray]:
+    """
+    Estimación de N drawers en una sola pasada:
+    items * segundos_por_item * complejidad[tipo] * experiencia[nivel]
+    Tipos desconocidos usan multiplicador 1.0 (como calculate_base_estimate)
+    """
+    coefficients = get_coefficients()
+    items = np.asarray(item_counts, dtype=np.float64)
+    type_idx = flight_type_indices(flight_types)
+    level_idx = experience_level_indices(experience_months)
+
+    complexity = np.where(type_idx >= 0, coefficients.complexity_lookup[np.maximum(type_idx, 0)], 1.0)
+    experience = coefficients.experience_lookup[level_idx]
+    seconds = items * coefficients.base_time_per_item * complexity * experience
+
+    return {
+        "seconds": seconds,
+        "flight_type_index": type_idx,
+        "experience_level_index": level_idx,
+    }
+
+
+def group_totals(keys: Sequence, seconds: np.ndarray) -> List[dict]:
+    """Suma de segundos y número de drawers por llave (vuelo, turno) con bincount"""
+    if len(keys) == 0:
+        return []
+    uniques, inverse = np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True)
+    totals = np.bincount(inverse, weights=seconds, minlength=len(uniques))
+    counts = np.bincount(inverse, minlength=len(uniques))
+    return [
+        {
+            "key": key,
+            "drawers": int(count),
+            "estimated_time_seconds": int(total),
+            "estimated_time_minutes": round(total / 60, 1),
+            "estimated_time_hours": round(total / 3600, 2),
+        }
+        for key, total, count in zip(uniques.tolist(), totals, counts)
+    ]
+
+
+def get_flight_drawer_items(flight_ids: List[str]) -> List[dict]:
+    """
+    Drawers de los vuelos con su número de items (suma de drawer_content.quantity)
+    Retorna [{"drawer_id", "flight_id", "item_count"}]
+    """
+    if not flight_ids:
+        return []
+
+    drawers = supabase.table("drawers_assembled").select("id, flight_id") \
+        .in_("flight_id", flight_ids).execute().data or []
+    if not drawers:
+        return []
+
+    drawer_ids = [d["id"] for d in drawers]
+    content = supabase.table("drawer_content").select("drawer_id, quantity") \
+        .in_("drawer_id", drawer_ids).execute().data or []
+
+    items: Dict[str, int] = {}
+    for row in content:
+        items[row["drawer_id"]] = items.get(row["drawer_id"], 0) + (row.get("quantity") or 0)
+
+    return [
+        {"drawer_id": d["id"], "flight_id": d["flight_id"], "item_count": items.get(d["id"], 0)}
+        for d in drawers
+    ]
+
+
+# ============================================
+# CALIBRACIÓN (JOB OFFLINE)
+# ============================================
+
+MIN_CALIBRATION_SAMPLES = 30
+PRIOR_WEIGHT_SAMPLES = 10.0      # peso de las constantes base (en "drawers")
+SECONDS_PER_ITEM_BOUNDS = (1.0, 600.0)  # descarta registros imposibles
+INTERVAL_QUANTILES = (0.10, 0.90)
+DAYS_PER_MONTH = 30.44
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def build_calibration_samples(
+    drawers: List[dict],
+    drawer_content: List[dict],
+    flights: List[dict],
+    productivity_logs: List[dict],
+) -> List[dict]:
+    """
+    Une drawers_assembled con items (drawer_content), tipo de vuelo y empleado
+    La experiencia se aproxima con la antigüedad del empleado al completar el
+    drawer (meses desde su primer drawer registrado), ya que employees no
+    guarda fecha de ingreso
+    """
+    items: Dict[str, int] = defaultdict(int)
+    for row in drawer_content:
+        items[row["drawer_id"]] += row.get("quantity") or 0
+
+    flight_types = {f["id"]: f.get("flight_type") for f in flights}
+    employee_by_drawer = {
+        log["drawer_id"]: log["employee_id"]
+        for log in productivity_logs
+        if log.get("drawer_id") and log.get("employee_id")
+    }
+
+    completed = {d["id"]: _parse_ts(d.get("completed_at")) for d in drawers}
+    first_drawer: Dict[str, datetime] = {}
+    for drawer_id, employee_id in employee_by_drawer.items():
+        ts = completed.get(drawer_id)
+        if ts and (employee_id not in first_drawer or ts < first_drawer[employee_id]):
+            first_drawer[employee_id] = ts
+
+    samples = []
+    for d in drawers:
+        seconds = d.get("total_assembly_time_sec")
+        item_count = items.get(d["id"], 0)
+        if not seconds or item_count <= 0:
+            continue
+
+        months = None
+        employee_id = employee_by_drawer.get(d["id"])
+        ts = completed.get(d["id"])
+        if employee_id and ts:
+            # Mínimo 1: get_experience_level trata 0 meses como "sin dato"
+            months = max(1, int((ts - first_drawer[employee_id]).days / DAYS_PER_MONTH))
+
+        samples.append({
+            "item_count": item_count,
+            "flight_type": flight_types.get(d.get("flight_id")) or "",
+            "experience_months": months,
+            "seconds": float(seconds),
+        })
+    return samples
+
+
+def fit_coefficients(samples: Sequence[dict]) -> BuildTimeCoefficients:
+    """
+    Regresión log-lineal: log(seg / item) = log(base) + log(complejidad) + log(experiencia)
+    - Economy y "experienced" son la referencia (multiplicador 1.0)
+    - Cada coeficiente se encoge hacia la constante base con PRIOR_WEIGHT_SAMPLES
+      observaciones ficticias (mínimos cuadrados aumentados), así categorías
+      con pocos drawers no se disparan
+    - El intervalo sale de los cuantiles de los residuos (log) del ajuste
+    """
+    lo, hi = SECONDS_PER_ITEM_BOUNDS
+    rows = [
+        s for s in samples
+        if s["flight_type"] in _FLIGHT_TYPE_INDEX and lo <= s["seconds"] / s["item_count"] <= hi
+    ]
+    if len(rows) < MIN_CALIBRATION_SAMPLES:
+        raise ValueError(f"Se requieren al menos {MIN_CALIBRATION_SAMPLES} drawers válidos, hay {len(rows)}")
+
+    type_cols = [t for t in FLIGHT_TYPES if t != "Economy"]
+    level_cols = [lvl for lvl in EXPERIENCE_LEVELS if lvl != "experienced"]
+    n_params = 1 + len(type_cols) + len(level_cols)
+
+    items = np.array([s["item_count"] for s in rows], dtype=np.float64)
+    seconds = np.array([s["seconds"] for s in rows], dtype=np.float64)
+    type_idx = flight_type_indices([s["flight_type"] for s in rows])
+    level_idx = experience_level_indices([s["experience_months"] for s in rows])
+
+    X = np.zeros((len(rows), n_params))
+    X[:, 0] = 1.0
+    for j, t in enumerate(type_cols, start=1):
+        X[:, j] = type_idx == FLIGHT_TYPES.index(t)
+    for j, lvl in enumerate(level_cols, start=1 + len(type_cols)):
+        X[:, j] = level_idx == EXPERIENCE_LEVELS.index(lvl)
+    y = np.log(seconds / items)
+
+    prior = np.log(np.array(
+        [BASE_TIME_PER_ITEM]
+        + [COMPLEXITY_MULTIPLIERS[t] for t in type_cols]
+        + [EXPERIENCE_ADJUSTMENTS[lvl] for lvl in level_cols]
+    ))
+    weight = math.sqrt(PRIOR_WEIGHT_SAMPLES)
+    X_aug = np.vstack([X, weight * np.eye(n_params)])
+    y_aug = np.concatenate([y, weight * prior])
+    beta, *_ = np.linalg.lstsq(X_aug, y_aug, rcond=None)
+
+    residuals = y - X @ beta
+    q_low, q_high = np.quantile(residuals, INTERVAL_QUANTILES)
+    predicted = np.exp(X @ beta) * items
+    mape = float(np.mean(np.abs(predicted - seconds) / seconds))
+    coverage = float(np.mean((residuals >= q_low) & (residuals <= q_high)))
+
+    now = datetime.now(timezone.utc)
+    return BuildTimeCoefficients(
+        base_time_per_item=round(float(np.exp(beta[0])), 3),
+        complexity_multipliers={
+            t: round(float(np.exp(beta[j])), 3) for j, t in enumerate(type_cols, start=1)
+        },
+        experience_adjustments={
+            lvl: round(float(np.exp(beta[j])), 3) for j, lvl in enumerate(level_cols, start=1 + len(type_cols))
+        },
+        interval={"low": round(float(np.exp(q_low)), 3), "high": round(float(np.exp(q_high)), 3)},
+        version=now.strftime("%Y%m%d%H%M%S"),
+        trained_at=now.isoformat(),
+        n_samples=len(rows),
+        metrics={
+            "mape": round(mape, 4),
+            "residual_std": round(float(residuals.std()), 4),
+            "interval_coverage": round(coverage, 3),
+            "samples_by_flight_type": {t: int((type_idx == i).sum()) for i, t in enumerate(FLIGHT_TYPES)},
+            "samples_by_experience": {lvl: int((level_idx == i).sum()) for i, lvl in enumerate(EXPERIENCE_LEVELS)},
+        },
+    )
+
+
+def calibrate_from_supabase(path: str = BUILD_TIME_COEFFICIENTS_PATH) -> BuildTimeCoefficients:
+    """Descarga el historial, ajusta y guarda el archivo versionado"""
+    drawers = [
+        d for d in fetch_all_rows("drawers_assembled", "id, flight_id, total_assembly_time_sec, completed_at, verified")
+        if d.get("verified")
+    ]
+    content = fetch_all_rows("drawer_content", "drawer_id, quantity")
+    flights = fetch_all_rows("flights", "id, flight_type")
+    logs = fetch_all_rows("productivity_logs", "employee_id, drawer_id")
+
+    coefficients = fit_coefficients(build_calibration_samples(drawers, content, flights, logs))
+    coefficients.save(path)
+    return coefficients
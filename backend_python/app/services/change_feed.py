@@ -0,0 +1,205 @@
+"""
+Feed de cambios de Supabase hacia el bus de eventos
+- Un solo loop consulta scanned_products, quarantine_items y drawers_assembled
+  y publica las filas nuevas; así cientos de pantallas se alimentan de una
+  sola lectura en lugar de que cada una haga polling
+- Cursor (timestamp, id) sobre columnas que pone el servidor (ingested_at,
+  updated_at): no se pierden filas con el mismo timestamp entre páginas ni
+  scans offline con scanned_at atrasado; se deja POLL_LAG_SECONDS para no
+  saltarse transacciones que todavía no hacen commit
+- La ingesta propia (POST /api/scans/batch) publica al instante con
+  publish_rows; el poll ya no las repite
+- drawers_assembled cambia por muchas razones (verificación, triggers de
+  updated_at): solo la primera vez que se ve con completed_at se publica
+  drawer_completed; el resto de cambios son drawer_updated
+- Solo consulta cuando hay suscriptores conectados
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.db import supabase
+from app.services.error_monitor import capture_exception
+from app.services.event_bus import event_bus, event_topics
+
+POLL_INTERVAL_SECONDS = float(os.getenv("LIVE_POLL_INTERVAL_SEC", "2"))
+SITE_MAP_TTL_SECONDS = 600
+POLL_LIMIT = 500
+POLL_LAG_SECONDS = float(os.getenv("LIVE_POLL_LAG_SEC", "1"))
+PUBLISHED_MEMORY = 5000
+
+# tabla -> (columna del cursor, tipo de evento, llave de coalescing, filtros eq)
+# (el tipo de drawers_assembled se decide por fila, ver _event_type)
+WATCHED_TABLES = {
+    "scanned_products": ("ingested_at", "scan", "scan:{id}", {}),
+    "quarantine_items": ("created_at", "quarantine", "quarantine:{id}", {}),
+    "drawers_assembled": ("updated_at", "drawer_completed", "drawer:{id}", {"verified": True}),
+}
+
+_task: Optional[asyncio.Task] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+# tabla -> (timestamp, id) de la última fila publicada (id None: solo timestamp)
+_watermarks: Dict[str, Tuple[str, Optional[str]]] = {}
+# (tabla, id) publicados por la ingesta propia, para no repetirlos en el poll
+_published: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+# Drawers ya anunciados como drawer_completed
+_completed_drawers: "OrderedDict[str, None]" = OrderedDict()
+_feed_started_at: Optional[datetime] = None
+_employee_sites: Dict[str, str] = {}
+_sites_loaded_at = 0.0
+
+
+def employee_site(employee_id: Optional[str]) -> Optional[str]:
+    return _employee_sites.get(employee_id) if employee_id else None
+
+
+def _refresh_employee_sites():
+    global _employee_sites, _sites_loaded_at
+    rows = supabase.table("employees").select("id, site").execute().data or []
+    _employee_sites = {r["id"]: r["site"] for r in rows if r.get("site")}
+    _sites_loaded_at = time.monotonic()
+
+
+def _upper_bound() -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=POLL_LAG_SECONDS)).isoformat()
+
+
+def _poll_table(table: str, column: str, cursor: Tuple[str, Optional[str]], filters: dict) -> list:
+    since, last_id = cursor
+    query = supabase.table(table).select("*").lt(column, _upper_bound())
+    for name, value in filters.items():
+        query = query.eq(name, value)
+    if last_id is None:
+        query = query.gt(column, since)
+    else:
+        # Orden estable (timestamp, id): no repite ni pierde filas con el mismo timestamp
+        query = query.or_(f'{column}.gt."{since}",and({column}.eq."{since}",id.gt."{last_id}")')
+    return query.order(column).order("id").limit(POLL_LIMIT).execute().data or []
+
+
+def _row_site(row: dict) -> Optional[str]:
+    return employee_site(row.get("scanned_by") or row.get("rejected_by") or row.get("employee_id"))
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _event_type(table: str, row: dict) -> str:
+    """
+    drawer_completed solo la primera vez que un drawer aparece con completed_at;
+    los completados antes de arrancar el feed ya no cuentan como nuevos
+    """
+    event_type = WATCHED_TABLES[table][1]
+    if table != "drawers_assembled":
+        return event_type
+
+    drawer_id = str(row.get("id"))
+    if not row.get("completed_at") or drawer_id in _completed_drawers:
+        return "drawer_updated"
+    _completed_drawers[drawer_id] = None
+    while len(_completed_drawers) > PUBLISHED_MEMORY:
+        _completed_drawers.popitem(last=False)
+    completed_at = _parse_timestamp(row["completed_at"])
+    if completed_at is not None and _feed_started_at is not None and completed_at < _feed_started_at:
+        return "drawer_updated"
+    return event_type
+
+
+def _publish(table: str, row: dict):
+    _, _, key_template, _ = WATCHED_TABLES[table]
+    event_type = _event_type(table, row)
+    event_bus.publish(
+        event_topics(row.get("flight_id"), _row_site(row)),
+        {"type": event_type, "table": table, "data": row},
+        key=key_template.format(id=row.get("id")),
+    )
+
+
+def _publish_new(table: str, rows: List[dict]):
+    for row in rows:
+        _publish(table, row)
+        _published[(table, str(row.get("id")))] = None
+        while len(_published) > PUBLISHED_MEMORY:
+            _published.popitem(last=False)
+
+
+def publish_rows(table: str, rows: List[dict]):
+    """
+    Publica filas recién insertadas por la API sin esperar al poll
+    Se puede llamar desde el threadpool: el bus solo se toca en el loop
+    """
+    if not rows:
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None or _loop is None:
+        _publish_new(table, rows)
+    else:
+        _loop.call_soon_threadsafe(_publish_new, table, list(rows))
+
+
+async def poll_once():
+    """Lee las filas nuevas de cada tabla y las publica en el bus"""
+    if time.monotonic() - _sites_loaded_at > SITE_MAP_TTL_SECONDS:
+        await run_in_threadpool(_refresh_employee_sites)
+
+    for table, (column, _, _, filters) in WATCHED_TABLES.items():
+        rows = await run_in_threadpool(_poll_table, table, column, _watermarks[table], filters)
+        for row in rows:
+            if (table, str(row.get("id"))) not in _published:
+                _publish(table, row)
+        if rows:
+            _watermarks[table] = (rows[-1][column], rows[-1]["id"])
+
+
+async def _feed_loop():
+    global _feed_started_at
+    _feed_started_at = datetime.now(timezone.utc)
+    now = _upper_bound()
+    for table in WATCHED_TABLES:
+        _watermarks.setdefault(table, (now, None))
+
+    while True:
+        if event_bus.subscriber_count:
+            try:
+                await poll_once()
+            except Exception as e:
+                print(f"⚠️ Error leyendo cambios para el feed en vivo: {e}")
+                capture_exception(e, route="change_feed")
+        else:
+            # Sin clientes el watermark avanza para no reenviar historial al reconectar
+            now = _upper_bound()
+            for table in WATCHED_TABLES:
+                _watermarks[table] = (now, None)
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+def start_change_feed():
+    global _task, _loop
+    if _task is None:
+        _loop = asyncio.get_running_loop()
+        _task = asyncio.create_task(_feed_loop())
+
+
+async def stop_change_feed():
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -0,0 +1,142 @@
+"""
+Revisión completa de un drawer en una llamada
+- Valida la caducidad de todos sus scanned_products contra los cortes del vuelo
+- Compara lo escaneado con drawer_content (faltantes y sobrantes)
+- Manda a cuarentena los items caducados con un solo insert en
+  quarantine_items (sin duplicar los que ya están pendientes)
+"""
+
+from collections import Counter
+from typing import List, Optional
+
+from app.db import supabase
+from app.services.validation import (
+    STATUS_EXPIRED,
+    get_flight_cutoffs,
+    summarize_statuses,
+    validate_items,
+)
+
+
+# La app móvil guarda "ok" cuando no hubo validación de fecha
+STATUS_ALIASES = {"ok": "valid"}
+
+
+class DrawerNotFound(Exception):
+    pass
+
+
+def _quarantine_key(item: dict) -> tuple:
+    return (item.get("product_id"), item.get("lot_number"), str(item.get("expiry_date") or "")[:10])
+
+
+def build_quarantine_rows(
+    drawer: dict,
+    expired: List[dict],
+    existing: List[dict],
+    products: dict,
+    rejected_by: Optional[str],
+    rejected_by_name: Optional[str],
+) -> List[dict]:
+    """Filas para quarantine_items (mismo formato que la app móvil), sin duplicados"""
+    seen = {_quarantine_key(q) for q in existing}
+    rows = []
+    for item in expired:
+        key = _quarantine_key(item)
+        if key in seen:
+            continue
+        seen.add(key)
+        product = products.get(item["product_id"], {})
+        rows.append({
+            "product_id": item["product_id"],
+            "product_name": product.get("name"),
+            "product_code": product.get("sku"),
+            "rejection_reason": "expired",
+            "rejection_details": f"Caduca {item['expiry_date']}, antes de terminar el vuelo",
+            "expiry_date": item["expiry_date"],
+            "lot_number": item.get("lot_number"),
+            "drawer_id": drawer["id"],
+            "drawer_number": drawer.get("drawer_number"),
+            "flight_id": drawer.get("flight_id"),
+            "rejected_by": rejected_by,
+            "rejected_by_name": rejected_by_name,
+            "status": "pending",
+        })
+    return rows
+
+
+def compare_with_content(content: List[dict], results: List[dict]) -> dict:
+    """Faltantes (esperado - escaneado usable) y productos escaneados que no van en el drawer"""
+    expected = Counter()
+    for row in content:
+        expected[row["product_id"]] += row.get("quantity") or 0
+    usable = Counter(r["product_id"] for r in results if r["status"] != STATUS_EXPIRED)
+
+    missing = [
+        {"product_id": pid, "expected": qty, "usable_scanned": usable.get(pid, 0), "missing": qty - usable.get(pid, 0)}
+        for pid, qty in expected.items()
+        if usable.get(pid, 0) < qty
+    ]
+    unexpected = sorted(pid for pid in usable if pid not in expected)
+    return {"missing": missing, "unexpected_products": unexpected, "complete": not missing}
+
+
+def check_drawer(
+    drawer_id: str,
+    quarantine: bool = True,
+    rejected_by: Optional[str] = None,
+    rejected_by_name: Optional[str] = None,
+    route_duration_minutes: Optional[int] = None,
+) -> dict:
+    drawer = supabase.table("drawers_assembled").select("id, drawer_number, flight_id") \
+        .eq("id", drawer_id).limit(1).execute().data
+    if not drawer:
+        raise DrawerNotFound(drawer_id)
+    drawer = drawer[0]
+
+    scans = supabase.table("scanned_products") \
+        .select("id, product_id, expiry_date, lot_number, status") \
+        .eq("drawer_id", drawer_id).execute().data or []
+    content = supabase.table("drawer_content").select("product_id, quantity") \
+        .eq("drawer_id", drawer_id).execute().data or []
+
+    cutoffs = get_flight_cutoffs([drawer.get("flight_id")], route_duration_minutes)
+    flight_cutoffs = cutoffs.get(drawer.get("flight_id"), cutoffs[None])
+    results = validate_items(
+        [{**s, "stored_status": s.get("status"), "flight_id": drawer.get("flight_id")} for s in scans],
+        cutoffs,
+    )
+    for r in results:
+        r.pop("flight_id", None)
+
+    expired = [r for r in results if r["status"] == STATUS_EXPIRED]
+    quarantined: List[dict] = []
+    if quarantine and expired:
+        existing = supabase.table("quarantine_items") \
+            .select("product_id, lot_number, expiry_date") \
+            .eq("drawer_id", drawer_id).eq("status", "pending").execute().data or []
+        product_ids = list({r["product_id"] for r in expired})
+        products = {
+            p["id"]: p for p in
+            supabase.table("products").select("id, name, sku").in_("id", product_ids).execute().data or []
+        }
+        rows = build_quarantine_rows(drawer, expired, existing, products, rejected_by, rejected_by_name)
+        if rows:
+            quarantined = supabase.table("quarantine_items").insert(rows).execute().data or rows
+
+    return {
+        "drawer_id": drawer_id,
+        "drawer_number": drawer.get("drawer_number"),
+        "flight_id": drawer.get("flight_id"),
+        "cutoffs": flight_cutoffs.as_dict(),
+        "summary": summarize_statuses(results),
+        "items": results,
+        "status_mismatches": [
+            {"id": r.get("id"), "stored_status": r["stored_status"], "status": r["status"]}
+            for r in results
+            if r.get("stored_status") and STATUS_ALIASES.get(r["stored_status"], r["stored_status"]) != r["status"]
+        ],
+        "content_check": compare_with_content(content, results),
+        "quarantined": len(quarantined),
+        "quarantine_items": quarantined,
+    }
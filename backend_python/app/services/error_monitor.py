@@ -0,0 +1,303 @@
+"""
+Monitor de errores en memoria
+- capture() guarda cada excepción en un ring buffer acotado con ruta,
+  servicios externos llamados en el request y un fingerprint
+  (tipo + frames de la app, sin números de línea ni mensaje)
+- Conteos por fingerprint y por minuto (últimos ERROR_WINDOW_MINUTES)
+- Nada de I/O en el camino del request: el traceback se extrae sin leer
+  el código fuente y el snapshot se escribe a disco en un task periódico
+"""
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import time
+import traceback
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from fastapi.exception_handlers import http_exception_handler
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from app.utils.metrics import current_upstream_services
+
+ERROR_BUFFER_SIZE = int(os.getenv("ERROR_BUFFER_SIZE", "500"))
+ERROR_WINDOW_MINUTES = int(os.getenv("ERROR_WINDOW_MINUTES", "60"))
+ERROR_PERSIST_INTERVAL_SECONDS = float(os.getenv("ERROR_PERSIST_INTERVAL_SEC", "60"))
+ERROR_MONITOR_PATH = os.getenv("ERROR_MONITOR_PATH", "data/error_monitor.json")
+# Los endpoints /errors exponen mensajes y trazas: sin token quedan cerrados
+ERROR_MONITOR_TOKEN = os.getenv("ERROR_MONITOR_TOKEN", "")
+MAX_MESSAGE_CHARS = 500
+MAX_TRACE_FRAMES = 15
+
+APP_PATH_MARKER = f"{os.sep}app{os.sep}"
+
+
+def _frames(exc: BaseException) -> traceback.StackSummary:
+    # lookup_lines=False: no abre los archivos fuente
+    return traceback.StackSummary.extract(traceback.walk_tb(exc.__traceback__), lookup_lines=False)
+
+
+def fingerprint_exception(exc: BaseException, frames: Optional[traceback.StackSummary] = None) -> str:
+    frames = frames if frames is not None else _frames(exc)
+    app_frames = [
+        f"{os.path.basename(f.filename)}:{f.name}" for f in frames if APP_PATH_MARKER in f.filename
+    ] or [f"{os.path.basename(f.filename)}:{f.name}" for f in frames[-3:]]
+    raw = "|".join([type(exc).__module__, type(exc).__qualname__, *app_frames])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ErrorMonitor:
+    def __init__(self, buffer_size: int = ERROR_BUFFER_SIZE, window_minutes: int = ERROR_WINDOW_MINUTES):
+        self.window_minutes = window_minutes
+        self.events: deque = deque(maxlen=buffer_size)
+        self.groups: Dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self.dirty = False
+
+    def capture(
+        self,
+        exc: BaseException,
+        route: Optional[str] = None,
+        method: Optional[str] = None,
+        status_code: Optional[int] = None,
+        source: str = "request",
+    ) -> str:
+        frames = _frames(exc)
+        fingerprint = fingerprint_exception(exc, frames)
+        now = time.time()
+        message = str(exc)[:MAX_MESSAGE_CHARS]
+        event = {
+            "id": next(self._ids),
+            "timestamp": now,
+            "fingerprint": fingerprint,
+            "type": type(exc).__qualname__,
+            "message": message,
+            "route": route,
+            "method": method,
+            "status_code": status_code,
+            "source": source,
+            "upstream": current_upstream_services(),
+            "trace": [f"{f.filename}:{f.lineno} {f.name}" for f in frames[-MAX_TRACE_FRAMES:]],
+        }
+        self.events.append(event)
+
+        group = self.groups.get(fingerprint)
+        if group is None:
+            group = self.groups[fingerprint] = {
+                "fingerprint": fingerprint,
+                "type": event["type"],
+                "message": message,
+                "routes": {},
+                "first_seen": now,
+                "last_seen": now,
+                "count": 0,
+                "per_minute": OrderedDict(),
+            }
+        group["count"] += 1
+        group["last_seen"] = now
+        group["message"] = message
+        if route:
+            group["routes"][route] = group["routes"].get(route, 0) + 1
+        minute = int(now // 60)
+        per_minute = group["per_minute"]
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+        while per_minute and next(iter(per_minute)) <= minute - self.window_minutes:
+            per_minute.popitem(last=False)
+
+        self.dirty = True
+        return fingerprint
+
+    # ---------- Consultas ----------
+
+    def _recent_count(self, group: dict, minutes: int) -> int:
+        since = int(time.time() // 60) - minutes
+        return sum(c for m, c in group["per_minute"].items() if m > since)
+
+    def summary(self, minutes: int = 60, limit: int = 50) -> dict:
+        groups = sorted(
+            (
+                {
+                    **{k: v for k, v in g.items() if k != "per_minute"},
+                    "recent_count": self._recent_count(g, minutes),
+                }
+                for g in self.groups.values()
+            ),
+            key=lambda g: (g["recent_count"], g["last_seen"]),
+            reverse=True,
+        )
+        return {
+            "window_minutes": minutes,
+            "total_recent": sum(g["recent_count"] for g in groups),
+            "fingerprints": len(groups),
+            "groups": groups[:limit],
+        }
+
+    def recent(self, limit: int = 50, fingerprint: Optional[str] = None, route: Optional[str] = None) -> List[dict]:
+        events = []
+        for event in reversed(self.events):
+            if fingerprint and event["fingerprint"] != fingerprint:
+                continue
+            if route and event["route"] != route:
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                break
+        return events
+
+    def group(self, fingerprint: str) -> Optional[dict]:
+        group = self.groups.get(fingerprint)
+        if group is None:
+            return None
+        current = int(time.time() // 60)
+        series = [
+            {"minute": (current - i) * 60, "count": group["per_minute"].get(current - i, 0)}
+            for i in range(self.window_minutes - 1, -1, -1)
+        ]
+        return {
+            **{k: v for k, v in group.items() if k != "per_minute"},
+            "per_minute": series,
+            "recent_events": self.recent(limit=20, fingerprint=fingerprint),
+        }
+
+    def reset(self):
+        self.events.clear()
+        self.groups.clear()
+        self.dirty = True
+
+    # ---------- Persistencia ----------
+
+    def snapshot(self) -> dict:
+        return {
+            "saved_at": time.time(),
+            "events": list(self.events),
+            "groups": [
+                {**g, "routes": dict(g["routes"]), "per_minute": [[m, c] for m, c in g["per_minute"].items()]}
+                for g in self.groups.values()
+            ],
+        }
+
+    def restore(self, data: dict):
+        for event in data.get("events", []):
+            self.events.append(event)
+        for g in data.get("groups", []):
+            g["per_minute"] = OrderedDict((int(m), c) for m, c in g.get("per_minute", []))
+            self.groups[g["fingerprint"]] = g
+        last_id = max((e.get("id", 0) for e in self.events), default=0)
+        self._ids = itertools.count(last_id + 1)
+
+
+error_monitor = ErrorMonitor()
+
+_task: Optional[asyncio.Task] = None
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    # En bytes: con str, compare_digest lanza TypeError si el header no es ASCII
+    return bool(ERROR_MONITOR_TOKEN) and hmac.compare_digest(
+        (token or "").encode("utf-8"), ERROR_MONITOR_TOKEN.encode("utf-8")
+    )
+
+
+def capture_exception(exc: BaseException, source: str = "background", **context) -> str:
+    """Para loops en segundo plano y servicios: registra sin propagar"""
+    return error_monitor.capture(exc, source=source, **context)
+
+
+def _route(scope) -> Optional[str]:
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path")
+
+
+async def monitored_http_exception_handler(request, exc: StarletteHTTPException):
+    """
+    Los endpoints convierten cualquier excepción en HTTPException(400, str(e));
+    la excepción original queda en __context__ y es la que se registra
+    """
+    cause = exc.__context__
+    if isinstance(cause, Exception) and not isinstance(cause, StarletteHTTPException):
+        error_monitor.capture(cause, _route(request.scope), request.method, exc.status_code)
+    elif exc.status_code >= 500:
+        error_monitor.capture(exc, _route(request.scope), request.method, exc.status_code)
+    return await http_exception_handler(request, exc)
+
+
+class ErrorMonitorMiddleware:
+    """Registra las excepciones no manejadas (las que terminan en 500)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        except Exception as exc:
+            error_monitor.capture(exc, _route(scope), scope.get("method"), 500)
+            raise
+
+
+def _write_snapshot(snapshot: dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _read_snapshot(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def persist_errors():
+    if not error_monitor.dirty:
+        return
+    error_monitor.dirty = False
+    try:
+        await run_in_threadpool(_write_snapshot, error_monitor.snapshot(), ERROR_MONITOR_PATH)
+    except OSError as e:
+        error_monitor.dirty = True
+        print(f"⚠️ No se pudo guardar el monitor de errores: {e}")
+
+
+async def _persist_loop():
+    while True:
+        await asyncio.sleep(ERROR_PERSIST_INTERVAL_SECONDS)
+        await persist_errors()
+
+
+async def start_error_monitor():
+    """Carga el último snapshot (si existe) y arranca el guardado periódico"""
+    global _task
+    try:
+        data = await run_in_threadpool(_read_snapshot, ERROR_MONITOR_PATH)
+        if data:
+            error_monitor.restore(data)
+            print(f"✅ Monitor de errores: {len(error_monitor.groups)} fingerprints restaurados")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer el monitor de errores: {e}")
+    if _task is None and ERROR_PERSIST_INTERVAL_SECONDS > 0:
+        _task = asyncio.create_task(_persist_loop())
+
+
+async def stop_error_monitor():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await persist_errors()
@@ -0,0 +1,113 @@
+"""
+Bus de eventos interno (pub/sub) para los feeds en vivo
+- Tópicos: "all", "flight:{id}", "site:{site}"
+- Cada suscriptor tiene un buffer propio con coalescing por llave: si llegan
+  varios eventos de la misma entidad antes de que el cliente los lea, solo
+  se envía el último
+- Backpressure: publicar nunca bloquea; si un cliente lento llena su buffer
+  se descartan los más viejos y se le avisa (dropped) para que resincronice
+"""
+
+import asyncio
+import itertools
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+MAX_PENDING_PER_SUBSCRIBER = int(os.getenv("LIVE_MAX_PENDING", "500"))
+BATCH_WINDOW_SECONDS = float(os.getenv("LIVE_BATCH_WINDOW_SEC", "0.1"))
+
+
+def event_topics(flight_id: Optional[str] = None, site: Optional[str] = None) -> List[str]:
+    topics = ["all"]
+    if flight_id:
+        topics.append(f"flight:{flight_id}")
+    if site:
+        topics.append(f"site:{site}")
+    return topics
+
+
+class Subscription:
+    _ids = itertools.count(1)
+
+    def __init__(self, bus: "EventBus", topics: Set[str], max_pending: int):
+        self.id = next(self._ids)
+        self.bus = bus
+        self.topics = topics
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[str, dict]" = OrderedDict()
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def offer(self, key: str, event: dict):
+        if key in self.pending:
+            # Coalescing: se reemplaza y se mueve al final (orden de la versión más nueva)
+            self.pending.pop(key)
+        elif len(self.pending) >= self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.pending[key] = event
+        self._ready.set()
+
+    async def next_batch(self) -> dict:
+        """Espera eventos, deja pasar BATCH_WINDOW_SECONDS para juntar ráfagas y los entrega"""
+        await self._ready.wait()
+        if BATCH_WINDOW_SECONDS > 0:
+            await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        events = list(self.pending.values())
+        self.pending.clear()
+        self._ready.clear()
+        dropped, self.dropped = self.dropped, 0
+        return {"events": events, "dropped": dropped}
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, max_pending: int = MAX_PENDING_PER_SUBSCRIBER):
+        self.max_pending = max_pending
+        self._by_topic: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len({s for subs in self._by_topic.values() for s in subs})
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        sub = Subscription(self, set(topics) or {"all"}, self.max_pending)
+        for topic in sub.topics:
+            self._by_topic.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        for topic in sub.topics:
+            subs = self._by_topic.get(topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_topic[topic]
+
+    def publish(self, topics: Iterable[str], event: dict, key: Optional[str] = None):
+        """
+        Entrega el evento a cada suscriptor de cualquiera de los tópicos (una vez)
+        key: identidad para coalescing (p. ej. "drawer:{id}"); sin key no se coalesce
+        """
+        self.published += 1
+        key = key or f"seq:{self.published}"
+        delivered: Set[int] = set()
+        for topic in topics:
+            for sub in self._by_topic.get(topic, ()):
+                if sub.id not in delivered:
+                    delivered.add(sub.id)
+                    sub.offer(key, event)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count,
+            "topics": {topic: len(subs) for topic, subs in self._by_topic.items()},
+            "published": self.published,
+        }
+
+
+event_bus = EventBus()
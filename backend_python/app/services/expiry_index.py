@@ -0,0 +1,372 @@
+"""
+Índice en memoria de fechas de caducidad de scanned_products
+- Cubetas por fecha de caducidad (global, por vuelo y por drawer): insertar
+  un scan es O(log d + tamaño de su cubeta), con d = fechas distintas, en
+  lugar del O(n) de mantener una sola lista ordenada
+- Consultas por rango y "caduca antes de" con bisect sobre las fechas:
+  O(log d + k)
+- Se reconstruye desde Supabase al arrancar (y cada EXPIRY_INDEX_REBUILD_SEC)
+  y se mantiene al día con los eventos "scan" del bus (change feed). Si el
+  bus descarta eventos se pide una reconstrucción al loop periódico, a lo
+  más una cada EXPIRY_INDEX_MIN_REBUILD_SEC
+"""
+
+import asyncio
+import bisect
+import os
+import threading
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.db import fetch_all_rows
+from app.services.error_monitor import capture_exception
+from app.services.event_bus import event_bus
+from app.services.validation import parse_expiry
+
+REBUILD_INTERVAL_SECONDS = float(os.getenv("EXPIRY_INDEX_REBUILD_SEC", "3600"))
+MIN_REBUILD_SECONDS = float(os.getenv("EXPIRY_INDEX_MIN_REBUILD_SEC", "60"))
+SCAN_COLUMNS = "id, product_id, drawer_id, flight_id, expiry_date, lot_number, status"
+
+Key = Tuple[int, str]  # (ordinal de la fecha, scan_id)
+
+
+class DateBuckets:
+    """Scan ids agrupados por fecha: fechas ordenadas + ids ordenados por fecha"""
+
+    def __init__(self):
+        self.dates: List[int] = []
+        self.ids: Dict[int, List[str]] = {}
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, key: Key):
+        day, scan_id = key
+        ids = self.ids.get(day)
+        if ids is None:
+            ids = self.ids[day] = []
+            bisect.insort(self.dates, day)
+        bisect.insort(ids, scan_id)
+        self.size += 1
+
+    def discard(self, key: Key):
+        day, scan_id = key
+        ids = self.ids.get(day)
+        if not ids:
+            return
+        i = bisect.bisect_left(ids, scan_id)
+        if i < len(ids) and ids[i] == scan_id:
+            del ids[i]
+            self.size -= 1
+            if not ids:
+                del self.ids[day]
+                del self.dates[bisect.bisect_left(self.dates, day)]
+
+    def _days(self, start: Optional[int], end: Optional[int]) -> List[int]:
+        lo = bisect.bisect_left(self.dates, start) if start is not None else 0
+        hi = bisect.bisect_right(self.dates, end) if end is not None else len(self.dates)
+        return self.dates[lo:hi]
+
+    def range(self, start: Optional[int], end: Optional[int], limit: Optional[int] = None) -> List[str]:
+        """ids con start <= fecha <= end, en orden (fecha, id)"""
+        result: List[str] = []
+        for day in self._days(start, end):
+            result.extend(self.ids[day])
+            if limit is not None and len(result) >= limit:
+                return result[:limit]
+        return result
+
+    def count(self, start: Optional[int], end: Optional[int]) -> int:
+        if start is None and end is None:
+            return self.size
+        return sum(len(self.ids[day]) for day in self._days(start, end))
+
+
+class ExpiryIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: Dict[str, dict] = {}
+        self.keys = DateBuckets()
+        self.by_flight: Dict[str, DateBuckets] = {}
+        self.by_drawer: Dict[str, DateBuckets] = {}
+        self.drawer_flights: Dict[str, str] = {}
+        self.built_at: Optional[str] = None
+        # Scans y vuelos de drawers que llegan mientras se reconstruye; se
+        # vuelven a aplicar al cambiar
+        self._replay: Optional[List[dict]] = None
+        self._replay_drawers: Optional[Dict[str, str]] = None
+
+    # ---------- Construcción ----------
+
+    @classmethod
+    def build(cls, scans: Iterable[dict], drawer_flights: Dict[str, str]) -> "ExpiryIndex":
+        """Ordena una sola vez (O(n log n)): cada inserción cae al final de su cubeta"""
+        index = cls()
+        index.drawer_flights = dict(drawer_flights)
+        for scan in scans:
+            record = index._normalize(scan)
+            if record:
+                index.records[record["id"]] = record
+
+        for key in sorted(index._key(r) for r in index.records.values()):
+            record = index.records[key[1]]
+            index.keys.add(key)
+            if record["flight_id"]:
+                index.by_flight.setdefault(record["flight_id"], DateBuckets()).add(key)
+            if record["drawer_id"]:
+                index.by_drawer.setdefault(record["drawer_id"], DateBuckets()).add(key)
+        return index
+
+    def _normalize(self, scan: dict) -> Optional[dict]:
+        expiry = parse_expiry(scan.get("expiry_date"))
+        if expiry is None or not scan.get("id"):
+            return None
+        drawer_id = scan.get("drawer_id")
+        return {
+            "id": scan["id"],
+            "product_id": scan.get("product_id"),
+            "drawer_id": drawer_id,
+            "flight_id": scan.get("flight_id") or self.drawer_flights.get(drawer_id),
+            "expiry_date": expiry,
+            "lot_number": scan.get("lot_number"),
+            "status": scan.get("status"),
+        }
+
+    @staticmethod
+    def _key(record: dict) -> Key:
+        return (record["expiry_date"].toordinal(), record["id"])
+
+    # ---------- Mantenimiento incremental ----------
+
+    def upsert(self, scan: dict):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(scan)
+            self._upsert_locked(scan)
+
+    def _upsert_locked(self, scan: dict):
+        if scan.get("id") in self.records:
+            self._remove_locked(scan["id"])
+        record = self._normalize(scan)
+        if record is None:
+            return
+        key = self._key(record)
+        self.records[record["id"]] = record
+        self.keys.add(key)
+        if record["flight_id"]:
+            self.by_flight.setdefault(record["flight_id"], DateBuckets()).add(key)
+        if record["drawer_id"]:
+            self.by_drawer.setdefault(record["drawer_id"], DateBuckets()).add(key)
+
+    def set_drawer_flight(self, drawer_id: str, flight_id: str):
+        """Vuelo de un drawer; los scans del drawer que no lo tenían pasan a ese vuelo"""
+        with self._lock:
+            if self._replay_drawers is not None:
+                self._replay_drawers[drawer_id] = flight_id
+            self._set_drawer_flight_locked(drawer_id, flight_id)
+
+    def _set_drawer_flight_locked(self, drawer_id: str, flight_id: str):
+        self.drawer_flights[drawer_id] = flight_id
+        drawer = self.by_drawer.get(drawer_id)
+        for scan_id in drawer.range(None, None) if drawer else []:
+            record = self.records[scan_id]
+            if not record["flight_id"]:
+                record["flight_id"] = flight_id
+                self.by_flight.setdefault(flight_id, DateBuckets()).add(self._key(record))
+
+    def begin_rebuild(self):
+        with self._lock:
+            self._replay = []
+            self._replay_drawers = {}
+
+    def abort_rebuild(self):
+        with self._lock:
+            self._replay = None
+            self._replay_drawers = None
+
+    def replace_with(self, other: "ExpiryIndex"):
+        """Toma las estructuras de otro índice (reconstruido) sin cambiar la instancia global"""
+        with self._lock:
+            replay, self._replay = self._replay or [], None
+            replay_drawers, self._replay_drawers = self._replay_drawers or {}, None
+            self.records = other.records
+            self.keys = other.keys
+            self.by_flight = other.by_flight
+            self.by_drawer = other.by_drawer
+            self.drawer_flights = other.drawer_flights
+            self.built_at = other.built_at
+            for drawer_id, flight_id in replay_drawers.items():
+                self._set_drawer_flight_locked(drawer_id, flight_id)
+            for scan in replay:
+                self._upsert_locked(scan)
+
+    def remove(self, scan_id: str):
+        with self._lock:
+            self._remove_locked(scan_id)
+
+    def _remove_locked(self, scan_id: str):
+        record = self.records.pop(scan_id, None)
+        if record is None:
+            return
+        key = self._key(record)
+        for buckets in (
+            self.keys,
+            self.by_flight.get(record["flight_id"]),
+            self.by_drawer.get(record["drawer_id"]),
+        ):
+            if buckets:
+                buckets.discard(key)
+
+    # ---------- Consultas ----------
+
+    def _bucket(self, flight_id: Optional[str], drawer_id: Optional[str]) -> DateBuckets:
+        if drawer_id:
+            return self.by_drawer.get(drawer_id) or DateBuckets()
+        if flight_id:
+            return self.by_flight.get(flight_id) or DateBuckets()
+        return self.keys
+
+    def range(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        flight_id: Optional[str] = None,
+        drawer_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """Items con start <= expiry_date <= end (límites opcionales), en orden de caducidad"""
+        with self._lock:
+            ids = self._bucket(flight_id, drawer_id).range(
+                start.toordinal() if start else None, end.toordinal() if end else None, limit
+            )
+            return [self.records[scan_id] for scan_id in ids]
+
+    def count_range(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        flight_id: Optional[str] = None,
+        drawer_id: Optional[str] = None,
+    ) -> int:
+        with self._lock:
+            return self._bucket(flight_id, drawer_id).count(
+                start.toordinal() if start else None, end.toordinal() if end else None
+            )
+
+    def before(self, cutoff: date, **filters) -> List[dict]:
+        """Items que caducan estrictamente antes de cutoff"""
+        return self.range(end=date.fromordinal(cutoff.toordinal() - 1), **filters)
+
+    def flight_ids(self, among: Optional[Iterable[str]] = None) -> List[str]:
+        """Vuelos con items en el índice (opcionalmente solo los de among)"""
+        with self._lock:
+            if among is None:
+                return list(self.by_flight)
+            return [f for f in among if self.by_flight.get(f)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            dates = self.keys.dates
+            return {
+                "items": len(self.records),
+                "flights": len(self.by_flight),
+                "drawers": len(self.by_drawer),
+                "expiry_dates": len(dates),
+                "min_expiry": date.fromordinal(dates[0]).isoformat() if dates else None,
+                "max_expiry": date.fromordinal(dates[-1]).isoformat() if dates else None,
+                "built_at": self.built_at,
+            }
+
+
+expiry_index = ExpiryIndex()
+
+_tasks: List[asyncio.Task] = []
+
+
+def _load_index() -> ExpiryIndex:
+    drawers = fetch_all_rows("drawers_assembled", "id, flight_id")
+    scans = fetch_all_rows("scanned_products", SCAN_COLUMNS)
+    index = ExpiryIndex.build(scans, {d["id"]: d["flight_id"] for d in drawers if d.get("flight_id")})
+    index.built_at = datetime.now(timezone.utc).isoformat()
+    return index
+
+
+async def rebuild_expiry_index() -> dict:
+    """Reconstruye desde la base y reemplaza el contenido del índice de forma atómica"""
+    expiry_index.begin_rebuild()
+    try:
+        index = await run_in_threadpool(_load_index)
+    except Exception as e:
+        expiry_index.abort_rebuild()
+        print(f"⚠️ Error reconstruyendo índice de caducidad: {e}")
+        capture_exception(e, route="expiry_index")
+        return expiry_index.stats()
+    expiry_index.replace_with(index)
+    print(f"✅ Índice de caducidad: {len(expiry_index.records)} items")
+    return expiry_index.stats()
+
+
+_rebuild_requested = asyncio.Event()
+
+
+def request_rebuild():
+    """Pide una reconstrucción al loop periódico (sin esperarla)"""
+    _rebuild_requested.set()
+
+
+async def _rebuild_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        _rebuild_requested.clear()
+        started = loop.time()
+        await rebuild_expiry_index()
+        try:
+            await asyncio.wait_for(_rebuild_requested.wait(), timeout=REBUILD_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            continue
+        # Debounce: bajo carga el bus puede desbordarse seguido
+        await asyncio.sleep(max(0.0, started + MIN_REBUILD_SECONDS - loop.time()))
+
+
+async def _consume_scan_events():
+    """
+    Aplica los scans nuevos del change feed; si el bus descartó eventos, pide
+    una reconstrucción a _rebuild_loop
+    Es un suscriptor permanente, así que el change feed siempre consulta scanned_products
+    """
+    sub = event_bus.subscribe({"all"})
+    try:
+        while True:
+            batch = await sub.next_batch()
+            for event in batch["events"]:
+                data = event.get("data") or {}
+                if event.get("type") in ("drawer_completed", "drawer_updated") and data.get("flight_id"):
+                    expiry_index.set_drawer_flight(data["id"], data["flight_id"])
+                elif event.get("type") == "scan":
+                    expiry_index.upsert(data)
+            if batch["dropped"]:
+                # No se reconstruye aquí: mientras tanto la suscripción se
+                # volvería a desbordar y cada lote dispararía otra reconstrucción
+                request_rebuild()
+    finally:
+        sub.close()
+
+
+def start_expiry_index():
+    if not _tasks:
+        _tasks.append(asyncio.create_task(_rebuild_loop()))
+        _tasks.append(asyncio.create_task(_consume_scan_events()))
+
+
+async def stop_expiry_index():
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _tasks.clear()
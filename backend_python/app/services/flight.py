@@ -1,7 +1,10 @@
 from datetime import datetime
+from typing import List
 from app.db import supabase
 from app.schemas.flight import FlightCreate, FlightUpdate
 
+FLIGHT_IDS_PER_QUERY = 100
+
 
 def create_flight(flight: FlightCreate):
     response = supabase.table("flights").insert({
@@ -17,6 +20,14 @@ def get_all_flights():
     response = supabase.table("flights").select("*").execute()
     return response.data
 
+def get_flights_between(date_from: datetime, date_to: datetime):
+    response = supabase.table("flights").select("*") \
+        .gte("arrival_time", date_from.isoformat()) \
+        .lte("arrival_time", date_to.isoformat()) \
+        .order("arrival_time") \
+        .execute()
+    return response.data
+
 def get_flight_by_id(flight_id: str):
     response = supabase.table("flights").select("*").eq("id", flight_id).single().execute()
     return response.data
@@ -29,3 +40,12 @@ def update_flight(flight_id: str, flight: FlightUpdate):
 def delete_flight(flight_id: str):
     response = supabase.table("flights").delete().eq("id", flight_id).execute()
     return response.data
+
+def get_flights_by_ids(flight_ids: List[str]):
+    """En grupos de FLIGHT_IDS_PER_QUERY: miles de uuids en un in_ no caben en la URL"""
+    flights = []
+    for i in range(0, len(flight_ids or []), FLIGHT_IDS_PER_QUERY):
+        response = supabase.table("flights").select("*") \
+            .in_("id", flight_ids[i:i + FLIGHT_IDS_PER_QUERY]).execute()
+        flights.extend(response.data or [])
+    return flights
@@ -5,6 +5,7 @@ Mucho más preciso que Tesseract (95-99% vs 70-85%)
 
 import os
 from google.cloud import vision
+from app.utils.metrics import track_upstream
 
 def extract_text_with_google_vision(image_bytes: bytes) -> str:
     """
@@ -21,7 +22,8 @@ def extract_text_with_google_vision(image_bytes: bytes) -> str:
         image = vision.Image(content=image_bytes)
 
         # Ejecutar detección de texto
-        response = client.text_detection(image=image)
+        with track_upstream("google_vision"):
+            response = client.text_detection(image=image)
 
         # Verificar errores
         if response.error.message:
@@ -0,0 +1,260 @@
+"""
+Métricas de ensamblaje en tiempo real
+- Ingesta de eventos drawer_started / item_scanned / drawer_completed
+- Ventanas en memoria por empleado y por estación: EWMA del tiempo por
+  drawer y de items/min, throughput de la última hora
+- Los drawers completados se escriben a productivity_logs en lotes
+  (cada LIVE_FLUSH_INTERVAL_SEC o al llegar a LIVE_FLUSH_BATCH filas)
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.db import supabase
+from app.schemas.assembly import AssemblyEvent
+from app.services.error_monitor import capture_exception
+
+EWMA_ALPHA = float(os.getenv("LIVE_EWMA_ALPHA", "0.2"))
+WINDOW_SECONDS = 3600
+FLUSH_INTERVAL_SECONDS = float(os.getenv("LIVE_FLUSH_INTERVAL_SEC", "5"))
+FLUSH_BATCH_SIZE = int(os.getenv("LIVE_FLUSH_BATCH", "200"))
+MAX_PENDING_ROWS = 10000
+OPEN_DRAWER_TTL_SECONDS = 4 * 3600   # drawers abiertos sin cerrar se descartan
+IDLE_TTL_SECONDS = 24 * 3600         # empleados/estaciones sin eventos se olvidan
+COMPLETED_MEMORY = 10000             # drawer_ids recientes para ignorar duplicados
+
+
+class RollingStats:
+    """Estado por empleado o estación"""
+
+    __slots__ = ("ewma_build_sec", "ewma_items_per_min", "completions", "total_completed",
+                 "total_items", "open_drawers", "last_event_at")
+
+    def __init__(self):
+        self.ewma_build_sec: Optional[float] = None
+        self.ewma_items_per_min: Optional[float] = None
+        self.completions: Deque[Tuple[float, int]] = deque()  # (recibido, items)
+        self.total_completed = 0
+        self.total_items = 0
+        self.open_drawers = 0
+        self.last_event_at = 0.0
+
+    @staticmethod
+    def _ewma(current: Optional[float], value: float) -> float:
+        return value if current is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * current
+
+    def record_completion(self, now: float, build_sec: float, items: int):
+        self.ewma_build_sec = self._ewma(self.ewma_build_sec, build_sec)
+        if build_sec > 0 and items:
+            self.ewma_items_per_min = self._ewma(self.ewma_items_per_min, items * 60 / build_sec)
+        self.completions.append((now, items))
+        self.total_completed += 1
+        self.total_items += items
+
+    def evict(self, now: float):
+        while self.completions and self.completions[0][0] < now - WINDOW_SECONDS:
+            self.completions.popleft()
+
+    def snapshot(self, now: float) -> dict:
+        self.evict(now)
+        return {
+            "ewma_build_time_minutes": None if self.ewma_build_sec is None else round(self.ewma_build_sec / 60, 1),
+            "ewma_items_per_minute": None if self.ewma_items_per_min is None else round(self.ewma_items_per_min, 2),
+            "drawers_last_hour": len(self.completions),
+            "items_last_hour": sum(items for _, items in self.completions),
+            "open_drawers": self.open_drawers,
+            "total_completed": self.total_completed,
+            "last_event_at": datetime.fromtimestamp(self.last_event_at, tz=timezone.utc).isoformat(),
+        }
+
+
+class LiveMetrics:
+    def __init__(self):
+        self.employees: Dict[str, RollingStats] = {}
+        self.stations: Dict[str, RollingStats] = {}
+        # drawer_id -> {employee_id, station_id, flight_id, started_at, items, received_at}
+        self.open_drawers: Dict[str, dict] = {}
+        self.recently_completed: "OrderedDict[str, None]" = OrderedDict()
+        self.pending_logs: List[dict] = []
+        self.counters = {"events": 0, "duplicates": 0, "flushed": 0, "flush_errors": 0, "dropped": 0}
+        self._flush_event = asyncio.Event()
+
+    def _stats_for(self, event: AssemblyEvent) -> List[RollingStats]:
+        stats = [self.employees.setdefault(event.employee_id, RollingStats())]
+        if event.station_id:
+            stats.append(self.stations.setdefault(event.station_id, RollingStats()))
+        return stats
+
+    def ingest(self, event: AssemblyEvent) -> Optional[dict]:
+        """
+        Aplica un evento a las ventanas
+        Retorna la fila para productivity_logs si el evento completó un drawer
+        """
+        now = time.time()
+        ts = event.timestamp.timestamp() if event.timestamp else now
+        self.counters["events"] += 1
+        stats = self._stats_for(event)
+        for s in stats:
+            s.last_event_at = now
+
+        if event.type == "drawer_started":
+            if event.drawer_id not in self.open_drawers:
+                for s in stats:
+                    s.open_drawers += 1
+            self.open_drawers[event.drawer_id] = {
+                "employee_id": event.employee_id,
+                "station_id": event.station_id,
+                "flight_id": event.flight_id,
+                "started_at": ts,
+                "items": 0,
+                "received_at": now,
+            }
+            return None
+
+        if event.type == "item_scanned":
+            drawer = self.open_drawers.get(event.drawer_id)
+            if drawer:
+                drawer["items"] += event.quantity
+            return None
+
+        # drawer_completed
+        if event.drawer_id in self.recently_completed:
+            self.counters["duplicates"] += 1
+            return None
+        self.recently_completed[event.drawer_id] = None
+        if len(self.recently_completed) > COMPLETED_MEMORY:
+            self.recently_completed.popitem(last=False)
+
+        drawer = self.open_drawers.pop(event.drawer_id, None)
+        if drawer:
+            for s in self._stats_for_drawer(drawer):
+                s.open_drawers = max(0, s.open_drawers - 1)
+
+        build_sec = event.build_time_sec
+        if build_sec is None and drawer:
+            build_sec = max(0, int(ts - drawer["started_at"]))
+        if build_sec is None:
+            return None
+
+        items = drawer["items"] if drawer else 0
+        for s in stats:
+            s.record_completion(now, build_sec, items)
+
+        row = {
+            "employee_id": event.employee_id,
+            "drawer_id": event.drawer_id,
+            "flight_id": event.flight_id or (drawer or {}).get("flight_id"),
+            "build_time_sec": build_sec,
+            "trolley_type": event.trolley_type,
+        }
+        self._queue_log(row)
+        return row
+
+    def _stats_for_drawer(self, drawer: dict) -> List[RollingStats]:
+        stats = []
+        if drawer["employee_id"] in self.employees:
+            stats.append(self.employees[drawer["employee_id"]])
+        if drawer.get("station_id") in self.stations:
+            stats.append(self.stations[drawer["station_id"]])
+        return stats
+
+    def _queue_log(self, row: dict):
+        self.pending_logs.append(row)
+        if len(self.pending_logs) > MAX_PENDING_ROWS:
+            overflow = len(self.pending_logs) - MAX_PENDING_ROWS
+            del self.pending_logs[:overflow]
+            self.counters["dropped"] += overflow
+            print(f"⚠️ Buffer de productivity_logs lleno, se descartaron {overflow} filas")
+        if len(self.pending_logs) >= FLUSH_BATCH_SIZE:
+            self._flush_event.set()
+
+    # ---------- Persistencia ----------
+
+    async def flush(self) -> int:
+        """Inserta las filas pendientes en un solo insert; si falla se reintentan después"""
+        if not self.pending_logs:
+            return 0
+        rows, self.pending_logs = self.pending_logs, []
+        try:
+            await run_in_threadpool(lambda: supabase.table("productivity_logs").insert(rows).execute())
+        except Exception as e:
+            print(f"❌ Error guardando productivity_logs ({len(rows)} filas): {e}")
+            capture_exception(e, route="live_metrics.flush")
+            self.counters["flush_errors"] += 1
+            self.pending_logs = rows + self.pending_logs
+            return 0
+        self.counters["flushed"] += len(rows)
+        return len(rows)
+
+    def prune(self):
+        """Descarta drawers abiertos viejos y empleados/estaciones inactivos"""
+        now = time.time()
+        for drawer_id in [d for d, v in self.open_drawers.items() if v["received_at"] < now - OPEN_DRAWER_TTL_SECONDS]:
+            drawer = self.open_drawers.pop(drawer_id)
+            for s in self._stats_for_drawer(drawer):
+                s.open_drawers = max(0, s.open_drawers - 1)
+        for table in (self.employees, self.stations):
+            for key in [k for k, s in table.items() if s.last_event_at < now - IDLE_TTL_SECONDS]:
+                del table[key]
+
+    # ---------- Lectura ----------
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        employees = {k: s.snapshot(now) for k, s in self.employees.items()}
+        stations = {k: s.snapshot(now) for k, s in self.stations.items()}
+        return {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "window_minutes": WINDOW_SECONDS // 60,
+            "drawers_last_hour": sum(e["drawers_last_hour"] for e in employees.values()),
+            "open_drawers": len(self.open_drawers),
+            "employees": employees,
+            "stations": stations,
+            "pending_logs": len(self.pending_logs),
+            "counters": dict(self.counters),
+        }
+
+    def employee_snapshot(self, employee_id: str) -> Optional[dict]:
+        stats = self.employees.get(employee_id)
+        return stats.snapshot(time.time()) if stats else None
+
+
+live_metrics = LiveMetrics()
+
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(live_metrics._flush_event.wait(), timeout=FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        live_metrics._flush_event.clear()
+        await live_metrics.flush()
+        live_metrics.prune()
+
+
+def start_live_metrics():
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_live_metrics():
+    """Detiene el loop y escribe lo que quede pendiente"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    await live_metrics.flush()
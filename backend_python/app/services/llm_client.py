@@ -0,0 +1,248 @@
+"""
+Cliente async compartido para OpenRouter (Gemini)
+- Un solo httpx.AsyncClient por proceso: pool de conexiones + HTTP/2
+- Timeout por llamada, reintentos con backoff exponencial y jitter
+- Semáforo global que limita las llamadas concurrentes al LLM (no se
+  retiene durante el backoff; un stream lo retiene a lo más max_stream_seconds)
+- Streaming (SSE de OpenRouter) para mostrar el texto mientras se genera
+"""
+
+import asyncio
+import json
+import os
+import random
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from app.utils.metrics import async_httpx_event_hooks
+
+try:
+    import h2  # noqa: F401  (requerido por httpx para HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+RETRY_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Error al llamar al LLM (después de agotar reintentos)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMClient:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str],
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        max_stream_seconds: float = 120.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_stream_seconds = max_stream_seconds
+        self.max_concurrency = max_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.counters = {"calls": 0, "streams": 0, "retries": 0, "errors": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 2,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=60.0,
+                ),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                event_hooks=async_httpx_event_hooks("openrouter"),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: espera aleatoria entre 0 y base * 2^intento
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def chat_completion(self, payload: dict, timeout: Optional[float] = None) -> dict:
+        """POST /chat/completions y retorna el JSON de respuesta"""
+        if not self.configured:
+            raise LLMError("OpenRouter API key not configured")
+
+        client = self._get_client()
+        last_error: Optional[LLMError] = None
+        self.counters["calls"] += 1
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await client.post(
+                        "/chat/completions",
+                        json=payload,
+                        timeout=timeout or self.timeout,
+                    )
+                if response.status_code == 200:
+                    return response.json()
+
+                last_error = LLMError(
+                    f"OpenRouter error: {response.status_code} - {response.text[:200]}",
+                    status_code=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+
+            except httpx.TransportError as e:
+                last_error = LLMError(f"OpenRouter transport error: {e}")
+
+            if attempt < self.max_retries:
+                self.counters["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+
+        self.counters["errors"] += 1
+        raise last_error
+
+    async def chat(
+        self,
+        messages: List[dict],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Atajo que retorna solo el contenido del primer choice"""
+        result = await self.chat_completion(
+            {
+                "model": model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            },
+            timeout=timeout,
+        )
+        return result["choices"][0]["message"]["content"]
+
+    async def stream_chat(
+        self,
+        messages: List[dict],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Genera los fragmentos de texto conforme llegan (stream=true)
+        Solo se reintenta antes de recibir el primer fragmento
+        """
+        if not self.configured:
+            raise LLMError("OpenRouter API key not configured")
+
+        client = self._get_client()
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+        }
+
+        started = False
+        self.counters["streams"] += 1
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            retry_error: Optional[LLMError] = None
+            # El semáforo solo cubre el intento: el backoff espera sin él y un
+            # consumidor lento no lo retiene más de max_stream_seconds
+            async with self._semaphore:
+                deadline = loop.time() + self.max_stream_seconds
+                try:
+                    async with client.stream(
+                        "POST", "/chat/completions", json=payload, timeout=timeout or self.timeout
+                    ) as response:
+                        if response.status_code != 200:
+                            body = (await response.aread()).decode("utf-8", "replace")
+                            retry_error = LLMError(
+                                f"OpenRouter error: {response.status_code} - {body[:200]}",
+                                status_code=response.status_code,
+                            )
+                            if response.status_code not in RETRY_STATUS_CODES:
+                                self.counters["errors"] += 1
+                                raise retry_error
+                        else:
+                            async for line in response.aiter_lines():
+                                if loop.time() > deadline:
+                                    self.counters["errors"] += 1
+                                    raise LLMError(
+                                        f"OpenRouter stream exceeded {self.max_stream_seconds:.0f}s"
+                                    )
+                                # Comentarios SSE (": OPENROUTER PROCESSING") y líneas vacías
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[5:].strip()
+                                if data == "[DONE]":
+                                    return
+                                try:
+                                    chunk = json.loads(data)
+                                except json.JSONDecodeError:
+                                    continue
+                                choices = chunk.get("choices") or []
+                                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                                if delta:
+                                    started = True
+                                    yield delta
+                            return
+                except httpx.TransportError as e:
+                    retry_error = LLMError(f"OpenRouter transport error: {e}")
+                    if started:
+                        self.counters["errors"] += 1
+                        raise retry_error
+
+            if attempt >= self.max_retries:
+                self.counters["errors"] += 1
+                raise retry_error
+            self.counters["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "http2": HTTP2_AVAILABLE,
+            "max_concurrency": self.max_concurrency,
+            "max_stream_seconds": self.max_stream_seconds,
+        }
+
+
+llm_client = LLMClient(
+    base_url=OPENROUTER_BASE_URL,
+    api_key=os.getenv("OPENROUTER_API_KEY"),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("LLM_TIMEOUT_SEC", "30")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    max_stream_seconds=float(os.getenv("LLM_MAX_STREAM_SEC", "120")),
+)
@@ -0,0 +1,417 @@
+"""
+Modelo local de demanda por producto
+- Se entrena offline (scripts/train_demand_model.py) con el consumo histórico
+  por vuelo: scanned_products (o drawer_content si el vuelo no tiene escaneos)
+- Tasa = unidades por pasajero, estimada por grupos jerárquicos:
+  global -> país de origen -> país+franja horaria.
+  Cada nivel se mezcla con su padre según cuántos vuelos lo respaldan
+- La duración no entra en los grupos: flights no la guarda, así que en el
+  entrenamiento siempre sería "unknown" y nunca coincidiría con /predict
+- Inferencia vectorizada con NumPy: muchos vuelos x todo el catálogo en una pasada
+- El artefacto es un .npz que se carga una vez al arrancar
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.utils.countries import normalize_country, route_origin_country
+from app.utils.datetime_tools import duration_to_minutes, hour_to_time_of_day, normalize_time_of_day
+
+DEMAND_MODEL_PATH = os.getenv("DEMAND_MODEL_PATH", "models/demand_model.npz")
+MODEL_VERSION = 2
+
+DURATION_BUCKET_MINUTES = 60
+SHRINKAGE_FLIGHTS = 5.0      # vuelos necesarios para confiar 50% en un grupo
+PRIOR_UNITS_PER_PASSENGER = 0.25  # sin modelo entrenado
+TREND_THRESHOLD = 0.10       # ±10% vs la tasa global -> up/down
+
+LEVELS = ("origin", "origin_tod")
+
+
+# ============================================
+# FEATURES
+# ============================================
+
+def normalize_origin(value: Optional[str]) -> str:
+    """País, alias, código IATA o ruta -> llave de país (ver app/utils/countries.py)"""
+    return normalize_country(value)
+
+
+def duration_bucket(minutes: Optional[float]) -> str:
+    if minutes is None:
+        return "unknown"
+    return str(int(minutes // DURATION_BUCKET_MINUTES) * DURATION_BUCKET_MINUTES)
+
+
+def group_keys(origin: str, tod: str) -> Dict[str, str]:
+    return {
+        "origin": origin,
+        "origin_tod": f"{origin}|{tod}",
+    }
+
+
+@dataclass
+class FlightFeatures:
+    origin: str
+    duration: str
+    time_of_day: str
+    passengers: int
+
+    @classmethod
+    def from_request(cls, origin_country: str, flight_duration: str, time_of_day: str, passengers: int):
+        return cls(
+            origin=normalize_origin(origin_country),
+            duration=duration_bucket(duration_to_minutes(flight_duration)),
+            time_of_day=normalize_time_of_day(time_of_day),
+            passengers=passengers,
+        )
+
+    @classmethod
+    def from_flight_row(cls, flight: dict):
+        """
+        Features desde una fila de flights, en el mismo vocabulario que from_request
+        - País: origin_country si existe; si no, el del primer aeropuerto de
+          route ("MEX-JFK" -> "mexico")
+        - Franja: arrival_time es la única hora que guarda flights (llegada del
+          avión a la estación, donde se carga el catering antes de despegar)
+        """
+        origin = normalize_origin(flight.get("origin_country")) if flight.get("origin_country") \
+            else route_origin_country(flight.get("route"))
+
+        minutes = flight.get("duration_minutes")
+        if minutes is None and flight.get("flight_duration"):
+            minutes = duration_to_minutes(flight["flight_duration"])
+
+        tod = "unknown"
+        moment = flight.get("departure_time") or flight.get("arrival_time")
+        if moment:
+            try:
+                tod = hour_to_time_of_day(datetime.fromisoformat(str(moment).replace("Z", "+00:00")).hour)
+            except ValueError:
+                pass
+
+        return cls(
+            origin=origin,
+            duration=duration_bucket(minutes),
+            time_of_day=tod,
+            passengers=int(flight.get("quantity") or 0),
+        )
+
+
+# ============================================
+# MODELO
+# ============================================
+
+class DemandModel:
+    def __init__(
+        self,
+        product_ids: List[str],
+        product_names: List[str],
+        global_rate: np.ndarray,
+        levels: Dict[str, dict],
+        trained_at: Optional[str] = None,
+        n_flights: int = 0,
+    ):
+        self.product_ids = product_ids
+        self.product_names = product_names
+        self.global_rate = global_rate.astype(np.float64)
+        # levels[name] = {"index": {key: row}, "rate": (groups, products), "count": (groups,)}
+        self.levels = levels
+        self.trained_at = trained_at
+        self.n_flights = n_flights
+        self.product_index = {pid: i for i, pid in enumerate(product_ids)}
+
+    # ---------- Entrenamiento ----------
+
+    @classmethod
+    def fit(cls, samples: Sequence[dict], product_names: Dict[str, str]) -> "DemandModel":
+        """
+        samples: [{"features": FlightFeatures, "units": {product_id: unidades}}]
+        Solo se usan vuelos con pasajeros > 0
+        """
+        samples = [s for s in samples if s["features"].passengers > 0 and s["units"]]
+        product_ids = sorted({pid for s in samples for pid in s["units"]})
+        if not samples or not product_ids:
+            raise ValueError("No hay vuelos con consumo para entrenar")
+
+        pindex = {pid: i for i, pid in enumerate(product_ids)}
+        units = np.zeros((len(samples), len(product_ids)))
+        for row, sample in enumerate(samples):
+            for pid, qty in sample["units"].items():
+                units[row, pindex[pid]] += qty
+        passengers = np.array([s["features"].passengers for s in samples], dtype=np.float64)
+
+        # Estimador de razón: sum(unidades) / sum(pasajeros)
+        global_rate = units.sum(axis=0) / passengers.sum()
+
+        levels = {}
+        for level in LEVELS:
+            keys = [
+                group_keys(s["features"].origin, s["features"].time_of_day)[level]
+                for s in samples
+            ]
+            index = {key: i for i, key in enumerate(sorted(set(keys)))}
+            groups = np.array([index[k] for k in keys])
+
+            sum_units = np.zeros((len(index), len(product_ids)))
+            sum_pax = np.zeros(len(index))
+            count = np.zeros(len(index))
+            np.add.at(sum_units, groups, units)
+            np.add.at(sum_pax, groups, passengers)
+            np.add.at(count, groups, 1)
+
+            levels[level] = {
+                "index": index,
+                "rate": (sum_units / sum_pax[:, None]).astype(np.float32),
+                "count": count.astype(np.float32),
+            }
+
+        return cls(
+            product_ids=product_ids,
+            product_names=[product_names.get(pid, pid) for pid in product_ids],
+            global_rate=global_rate,
+            levels=levels,
+            trained_at=datetime.now().isoformat(),
+            n_flights=len(samples),
+        )
+
+    # ---------- Inferencia ----------
+
+    def predict_rates(self, flights: Sequence[FlightFeatures]) -> np.ndarray:
+        """Tasa unidades/pasajero para cada vuelo x producto: (n_flights, n_products)"""
+        rates = np.broadcast_to(self.global_rate, (len(flights), len(self.product_ids))).copy()
+
+        for level in LEVELS:
+            data = self.levels[level]
+            idx = np.array([
+                data["index"].get(group_keys(f.origin, f.time_of_day)[level], -1)
+                for f in flights
+            ])
+            found = idx >= 0
+            if not found.any():
+                continue
+            safe_idx = np.where(found, idx, 0)
+            n = np.where(found, data["count"][safe_idx], 0.0)
+            weight = (n / (n + SHRINKAGE_FLIGHTS))[:, None]
+            rates = weight * data["rate"][safe_idx] + (1.0 - weight) * rates
+
+        return rates
+
+    def match_level(self, flight: FlightFeatures) -> Optional[str]:
+        """Nivel más específico con historial para el vuelo; None = solo tasa global"""
+        keys = group_keys(flight.origin, flight.time_of_day)
+        matched = None
+        for level in LEVELS:
+            if keys[level] in self.levels[level]["index"]:
+                matched = level
+        return matched
+
+    def predict(self, flights: Sequence[FlightFeatures]) -> dict:
+        """Demanda (unidades) y tendencia por vuelo x producto"""
+        rates = self.predict_rates(flights)
+        passengers = np.array([f.passengers for f in flights], dtype=np.float64)
+        demand = np.ceil(rates * passengers[:, None]).astype(np.int64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(self.global_rate > 0, rates / self.global_rate, 1.0)
+        trend = np.full(ratio.shape, "steady", dtype=object)
+        trend[ratio > 1 + TREND_THRESHOLD] = "up"
+        trend[ratio < 1 - TREND_THRESHOLD] = "down"
+
+        return {"demand": demand, "trend": trend}
+
+    # ---------- Persistencia ----------
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {
+            "version": MODEL_VERSION,
+            "trained_at": self.trained_at,
+            "n_flights": self.n_flights,
+            "product_ids": self.product_ids,
+            "product_names": self.product_names,
+            "levels": {level: list(self.levels[level]["index"].keys()) for level in LEVELS},
+        }
+        arrays = {"global_rate": self.global_rate}
+        for level in LEVELS:
+            arrays[f"{level}__rate"] = self.levels[level]["rate"]
+            arrays[f"{level}__count"] = self.levels[level]["count"]
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DemandModel":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != MODEL_VERSION:
+                raise ValueError(f"Versión de modelo no soportada: {meta.get('version')}")
+            levels = {
+                level: {
+                    "index": {key: i for i, key in enumerate(meta["levels"][level])},
+                    "rate": data[f"{level}__rate"],
+                    "count": data[f"{level}__count"],
+                }
+                for level in LEVELS
+            }
+            return cls(
+                product_ids=meta["product_ids"],
+                product_names=meta["product_names"],
+                global_rate=data["global_rate"],
+                levels=levels,
+                trained_at=meta.get("trained_at"),
+                n_flights=meta.get("n_flights", 0),
+            )
+
+    def info(self) -> dict:
+        return {
+            "trained_at": self.trained_at,
+            "n_flights": self.n_flights,
+            "n_products": len(self.product_ids),
+            "groups": {level: len(self.levels[level]["index"]) for level in LEVELS},
+        }
+
+
+_model: Optional[DemandModel] = None
+_model_version = "prior"
+
+
+def load_demand_model(path: str = DEMAND_MODEL_PATH) -> Optional[DemandModel]:
+    """Carga el artefacto al arrancar; si no existe se usa la tasa a priori"""
+    global _model, _model_version
+    _model, _model_version = None, "prior"
+    if not os.path.exists(path):
+        print(f"⚠️ Modelo de demanda no encontrado en {path}, usando tasa a priori")
+        return None
+    try:
+        _model = DemandModel.load(path)
+        _model_version = f"{_model.trained_at}@{int(os.path.getmtime(path))}"
+        print(f"✅ Modelo de demanda cargado: {_model.info()}")
+    except Exception as e:
+        print(f"❌ Error cargando modelo de demanda: {e}")
+        _model = None
+    return _model
+
+
+def get_demand_model() -> Optional[DemandModel]:
+    return _model
+
+
+def demand_model_version() -> str:
+    """Identifica el artefacto cargado (trained_at + mtime); "prior" sin modelo"""
+    return _model_version
+
+
+def demand_model_type(features: FlightFeatures) -> str:
+    """
+    "historical" si algún grupo del modelo respalda el vuelo, "global" si
+    solo aplica la tasa global y "prior" sin modelo
+    """
+    model = _model
+    if model is None:
+        return "prior"
+    return "historical" if model.match_level(features) else "global"
+
+
+def predict_catalog_demand(flights: Sequence[FlightFeatures], catalog: List[dict]) -> List[List[dict]]:
+    """
+    Predicción para cada producto del catálogo en cada vuelo
+
+    catalog: filas de products (id, name). Productos sin historial usan la
+    tasa promedio del modelo. Retorna una lista por vuelo, ordenada por demanda.
+    """
+    if not flights:
+        return []
+
+    model = _model
+    n_flights = len(flights)
+    passengers = np.array([f.passengers for f in flights], dtype=np.float64)
+
+    if model is None:
+        demand = np.ceil(np.outer(passengers, np.full(len(catalog), PRIOR_UNITS_PER_PASSENGER))).astype(np.int64)
+        trend = np.full((n_flights, len(catalog)), "steady", dtype=object)
+    else:
+        result = model.predict(flights)
+        columns = np.array([model.product_index.get(p["id"], -1) for p in catalog], dtype=np.int64)
+        known = columns >= 0
+        safe_columns = np.where(known, columns, 0)
+
+        mean_rate = float(model.global_rate.mean()) if len(model.global_rate) else PRIOR_UNITS_PER_PASSENGER
+        unknown_demand = np.ceil(passengers * mean_rate).astype(np.int64)[:, None]
+
+        demand = np.where(known, result["demand"][:, safe_columns], unknown_demand)
+        trend = np.where(known, result["trend"][:, safe_columns], "steady")
+
+    predictions = []
+    for row in range(n_flights):
+        order = np.argsort(-demand[row], kind="stable")
+        predictions.append([
+            {
+                "product_id": catalog[col]["id"],
+                "product": catalog[col]["name"],
+                "predicted_demand": int(demand[row, col]),
+                "trend": str(trend[row, col]),
+            }
+            for col in order
+        ])
+    return predictions
+
+
+# ============================================
+# ENTRENAMIENTO OFFLINE
+# ============================================
+
+def build_training_samples(
+    flights: List[dict],
+    drawers: List[dict],
+    drawer_content: List[dict],
+    scanned_products: List[dict],
+) -> List[dict]:
+    """
+    Consumo por vuelo: productos escaneados (lo que realmente se cargó); si un
+    vuelo no tiene escaneos se usa drawer_content (lo planificado)
+    """
+    drawer_flight = {d["id"]: d.get("flight_id") for d in drawers}
+
+    scanned: Dict[str, Dict[str, float]] = {}
+    for row in scanned_products:
+        flight_id = row.get("flight_id") or drawer_flight.get(row.get("drawer_id"))
+        if flight_id and row.get("product_id"):
+            per_flight = scanned.setdefault(flight_id, {})
+            per_flight[row["product_id"]] = per_flight.get(row["product_id"], 0) + 1
+
+    planned: Dict[str, Dict[str, float]] = {}
+    for row in drawer_content:
+        flight_id = drawer_flight.get(row.get("drawer_id"))
+        if flight_id and row.get("product_id"):
+            per_flight = planned.setdefault(flight_id, {})
+            per_flight[row["product_id"]] = per_flight.get(row["product_id"], 0) + (row.get("quantity") or 0)
+
+    samples = []
+    for flight in flights:
+        units = scanned.get(flight["id"]) or planned.get(flight["id"])
+        if units:
+            samples.append({"features": FlightFeatures.from_flight_row(flight), "units": units})
+    return samples
+
+
+def train_from_supabase(path: str = DEMAND_MODEL_PATH) -> DemandModel:
+    """Descarga el historial de Supabase, entrena y guarda el artefacto"""
+    from app.db import fetch_all_rows
+
+    flights = fetch_all_rows("flights")
+    drawers = fetch_all_rows("drawers_assembled", "id, flight_id")
+    content = fetch_all_rows("drawer_content", "drawer_id, product_id, quantity")
+    scanned = fetch_all_rows("scanned_products", "drawer_id, product_id, flight_id")
+    products = fetch_all_rows("products", "id, name")
+
+    samples = build_training_samples(flights, drawers, content, scanned)
+    model = DemandModel.fit(samples, {p["id"]: p["name"] for p in products})
+    model.save(path)
+    return model
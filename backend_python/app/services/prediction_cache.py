@@ -0,0 +1,159 @@
+"""
+Cache de respuestas de /predict
+- La llave se arma con los parámetros del vuelo normalizados y agrupados
+  (duración a 30 min, pasajeros en grupos de 10) más la versión del modelo
+  de demanda, así rutas recurrentes reutilizan el mismo reporte y un modelo
+  reentrenado no sirve reportes viejos
+- Se cachea solo lo que es del grupo (el reporte, redactado para el número
+  de pasajeros del grupo); las cifras exactas se calculan en cada request
+- Dos niveles: memoria (TTL + LRU) y SQLite local que sobrevive reinicios
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from app.utils.cache import TTLCache
+from app.utils.datetime_tools import duration_to_minutes, normalize_time_of_day
+
+DURATION_BUCKET_MINUTES = 30
+PASSENGER_BUCKET_SIZE = 10
+
+CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SEC", "86400"))
+CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "2048"))
+CACHE_DB_PATH = os.getenv("PREDICTION_CACHE_PATH", ".cache/prediction_cache.sqlite3")
+
+
+def passenger_bucket(confirmed_passengers: int) -> int:
+    """Pasajeros redondeados al grupo de PASSENGER_BUCKET_SIZE (mínimo un grupo)"""
+    bucket = int(round(confirmed_passengers / PASSENGER_BUCKET_SIZE)) * PASSENGER_BUCKET_SIZE
+    return max(bucket, PASSENGER_BUCKET_SIZE)
+
+
+def prediction_cache_key(
+    origin_country: str,
+    flight_duration: str,
+    time_of_day: str,
+    confirmed_passengers: int,
+    model_version: str,
+) -> Tuple:
+    """Normaliza y agrupa los parámetros de /predict en una llave de cache"""
+    country = " ".join(origin_country.strip().casefold().split())
+
+    minutes = duration_to_minutes(flight_duration)
+    if minutes is None:
+        duration_bucket = flight_duration.strip()
+    else:
+        duration_bucket = int(round(minutes / DURATION_BUCKET_MINUTES)) * DURATION_BUCKET_MINUTES
+
+    return (
+        country,
+        duration_bucket,
+        normalize_time_of_day(time_of_day),
+        passenger_bucket(confirmed_passengers),
+        model_version,
+    )
+
+
+class PredictionCache:
+    """Cache de dos niveles: TTLCache en memoria + tabla SQLite persistente"""
+
+    def __init__(self, db_path: Optional[str], ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Cache persistente de predicciones deshabilitado: {e}")
+                self._conn = None
+
+    @staticmethod
+    def _serialize_key(key: Tuple) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def get(self, key: Tuple) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        if self._conn is None:
+            self.misses += 1
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM prediction_cache WHERE key = ?",
+                (self._serialize_key(key),),
+            ).fetchone()
+
+        if row is None or row[1] <= time.time():
+            self.misses += 1
+            return None
+
+        value = json.loads(row[0])
+        # Promover a memoria con el TTL restante
+        self.memory.set(key, value, ttl_seconds=row[1] - time.time())
+        self.disk_hits += 1
+        return value
+
+    def set(self, key: Tuple, value: dict):
+        self.memory.set(key, value)
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO prediction_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (self._serialize_key(key), json.dumps(value, ensure_ascii=False), time.time() + self.ttl_seconds),
+                )
+                self._conn.execute("DELETE FROM prediction_cache WHERE expires_at <= ?", (time.time(),))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Error guardando predicción en cache: {e}")
+
+    def clear(self):
+        self.memory.invalidate()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM prediction_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        memory_stats = self.memory.stats()
+        disk_entries = None
+        if self._conn is not None:
+            with self._lock:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+        lookups = memory_stats["hits"] + self.disk_hits + self.misses
+        return {
+            "memory": memory_stats,
+            "disk_entries": disk_entries,
+            "memory_hits": memory_stats["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory_stats["hits"] + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+prediction_cache = PredictionCache(
+    db_path=CACHE_DB_PATH or None,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    max_entries=CACHE_MAX_ENTRIES,
+)
@@ -1,5 +1,9 @@
 from app.db import supabase
 from app.schemas.product import ProductCreate, ProductUpdate
+from app.utils.cache import TTLCache
+
+# Catálogo liviano (id, name, category) para predicciones
+catalog_cache = TTLCache(ttl_seconds=600, max_entries=1)
 
 def create_product(product: ProductCreate):
     data = product.dict()
@@ -12,6 +16,14 @@ def get_all_products():
     response = supabase.table("products").select("*").execute()
     return response.data
 
+def get_product_catalog():
+    cached = catalog_cache.get("catalog")
+    if cached is not None:
+        return cached
+    response = supabase.table("products").select("id, name, category").order("name").execute()
+    catalog_cache.set("catalog", response.data)
+    return response.data
+
 def get_product_by_id(product_id: str):
     response = supabase.table("products").select("*").eq("id", product_id).single().execute()
     return response.data
@@ -0,0 +1,278 @@
+"""
+Rollups diarios de productividad
+- Tabla productivity_daily_rollup (ver sql/002_productivity_rollup.sql)
+- Job en background que la refresca desde el watermark de updated_at
+  (drawers y productivity_logs)
+- Utilidades para combinar filas diarias en estadísticas de un período
+- Estadísticas de todo un equipo en una pasada vectorizada (NumPy)
+"""
+
+import asyncio
+import math
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.db import supabase
+from app.services.error_monitor import capture_exception
+from app.utils.constants import ROLLUP_BUCKET_COUNT, ROLLUP_BUCKET_SECONDS
+
+ROLLUP_TABLE = "productivity_daily_rollup"
+ROLLUP_COLUMNS = "day, employee_id, flight_type, drawer_count, timed_count, sum_sec, sum_sq_sec, min_sec, max_sec, histogram"
+
+ROLLUP_PAGE_SIZE = 1000
+ROLLUP_IDS_PER_QUERY = 100
+
+REFRESH_INTERVAL_SECONDS = float(os.getenv("PRODUCTIVITY_ROLLUP_INTERVAL_SEC", "300"))
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+# ============================================
+# REFRESH
+# ============================================
+
+def refresh_rollup() -> dict:
+    """Recalcula los días con drawers o logs nuevos y avanza el watermark"""
+    response = supabase.rpc("refresh_productivity_rollup", {}).execute()
+    return response.data or {}
+
+
+async def _refresh_loop(interval: float):
+    while True:
+        try:
+            result = await run_in_threadpool(refresh_rollup)
+            if result.get("days_refreshed"):
+                print(f"📊 Rollup actualizado: {result}")
+        except Exception as e:
+            print(f"⚠️ Error refrescando rollup de productividad: {e}")
+            capture_exception(e, route="productivity_rollup")
+        await asyncio.sleep(interval)
+
+
+def start_rollup_job():
+    """Arranca el job periódico (PRODUCTIVITY_ROLLUP_INTERVAL_SEC=0 lo desactiva)"""
+    global _refresh_task
+    if REFRESH_INTERVAL_SECONDS <= 0 or _refresh_task is not None:
+        return
+    _refresh_task = asyncio.create_task(_refresh_loop(REFRESH_INTERVAL_SECONDS))
+
+
+async def stop_rollup_job():
+    global _refresh_task
+    if _refresh_task is None:
+        return
+    _refresh_task.cancel()
+    try:
+        await _refresh_task
+    except asyncio.CancelledError:
+        pass
+    _refresh_task = None
+
+
+# ============================================
+# CONSULTA
+# ============================================
+
+def fetch_rollup_rows(
+    days_back: int,
+    employee_id: Optional[str] = None,
+    employee_ids: Optional[List[str]] = None,
+) -> List[dict]:
+    """
+    Filas diarias de los últimos days_back días (O(días), no O(drawers))
+    Pagina con range() porque sin filtro de empleado puede pasar de 1000 filas;
+    employee_ids se consulta en grupos para no hacer URLs enormes
+    """
+    if employee_id:
+        return _fetch_rollup_pages(days_back, [employee_id])
+    if employee_ids:
+        rows = []
+        for i in range(0, len(employee_ids), ROLLUP_IDS_PER_QUERY):
+            rows.extend(_fetch_rollup_pages(days_back, employee_ids[i:i + ROLLUP_IDS_PER_QUERY]))
+        return rows
+    return _fetch_rollup_pages(days_back, None)
+
+
+def _fetch_rollup_pages(days_back: int, employee_ids: Optional[List[str]]) -> List[dict]:
+    # El rollup agrupa por día UTC (sql/002)
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days_back)).isoformat()
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table(ROLLUP_TABLE).select(ROLLUP_COLUMNS).gte("day", since)
+        if employee_ids is not None:
+            query = query.eq("employee_id", employee_ids[0]) if len(employee_ids) == 1 \
+                else query.in_("employee_id", employee_ids)
+        page = query.order("day").order("employee_id").order("flight_type") \
+            .range(start, start + ROLLUP_PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < ROLLUP_PAGE_SIZE:
+            return rows
+        start += ROLLUP_PAGE_SIZE
+
+
+def percentile_from_histogram(histogram: List[int], q: float) -> Optional[float]:
+    """Percentil aproximado interpolando linealmente dentro de la cubeta"""
+    total = sum(histogram)
+    if total == 0:
+        return None
+    target = q * total
+    cumulative = 0
+    for bucket, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            fraction = (target - cumulative) / count
+            return (bucket + fraction) * ROLLUP_BUCKET_SECONDS
+        cumulative += count
+    return float(len(histogram) * ROLLUP_BUCKET_SECONDS)
+
+
+def summarize_rollups(rows: Iterable[dict]) -> dict:
+    """
+    Combina filas diarias en count/sum/mean/std/min/max/p50/p90
+    count son todos los drawers; los tiempos solo salen de los que tienen
+    tiempo registrado (timed_count), igual que get_employee_drawer_stats
+    """
+    count = 0
+    timed = 0
+    total = 0.0
+    total_sq = 0.0
+    min_sec = None
+    max_sec = None
+    histogram = [0] * ROLLUP_BUCKET_COUNT
+
+    for row in rows:
+        n = row.get("drawer_count") or 0
+        if not n:
+            continue
+        count += n
+        if not row.get("timed_count"):
+            continue
+        timed += row["timed_count"]
+        total += row["sum_sec"]
+        total_sq += row["sum_sq_sec"]
+        min_sec = row["min_sec"] if min_sec is None else min(min_sec, row["min_sec"])
+        max_sec = row["max_sec"] if max_sec is None else max(max_sec, row["max_sec"])
+        for i, c in enumerate(row.get("histogram") or []):
+            if i < ROLLUP_BUCKET_COUNT:
+                histogram[i] += c
+
+    mean = total / timed if timed else 0.0
+    variance = max(total_sq / timed - mean * mean, 0.0) if timed else 0.0
+
+    return {
+        "count": count,
+        "timed_count": timed,
+        "sum_sec": total,
+        "mean_sec": mean,
+        "std_sec": math.sqrt(variance),
+        "min_sec": min_sec or 0,
+        "max_sec": max_sec or 0,
+        "p50_sec": percentile_from_histogram(histogram, 0.5),
+        "p90_sec": percentile_from_histogram(histogram, 0.9),
+    }
+
+
+# ============================================
+# EQUIPO (VECTORIZADO)
+# ============================================
+
+def _histogram_percentiles(histograms: np.ndarray, q: float) -> np.ndarray:
+    """percentile_from_histogram aplicado a cada fila de una matriz (NaN sin datos)"""
+    totals = histograms.sum(axis=1)
+    target = q * totals
+    cumulative = histograms.cumsum(axis=1)
+    bucket = np.argmax(cumulative >= target[:, None], axis=1)
+    rows = np.arange(len(histograms))
+    in_bucket = histograms[rows, bucket]
+    before = cumulative[rows, bucket] - in_bucket
+    fraction = np.divide(target - before, in_bucket, out=np.zeros_like(target), where=in_bucket > 0)
+    return np.where(totals > 0, (bucket + fraction) * ROLLUP_BUCKET_SECONDS, np.nan)
+
+
+def summarize_team_rollups(rows: List[dict]) -> List[dict]:
+    """
+    Estadísticas por empleado a partir de las filas diarias de todo el equipo
+    - count/mean/std/min/max con bincount y ufunc.at (count son todos los
+      drawers; mean/std/min/max solo los que tienen tiempo, None si ninguno)
+    - p50/p90 del histograma sumado por empleado
+    - Tendencia: pendiente (mínimos cuadrados ponderados por drawers) del
+      promedio diario; negativa = cada vez más rápido
+    """
+    rows = [r for r in rows if r.get("drawer_count") and r.get("employee_id")]
+    if not rows:
+        return []
+
+    employee_ids, emp_idx = np.unique([r["employee_id"] for r in rows], return_inverse=True)
+    n_emp = len(employee_ids)
+    days = np.array([date.fromisoformat(str(r["day"])[:10]).toordinal() for r in rows])
+    drawer_counts = np.array([r["drawer_count"] for r in rows], dtype=np.float64)
+    counts = np.array([r.get("timed_count") or 0 for r in rows], dtype=np.float64)
+    sums = np.array([r["sum_sec"] for r in rows], dtype=np.float64)
+    sums_sq = np.array([r["sum_sq_sec"] for r in rows], dtype=np.float64)
+
+    drawers = np.bincount(emp_idx, weights=drawer_counts, minlength=n_emp)
+    count = np.bincount(emp_idx, weights=counts, minlength=n_emp)
+    total = np.bincount(emp_idx, weights=sums, minlength=n_emp)
+    total_sq = np.bincount(emp_idx, weights=sums_sq, minlength=n_emp)
+    mean = np.divide(total, count, out=np.full(n_emp, np.nan), where=count > 0)
+    std = np.sqrt(np.maximum(
+        np.divide(total_sq, count, out=np.full(n_emp, np.nan), where=count > 0) - mean ** 2, 0.0
+    ))
+
+    # Filas sin drawers con tiempo traen min/max null
+    min_sec = np.full(n_emp, np.inf)
+    max_sec = np.full(n_emp, -np.inf)
+    np.minimum.at(min_sec, emp_idx, np.array(
+        [np.inf if r["min_sec"] is None else r["min_sec"] for r in rows], dtype=np.float64))
+    np.maximum.at(max_sec, emp_idx, np.array(
+        [-np.inf if r["max_sec"] is None else r["max_sec"] for r in rows], dtype=np.float64))
+    min_sec[count == 0] = np.nan
+    max_sec[count == 0] = np.nan
+
+    histograms = np.zeros((n_emp, ROLLUP_BUCKET_COUNT))
+    row_hist = np.zeros((len(rows), ROLLUP_BUCKET_COUNT))
+    for i, r in enumerate(rows):
+        h = (r.get("histogram") or [])[:ROLLUP_BUCKET_COUNT]
+        row_hist[i, :len(h)] = h
+    np.add.at(histograms, emp_idx, row_hist)
+    p50 = _histogram_percentiles(histograms, 0.5)
+    p90 = _histogram_percentiles(histograms, 0.9)
+
+    # Regresión ponderada del promedio diario contra el día (x centrado en el primer día)
+    x = (days - days.min()).astype(np.float64)
+    sw = count
+    swx = np.bincount(emp_idx, weights=counts * x, minlength=n_emp)
+    swxx = np.bincount(emp_idx, weights=counts * x * x, minlength=n_emp)
+    swy = total  # Σ n_dia * promedio_dia = Σ segundos
+    swxy = np.bincount(emp_idx, weights=sums * x, minlength=n_emp)
+    denominator = sw * swxx - swx ** 2
+    slope = np.divide(sw * swxy - swx * swy, denominator, out=np.full(n_emp, np.nan), where=denominator > 1e-9)
+
+    # Días distintos con drawers por empleado (llave única empleado-día)
+    span = int(x.max()) + 1
+    day_keys = np.unique(emp_idx * span + x.astype(np.int64))
+    active_days = np.bincount(day_keys // span, minlength=n_emp)
+
+    def _opt(value: float, digits: int = 1) -> Optional[float]:
+        return None if np.isnan(value) else round(float(value), digits)
+
+    return [
+        {
+            "employee_id": str(employee_ids[i]),
+            "completed_drawers": int(drawers[i]),
+            "timed_drawers": int(count[i]),
+            "active_days": int(active_days[i]),
+            "mean_sec": _opt(mean[i], 6),
+            "std_sec": _opt(std[i], 6),
+            "min_sec": _opt(min_sec[i], 6),
+            "max_sec": _opt(max_sec[i], 6),
+            "p50_sec": _opt(p50[i]),
+            "p90_sec": _opt(p90[i]),
+            "trend_sec_per_day": _opt(slope[i], 2),
+        }
+        for i in range(n_emp)
+    ]
@@ -0,0 +1,108 @@
+"""
+Ingesta en lote de scanned_products
+- Llave de idempotencia por scan: barcode + drawer + scanned_at (o la del cliente)
+- Duplicados dentro del lote y ya guardados se reportan sin volver a insertar
+- Productos y llaves ya guardadas se consultan con in_ en grupos de
+  IDS_PER_QUERY (1000 llaves sha1 en una sola URL pasan de 40 KB)
+- Un solo insert multi-fila con on conflict do nothing (ver sql/003)
+- Las filas creadas se publican en el feed en vivo al momento; el índice de
+  caducidad las toma de ahí (evento "scan")
+"""
+
+import hashlib
+from datetime import timezone
+from typing import Dict, Iterable, List
+
+from app.db import supabase
+from app.schemas.vision import ScannedProductCreate
+from app.services.change_feed import publish_rows
+from app.services.validation import parse_datetime
+
+RESULT_CREATED = "created"
+RESULT_DUPLICATE = "duplicate"
+RESULT_REJECTED = "rejected"
+
+IDS_PER_QUERY = 100
+
+
+def scan_idempotency_key(scan: ScannedProductCreate) -> str:
+    """La hora se normaliza a UTC para que el mismo scan genere la misma llave"""
+    if scan.idempotency_key:
+        return scan.idempotency_key
+    scanned_at = parse_datetime(scan.scanned_at)
+    moment = scanned_at.astimezone(timezone.utc).isoformat(timespec="milliseconds") if scanned_at else scan.scanned_at
+    raw = f"{scan.barcode}|{scan.drawer_id or ''}|{moment}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _to_row(scan: ScannedProductCreate, key: str) -> dict:
+    """Mismas columnas que guarda la app móvil (scanned_by, confidence)"""
+    return {
+        "product_id": scan.product_id,
+        "barcode": scan.barcode,
+        "drawer_id": scan.drawer_id,
+        "flight_id": scan.flight_id,
+        "expiry_date": scan.expiry_date,
+        "lot_number": scan.lot_number,
+        "scanned_at": scan.scanned_at,
+        "scanned_by": scan.employee_id,
+        "status": scan.status,
+        "confidence": scan.confidence_score,
+        "image_url": scan.image_url,
+        "idempotency_key": key,
+    }
+
+
+def _select_in(table: str, columns: str, column: str, values: List[str]) -> Iterable[dict]:
+    for i in range(0, len(values), IDS_PER_QUERY):
+        yield from supabase.table(table).select(columns) \
+            .in_(column, values[i:i + IDS_PER_QUERY]).execute().data or []
+
+
+def ingest_scan_batch(scans: List[ScannedProductCreate]) -> dict:
+    results: List[dict] = []
+    pending: Dict[str, ScannedProductCreate] = {}
+    for scan in scans:
+        key = scan_idempotency_key(scan)
+        if key in pending:
+            results.append({"idempotency_key": key, "result": RESULT_DUPLICATE, "reason": "repeated_in_batch"})
+        else:
+            pending[key] = scan
+            results.append({"idempotency_key": key, "result": None})
+
+    product_ids = list({s.product_id for s in pending.values()})
+    known = {p["id"] for p in _select_in("products", "id", "id", product_ids)}
+    existing = {
+        r["idempotency_key"]: r["id"]
+        for r in _select_in("scanned_products", "id, idempotency_key", "idempotency_key", list(pending))
+    }
+
+    rows = [
+        _to_row(scan, key) for key, scan in pending.items()
+        if key not in existing and scan.product_id in known
+    ]
+    inserted: Dict[str, dict] = {}
+    if rows:
+        # Si otro reintento ganó la carrera, el conflicto se ignora y la fila no regresa
+        data = supabase.table("scanned_products") \
+            .upsert(rows, on_conflict="idempotency_key", ignore_duplicates=True).execute().data or []
+        inserted = {r["idempotency_key"]: r for r in data}
+        publish_rows("scanned_products", data)
+
+    for entry in results:
+        if entry["result"] is not None:
+            continue
+        key = entry["idempotency_key"]
+        if key in inserted:
+            entry.update(result=RESULT_CREATED, id=inserted[key].get("id"))
+        elif key in existing:
+            entry.update(result=RESULT_DUPLICATE, id=existing[key], reason="already_stored")
+        elif pending[key].product_id not in known:
+            entry.update(result=RESULT_REJECTED, reason="unknown_product", product_id=pending[key].product_id)
+        else:
+            entry.update(result=RESULT_DUPLICATE, reason="concurrent_retry")
+
+    summary = {RESULT_CREATED: 0, RESULT_DUPLICATE: 0, RESULT_REJECTED: 0}
+    for entry in results:
+        summary[entry["result"]] += 1
+    return {"summary": summary, "items": results}
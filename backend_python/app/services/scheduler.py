@@ -0,0 +1,157 @@
+"""
+Planeación de turno: asigna drawers a empleados
+- Costo por drawer: calculate_base_estimate (depende del nivel del empleado)
+- Heurística de lista: drawers en orden EDF (deadline más cercano primero) y,
+  dentro del mismo deadline, LPT (más largos primero)
+- Cada drawer va al empleado que lo termina antes; un heap por nivel de
+  experiencia (free_at, empleado) hace que elegir sea O(niveles · log E)
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.services.build_time import EXPERIENCE_LEVELS, calculate_base_estimate, get_experience_level
+
+
+@dataclass
+class ScheduleFlight:
+    flight_id: str
+    flight_type: str
+    deadline: datetime
+    item_counts: List[int]  # un elemento por drawer
+
+
+@dataclass
+class ScheduleEmployee:
+    employee_id: str
+    experience_months: Optional[int] = None
+    available_from: Optional[datetime] = None
+    level: str = field(init=False)
+
+    def __post_init__(self):
+        self.level = get_experience_level(self.experience_months)
+
+
+# Meses representativos de cada nivel para calcular su costo con calculate_base_estimate
+_LEVEL_MONTHS = {"novice": 1, "intermediate": 4, "experienced": 9, "expert": 24}
+
+
+class _CostModel:
+    """Memoiza calculate_base_estimate por (items, tipo de vuelo, nivel)"""
+
+    def __init__(self):
+        self._cache: Dict[Tuple[int, str, str], int] = {}
+
+    def seconds(self, item_count: int, flight_type: str, level: str) -> int:
+        key = (item_count, flight_type, level)
+        value = self._cache.get(key)
+        if value is None:
+            value = calculate_base_estimate(item_count, flight_type, _LEVEL_MONTHS[level])["estimated_time_seconds"]
+            self._cache[key] = value
+        return value
+
+
+def schedule_drawers(
+    flights: List[ScheduleFlight],
+    employees: List[ScheduleEmployee],
+    shift_start: datetime,
+) -> dict:
+    """
+    Retorna asignaciones por empleado, estado por vuelo y métricas del plan
+    Los drawers que no alcanzan su deadline se asignan igual (mejor esfuerzo)
+    y se marcan como tarde
+    """
+    if not employees:
+        raise ValueError("Se requiere al menos un empleado")
+
+    costs = _CostModel()
+
+    # Drawers en orden EDF; empate -> más largo primero (costo de referencia "experienced")
+    jobs = []
+    for f_idx, flight in enumerate(flights):
+        deadline = (flight.deadline - shift_start).total_seconds()
+        for d_idx, items in enumerate(flight.item_counts):
+            ref = costs.seconds(items, flight.flight_type, "experienced")
+            jobs.append((deadline, -ref, f_idx, d_idx))
+    jobs.sort()
+
+    # Un heap de (free_at, índice de empleado) por nivel
+    heaps: Dict[str, List[Tuple[float, int]]] = {level: [] for level in EXPERIENCE_LEVELS}
+    for e_idx, emp in enumerate(employees):
+        start = max(0.0, (emp.available_from - shift_start).total_seconds()) if emp.available_from else 0.0
+        heaps[emp.level].append((start, e_idx))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    assignments: List[List[dict]] = [[] for _ in employees]
+    busy = [0.0] * len(employees)
+    flight_done = [0.0] * len(flights)
+    flight_late = [0] * len(flights)
+
+    for deadline, _, f_idx, d_idx in jobs:
+        flight = flights[f_idx]
+        items = flight.item_counts[d_idx]
+
+        # El mejor candidato de cada nivel es el que se libera primero
+        best = None
+        for level, heap in heaps.items():
+            if not heap:
+                continue
+            free_at, e_idx = heap[0]
+            end = free_at + costs.seconds(items, flight.flight_type, level)
+            if best is None or end < best[0]:
+                best = (end, free_at, level, e_idx)
+
+        end, start, level, e_idx = best
+        heapq.heapreplace(heaps[level], (end, e_idx))
+
+        late = end > deadline
+        assignments[e_idx].append({
+            "flight_id": flight.flight_id,
+            "drawer_index": d_idx,
+            "item_count": items,
+            "start": shift_start + timedelta(seconds=start),
+            "end": shift_start + timedelta(seconds=end),
+            "late": late,
+        })
+        busy[e_idx] += end - start
+        flight_done[f_idx] = max(flight_done[f_idx], end)
+        flight_late[f_idx] += late
+
+    makespan = max(flight_done, default=0.0)
+    total_busy = sum(busy)
+
+    return {
+        "shift_start": shift_start,
+        "makespan_minutes": round(makespan / 60, 1),
+        "finish_at": shift_start + timedelta(seconds=makespan),
+        "total_drawers": len(jobs),
+        "late_drawers": sum(flight_late),
+        "feasible": sum(flight_late) == 0,
+        "utilization": round(total_busy / (makespan * len(employees)), 3) if makespan else 0.0,
+        "flights": [
+            {
+                "flight_id": flight.flight_id,
+                "flight_type": flight.flight_type,
+                "deadline": flight.deadline,
+                "drawers": len(flight.item_counts),
+                "completed_at": shift_start + timedelta(seconds=flight_done[i]) if flight.item_counts else None,
+                "slack_minutes": round(((flight.deadline - shift_start).total_seconds() - flight_done[i]) / 60, 1),
+                "late_drawers": flight_late[i],
+                "on_time": flight_late[i] == 0,
+            }
+            for i, flight in enumerate(flights)
+        ],
+        "employees": [
+            {
+                "employee_id": emp.employee_id,
+                "experience_level": emp.level,
+                "drawers": len(assignments[i]),
+                "busy_minutes": round(busy[i] / 60, 1),
+                "assignments": assignments[i],
+            }
+            for i, emp in enumerate(employees)
+        ],
+    }
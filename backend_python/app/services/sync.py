@@ -0,0 +1,81 @@
+"""
+Sincronización delta para la app móvil (ver sql/004_sync_change_log.sql)
+- Cursor opaco: updated_at + id del último cambio entregado y el id del
+  último tombstone; el cliente lo manda como since en la siguiente llamada
+- Sin since: descarga completa (paginada) y cursor de tombstones al día
+- Solo se entregan cambios con más de SYNC_SAFETY_LAG_SECONDS de antigüedad
+  para no saltarse filas de transacciones que todavía no hacen commit
+"""
+
+import base64
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.db import supabase
+
+SYNC_SAFETY_LAG_SECONDS = float(os.getenv("SYNC_SAFETY_LAG_SEC", "5"))
+SYNC_TABLES = ("products", "flights")
+
+
+def encode_cursor(updated_at: Optional[str], row_id: Optional[str], tombstone_id: int) -> str:
+    raw = json.dumps({"u": updated_at, "i": row_id, "t": tombstone_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {"u": cursor.get("u"), "i": cursor.get("i"), "t": int(cursor.get("t") or 0)}
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Cursor de sincronización inválido")
+
+
+def _latest_tombstone_id(table: str) -> int:
+    rows = supabase.table("sync_tombstones").select("id").eq("table_name", table) \
+        .order("id", desc=True).limit(1).execute().data or []
+    return rows[0]["id"] if rows else 0
+
+
+def fetch_changes(table: str, since: Optional[str] = None, limit: int = 1000) -> dict:
+    if table not in SYNC_TABLES:
+        raise ValueError(f"Tabla no sincronizable: {table}")
+
+    cursor = decode_cursor(since) if since else None
+    upper = (datetime.now(timezone.utc) - timedelta(seconds=SYNC_SAFETY_LAG_SECONDS)).isoformat()
+
+    query = supabase.table(table).select("*").lt("updated_at", upper)
+    if cursor and cursor["u"]:
+        # Orden estable (updated_at, id): no repite ni pierde filas con el mismo updated_at
+        query = query.or_(
+            f'updated_at.gt."{cursor["u"]}",and(updated_at.eq."{cursor["u"]}",id.gt."{cursor["i"]}")'
+        )
+    rows = query.order("updated_at").order("id").limit(limit + 1).execute().data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if cursor:
+        tombstones = supabase.table("sync_tombstones").select("id, row_id") \
+            .eq("table_name", table).gt("id", cursor["t"]).lt("deleted_at", upper) \
+            .order("id").limit(limit + 1).execute().data or []
+        has_more = has_more or len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        tombstone_id = tombstones[-1]["id"] if tombstones else cursor["t"]
+    else:
+        tombstones = []
+        tombstone_id = _latest_tombstone_id(table)
+
+    if rows:
+        last_updated, last_id = rows[-1]["updated_at"], rows[-1]["id"]
+    else:
+        last_updated, last_id = (cursor["u"], cursor["i"]) if cursor else (None, None)
+
+    return {
+        "full": cursor is None,
+        "changes": rows,
+        "deleted": [t["row_id"] for t in tombstones],
+        "version": encode_cursor(last_updated, last_id, tombstone_id),
+        "has_more": has_more,
+    }
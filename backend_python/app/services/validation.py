@@ -0,0 +1,188 @@
+"""
+Validación de caducidad en el servidor
+- Una sola regla para todos los clientes: un producto debe seguir vigente
+  hasta que termina el vuelo (arrival_time + duración de la ruta)
+- expired: caduca antes de ese corte; warning: caduca dentro de
+  EXPIRY_WARNING_DAYS después del corte (mismo margen que la app móvil);
+  valid: el resto
+- Los cortes se calculan una vez por vuelo (FlightCutoffs) y se reutilizan
+  para todos los items del drawer
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from app.db import supabase
+from app.utils.cache import TTLCache
+
+EXPIRY_WARNING_DAYS = int(os.getenv("EXPIRY_WARNING_DAYS", "7"))
+
+# Duración de ruta por tipo de vuelo (la tabla flights no la guarda)
+ROUTE_DURATION_HOURS = {
+    "Domestic": 3,
+    "International": 10,
+}
+DEFAULT_ROUTE_DURATION_HOURS = 6
+
+STATUS_VALID = "valid"
+STATUS_WARNING = "warning"
+STATUS_EXPIRED = "expired"
+
+cutoff_cache = TTLCache(ttl_seconds=300, max_entries=4096)
+
+# Ids por consulta in_ (cada uuid son ~40 caracteres de URL)
+FLIGHT_IDS_PER_QUERY = 100
+FLIGHTS_PAGE_SIZE = 1000
+
+
+@dataclass
+class FlightCutoffs:
+    flight_id: Optional[str]
+    ends_at: datetime
+    expired_before: date   # expiry_date < expired_before -> expired
+    warning_until: date    # expiry_date <= warning_until -> warning
+
+    @classmethod
+    def for_flight(cls, flight: dict, route_duration_minutes: Optional[int] = None) -> "FlightCutoffs":
+        arrival = parse_datetime(flight.get("arrival_time")) or datetime.now(timezone.utc)
+        if route_duration_minutes is None:
+            hours = ROUTE_DURATION_HOURS.get(flight.get("flight_type"), DEFAULT_ROUTE_DURATION_HOURS)
+            route_duration_minutes = hours * 60
+        ends_at = arrival + timedelta(minutes=route_duration_minutes)
+        return cls._from_end(flight.get("id"), ends_at)
+
+    @classmethod
+    def today(cls) -> "FlightCutoffs":
+        """Sin vuelo: se valida contra hoy (como la app móvil)"""
+        return cls._from_end(None, datetime.now(timezone.utc))
+
+    @classmethod
+    def _from_end(cls, flight_id: Optional[str], ends_at: datetime) -> "FlightCutoffs":
+        end_day = ends_at.date()
+        return cls(
+            flight_id=flight_id,
+            ends_at=ends_at,
+            expired_before=end_day,
+            warning_until=end_day + timedelta(days=EXPIRY_WARNING_DAYS),
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "flight_id": self.flight_id,
+            "flight_ends_at": self.ends_at.isoformat(),
+            "expired_before": self.expired_before.isoformat(),
+            "warning_until": self.warning_until.isoformat(),
+        }
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_expiry(value) -> Optional[date]:
+    """Acepta date, datetime o texto ISO (YYYY-MM-DD o con hora)"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def classify_expiry(expiry_value, cutoffs: FlightCutoffs) -> dict:
+    """Estado de un item contra los cortes de su vuelo"""
+    expiry = parse_expiry(expiry_value)
+    if expiry is None:
+        # Sin fecha legible no se puede aprobar: requiere revisión manual
+        return {"status": STATUS_WARNING, "reason": "missing_expiry", "days_margin": None}
+
+    margin = (expiry - cutoffs.expired_before).days
+    if expiry < cutoffs.expired_before:
+        status, reason = STATUS_EXPIRED, "expires_before_flight_end"
+    elif expiry <= cutoffs.warning_until:
+        status, reason = STATUS_WARNING, "expires_soon_after_flight"
+    else:
+        status, reason = STATUS_VALID, None
+    return {"status": status, "reason": reason, "days_margin": margin, "expiry_date": expiry.isoformat()}
+
+
+def get_flight_cutoffs(
+    flight_ids: Iterable[Optional[str]],
+    route_duration_minutes: Optional[int] = None,
+) -> Dict[Optional[str], FlightCutoffs]:
+    """
+    Cortes por vuelo; los que no están en cache se consultan en grupos de
+    FLIGHT_IDS_PER_QUERY
+    La llave None (scans sin vuelo) usa la fecha de hoy
+    """
+    ids = {f for f in flight_ids if f}
+    cutoffs: Dict[Optional[str], FlightCutoffs] = {None: FlightCutoffs.today()}
+    missing = []
+    for flight_id in ids:
+        cached = cutoff_cache.get((flight_id, route_duration_minutes))
+        if cached is not None:
+            cutoffs[flight_id] = cached
+        else:
+            missing.append(flight_id)
+
+    for i in range(0, len(missing), FLIGHT_IDS_PER_QUERY):
+        rows = supabase.table("flights").select("id, flight_type, arrival_time") \
+            .in_("id", missing[i:i + FLIGHT_IDS_PER_QUERY]).execute().data or []
+        for row in rows:
+            value = FlightCutoffs.for_flight(row, route_duration_minutes)
+            cutoff_cache.set((row["id"], route_duration_minutes), value)
+            cutoffs[row["id"]] = value
+
+    return cutoffs
+
+
+def get_unfinished_flight_ids(route_duration_minutes: Optional[int] = None) -> List[str]:
+    """
+    Vuelos que pueden no haber terminado: llegada después de ahora menos la
+    ruta más larga (el corte exacto lo aplica FlightCutoffs)
+    """
+    if route_duration_minutes is None:
+        route_duration_minutes = max(*ROUTE_DURATION_HOURS.values(), DEFAULT_ROUTE_DURATION_HOURS) * 60
+    since = (datetime.now(timezone.utc) - timedelta(minutes=route_duration_minutes)).isoformat()
+    ids = []
+    start = 0
+    while True:
+        page = supabase.table("flights").select("id").gte("arrival_time", since) \
+            .order("id").range(start, start + FLIGHTS_PAGE_SIZE - 1).execute().data or []
+        ids.extend(row["id"] for row in page)
+        if len(page) < FLIGHTS_PAGE_SIZE:
+            return ids
+        start += FLIGHTS_PAGE_SIZE
+
+
+def validate_items(items: List[dict], cutoffs: Dict[Optional[str], FlightCutoffs]) -> List[dict]:
+    """
+    items: [{"expiry_date", "flight_id", ...}] -> mismos items + status/reason/days_margin
+    Vuelos desconocidos caen en el corte de hoy
+    """
+    today = cutoffs[None]
+    return [
+        {**item, **classify_expiry(item.get("expiry_date"), cutoffs.get(item.get("flight_id"), today))}
+        for item in items
+    ]
+
+
+def summarize_statuses(results: List[dict]) -> dict:
+    summary = {STATUS_VALID: 0, STATUS_WARNING: 0, STATUS_EXPIRED: 0}
+    for r in results:
+        summary[r["status"]] += 1
+    return summary
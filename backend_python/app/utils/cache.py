@@ -0,0 +1,165 @@
+"""
+Cache en memoria con expiración (TTL) y límite de entradas (LRU)
+- TTLCache: seguro para usarse desde endpoints sync (threadpool) y async
+- AsyncSingleFlightCache: para llamadas async caras (LLM), con coalescing
+  de requests concurrentes y stale-while-revalidate
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Cache clave -> valor con TTL por entrada y desalojo LRU"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna el valor si existe y no ha expirado, si no None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Elimina una clave, o todo el cache si key es None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+class AsyncSingleFlightCache:
+    """
+    Cache async con single-flight y stale-while-revalidate
+
+    - Dentro de ttl_seconds el valor se sirve directo
+    - Entre ttl_seconds y ttl_seconds + stale_seconds se sirve el valor viejo
+      y se refresca en background
+    - Requests concurrentes para la misma clave comparten una sola llamada
+    Debe usarse desde un único event loop.
+    """
+
+    def __init__(self, ttl_seconds: float, stale_seconds: float = 0, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        should_cache: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        now = time.monotonic()
+        entry = self._data.get(key)
+
+        if entry is not None:
+            stored_at, value = entry
+            age = now - stored_at
+            if age < self.ttl_seconds:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                self._start(key, compute, should_cache)
+                return value
+            del self._data[key]
+
+        if key in self._inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return await asyncio.shield(self._start(key, compute, should_cache))
+
+    def _start(self, key, compute, should_cache) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, compute, should_cache))
+            # Evita "Task exception was never retrieved" en refrescos en background
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _run(self, key, compute, should_cache):
+        try:
+            value = await compute()
+            if should_cache(value):
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Valor vigente (fresco o stale) sin disparar cálculo; None si no hay"""
+        entry = self._data.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl_seconds + self.stale_seconds:
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,99 @@
+"""
+Middleware de compresión con umbral de tamaño
+- brotli si el cliente lo acepta y está instalado; si no, gzip
+- Solo respuestas completas (no streaming: SSE debe salir sin buffer) y de
+  tipos que se benefician (JSON, MessagePack, texto)
+"""
+
+import gzip
+import os
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # buen balance CPU/tamaño para respuestas dinámicas
+
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "application/x-msgpack", "text/")
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if token and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(token)
+    if BROTLI_AVAILABLE and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return ""
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers = [(k, v) for k, v in start_message["headers"]]
+            names = {k.lower(): v for k, v in response_headers}
+            content_type = names.get(b"content-type", b"").decode("latin-1")
+            compressible = (
+                not message.get("more_body", False)
+                and b"content-encoding" not in names
+                and len(body) >= self.minimum_size
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            if compressible:
+                body = compress(body, encoding)
+                response_headers = [
+                    (k, v) for k, v in response_headers if k.lower() not in (b"content-length", b"vary")
+                ]
+                vary = names.get(b"vary")
+                response_headers += [
+                    (b"content-encoding", encoding.encode("latin-1")),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+                ]
+                start_message = {**start_message, "headers": response_headers}
+                message = {**message, "body": body}
+            else:
+                passthrough = True
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,10 @@
+"""
+Constantes compartidas entre servicios
+"""
+
+# Histograma de tiempos de ensamblaje (debe coincidir con sql/002_productivity_rollup.sql)
+ROLLUP_BUCKET_SECONDS = 60
+ROLLUP_BUCKET_COUNT = 61  # 0-59 min + cubeta de desborde (>= 60 min)
+
+# Objetivo de tiempo por drawer usado en benchmarks
+TARGET_TIME_MINUTES = 18
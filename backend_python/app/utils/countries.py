@@ -0,0 +1,117 @@
+"""
+Vocabulario de países de origen compartido por el modelo de demanda
+- /predict recibe el país como texto libre ("México", "mexico", "USA")
+- flights solo guarda route con códigos IATA ("MEX-JFK")
+Ambos se llevan a la misma llave: el nombre del país en minúsculas y sin acentos
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+# Alias (minúsculas, sin acentos) -> llave canónica
+COUNTRY_ALIASES = {
+    "mexico": "mexico", "mx": "mexico", "mex": "mexico",
+    "estados unidos": "estados unidos", "eeuu": "estados unidos", "ee uu": "estados unidos",
+    "usa": "estados unidos", "us": "estados unidos", "united states": "estados unidos",
+    "canada": "canada", "ca": "canada",
+    "espana": "espana", "spain": "espana", "es": "espana",
+    "francia": "francia", "france": "francia", "fr": "francia",
+    "reino unido": "reino unido", "united kingdom": "reino unido", "uk": "reino unido",
+    "inglaterra": "reino unido", "gb": "reino unido",
+    "alemania": "alemania", "germany": "alemania", "de": "alemania",
+    "italia": "italia", "italy": "italia", "it": "italia",
+    "paises bajos": "paises bajos", "holanda": "paises bajos", "netherlands": "paises bajos",
+    "portugal": "portugal", "pt": "portugal",
+    "suiza": "suiza", "switzerland": "suiza",
+    "turquia": "turquia", "turkey": "turquia",
+    "emiratos arabes unidos": "emiratos arabes unidos", "uae": "emiratos arabes unidos",
+    "qatar": "qatar", "catar": "qatar",
+    "japon": "japon", "japan": "japon", "jp": "japon",
+    "china": "china", "cn": "china",
+    "corea del sur": "corea del sur", "corea": "corea del sur", "south korea": "corea del sur",
+    "india": "india",
+    "australia": "australia",
+    "brasil": "brasil", "brazil": "brasil", "br": "brasil",
+    "argentina": "argentina", "ar": "argentina",
+    "colombia": "colombia", "co": "colombia",
+    "chile": "chile", "cl": "chile",
+    "peru": "peru", "pe": "peru",
+    "panama": "panama", "pa": "panama",
+    "cuba": "cuba",
+    "guatemala": "guatemala",
+    "costa rica": "costa rica",
+    "republica dominicana": "republica dominicana", "dominican republic": "republica dominicana",
+}
+
+# Aeropuertos IATA frecuentes -> llave canónica del país
+AIRPORT_COUNTRY = {
+    "MEX": "mexico", "NLU": "mexico", "MTY": "mexico", "GDL": "mexico", "CUN": "mexico",
+    "TIJ": "mexico", "SJD": "mexico", "PVR": "mexico", "MID": "mexico", "BJX": "mexico",
+    "QRO": "mexico", "CUL": "mexico", "HMO": "mexico", "OAX": "mexico", "VER": "mexico",
+    "JFK": "estados unidos", "EWR": "estados unidos", "LGA": "estados unidos",
+    "LAX": "estados unidos", "SFO": "estados unidos", "ORD": "estados unidos",
+    "DFW": "estados unidos", "IAH": "estados unidos", "ATL": "estados unidos",
+    "MIA": "estados unidos", "DEN": "estados unidos", "SEA": "estados unidos",
+    "LAS": "estados unidos", "PHX": "estados unidos", "BOS": "estados unidos",
+    "IAD": "estados unidos", "SAT": "estados unidos", "MCO": "estados unidos",
+    "YYZ": "canada", "YVR": "canada", "YUL": "canada", "YYC": "canada",
+    "MAD": "espana", "BCN": "espana",
+    "CDG": "francia", "ORY": "francia",
+    "LHR": "reino unido", "LGW": "reino unido", "MAN": "reino unido",
+    "FRA": "alemania", "MUC": "alemania",
+    "FCO": "italia", "MXP": "italia",
+    "AMS": "paises bajos",
+    "LIS": "portugal",
+    "ZRH": "suiza", "GVA": "suiza",
+    "IST": "turquia",
+    "DXB": "emiratos arabes unidos", "AUH": "emiratos arabes unidos",
+    "DOH": "qatar",
+    "NRT": "japon", "HND": "japon", "KIX": "japon",
+    "PEK": "china", "PVG": "china", "CAN": "china",
+    "ICN": "corea del sur",
+    "DEL": "india", "BOM": "india",
+    "SYD": "australia", "MEL": "australia",
+    "GRU": "brasil", "GIG": "brasil",
+    "EZE": "argentina", "AEP": "argentina",
+    "BOG": "colombia", "MDE": "colombia",
+    "SCL": "chile",
+    "LIM": "peru",
+    "PTY": "panama",
+    "HAV": "cuba",
+    "GUA": "guatemala",
+    "SJO": "costa rica",
+    "SDQ": "republica dominicana", "PUJ": "republica dominicana",
+}
+
+_ROUTE_RE = re.compile(r"^([a-z]{3})(?:\s*-\s*[a-z]{3})+$")
+
+
+def _clean(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value)
+    text = "".join(c for c in normalized if not unicodedata.combining(c))
+    return " ".join(text.replace(".", " ").casefold().split())
+
+
+def normalize_country(value: Optional[str]) -> str:
+    """
+    Llave de país para un nombre, alias, código IATA o ruta ("MEX-JFK" -> "mexico")
+    Lo que no se reconoce se regresa limpio; "unknown" si viene vacío
+    """
+    text = _clean(value or "")
+    if not text:
+        return "unknown"
+    if text in COUNTRY_ALIASES:
+        return COUNTRY_ALIASES[text]
+
+    route = _ROUTE_RE.match(text)
+    code = route.group(1) if route else text
+    if len(code) == 3 and code.isalpha():
+        return AIRPORT_COUNTRY.get(code.upper(), code)
+    return text
+
+
+def route_origin_country(route: Optional[str]) -> str:
+    """País del primer tramo de una ruta de flights"""
+    first = (route or "").split("-")[0]
+    return normalize_country(first)
@@ -0,0 +1,59 @@
+"""
+Utilidades de fechas y horas compartidas por los servicios
+"""
+
+import unicodedata
+from typing import Optional
+
+# Franjas horarias usadas por el frontend (ForecastPage): mañana / tarde / noche
+TIME_OF_DAY_BUCKETS = ("mañana", "tarde", "noche")
+
+_TIME_OF_DAY_ALIASES = {
+    "manana": "mañana",
+    "morning": "mañana",
+    "am": "mañana",
+    "tarde": "tarde",
+    "afternoon": "tarde",
+    "noche": "noche",
+    "night": "noche",
+    "evening": "noche",
+    "madrugada": "noche",
+    "pm": "tarde",
+}
+
+
+def _strip_accents(text: str) -> str:
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in normalized if not unicodedata.combining(c))
+
+
+def hour_to_time_of_day(hour: int) -> str:
+    """05-11 -> mañana, 12-18 -> tarde, resto -> noche"""
+    if 5 <= hour < 12:
+        return "mañana"
+    if 12 <= hour < 19:
+        return "tarde"
+    return "noche"
+
+
+def normalize_time_of_day(value: str) -> str:
+    """
+    Normaliza "Mañana", "manana", "morning" o "07:30" a una franja
+    Si no se reconoce, retorna el texto en minúsculas sin espacios extra
+    """
+    raw = (value or "").strip().lower()
+    if ":" in raw:
+        try:
+            return hour_to_time_of_day(int(raw.split(":")[0]))
+        except ValueError:
+            pass
+    return _TIME_OF_DAY_ALIASES.get(_strip_accents(raw), raw)
+
+
+def duration_to_minutes(duration_str: str) -> Optional[int]:
+    """Convierte "HH:MM" a minutos; None si el formato no es válido"""
+    try:
+        hours, minutes = map(int, duration_str.split(":"))
+        return hours * 60 + minutes
+    except (ValueError, AttributeError):
+        return None
@@ -0,0 +1,238 @@
+"""
+Parser JSON tolerante e incremental para respuestas de LLM
+- Ignora fences de markdown (```json) y texto antes/después del JSON
+- Repara respuestas truncadas: cierra strings, arrays y objetos abiertos y
+  descarta la última llave/valor incompleto
+- Se alimenta por fragmentos (streaming) y puede dar un snapshot parcial
+  en cualquier momento
+- Cuenta cuántas respuestas se parsearon bien, reparadas o perdidas
+"""
+
+import json
+import re
+import threading
+from typing import Any, List, Optional, Tuple
+
+WHITESPACE = " \t\r\n"
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+class _Container:
+    __slots__ = ("kind", "state", "key_start")
+
+    def __init__(self, kind: str, state: str):
+        self.kind = kind          # "{" o "["
+        self.state = state        # key | colon | value | after_value
+        self.key_start = -1       # posición de la última llave abierta en el objeto
+
+
+class IncrementalJSONParser:
+    """
+    Escanea el texto una sola vez conforme llega y mantiene el estado léxico
+    (pila de contenedores, dentro de string, token suelto) para poder cerrar
+    la estructura en cualquier punto
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.start = -1          # primer { o [ del valor raíz
+        self.end = -1            # fin del valor raíz (texto posterior se ignora)
+        self.stack: List[_Container] = []
+        self.in_string = False
+        self.string_is_key = False
+        self.string_start = -1
+        self.escape = False
+        self.token_start = -1    # número / true / false / null en curso
+
+    @property
+    def complete(self) -> bool:
+        return self.end >= 0
+
+    def feed(self, chunk: str):
+        if self.complete:
+            return
+        self.text += chunk
+        text = self.text
+        while self.pos < len(text) and not self.complete:
+            self._step(text[self.pos])
+            self.pos += 1
+
+    def _value_done(self):
+        if not self.stack:
+            self.end = self.pos + 1
+            return
+        self.stack[-1].state = "after_value"
+
+    def _end_token(self):
+        if self.token_start >= 0:
+            self.token_start = -1
+            if self.stack:
+                self.stack[-1].state = "after_value"
+
+    def _step(self, c: str):
+        if self.start < 0:
+            # Todo lo anterior al primer { o [ (fences, prosa) se ignora
+            if c in "{[":
+                self.start = self.pos
+                self.stack.append(_Container(c, "key" if c == "{" else "value"))
+            return
+
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif c == "\\":
+                self.escape = True
+            elif c == '"':
+                self.in_string = False
+                if self.string_is_key:
+                    self.stack[-1].state = "colon"
+                else:
+                    self._value_done()
+            return
+
+        if self.token_start >= 0:
+            if c in WHITESPACE or c in ",]}":
+                self._end_token()
+            else:
+                return
+
+        if c in WHITESPACE:
+            return
+
+        top = self.stack[-1]
+        if c in "{[":
+            top.state = "after_value"
+            self.stack.append(_Container(c, "key" if c == "{" else "value"))
+        elif c in "}]":
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1].state = "after_value"
+            else:
+                self.end = self.pos + 1
+        elif c == '"':
+            self.in_string = True
+            self.string_start = self.pos
+            self.string_is_key = top.kind == "{" and top.state == "key"
+            if self.string_is_key:
+                top.key_start = self.pos
+        elif c == ":":
+            top.state = "value"
+        elif c == ",":
+            top.state = "key" if top.kind == "{" else "value"
+        else:
+            self.token_start = self.pos
+
+    # ---------- Reparación ----------
+
+    def _repaired_text(self) -> Optional[str]:
+        if self.start < 0:
+            return None
+        if self.complete:
+            return self.text[self.start:self.end]
+
+        body = self.text[self.start:self.pos]
+        top = self.stack[-1]
+        token_cut = False
+
+        if self.in_string and not self.string_is_key:
+            # Cortar escapes incompletos (\ o \uXX) antes de cerrar el string
+            tail = body[-6:]
+            backslash = tail.rfind("\\")
+            if backslash >= 0:
+                escape = tail[backslash:]
+                if len(escape) == 1 or (escape[1] == "u" and len(escape) < 6):
+                    body = body[:len(body) - len(escape)]
+            body += '"'
+        elif self.token_start >= 0:
+            try:
+                json.loads(self.text[self.token_start:self.pos])
+            except ValueError:
+                body = body[:self.token_start - self.start]
+                token_cut = True
+
+        # Objeto con llave sin valor completo ("key", "key": o "key": tru) -> quitar la llave
+        if top.kind == "{" and top.key_start >= 0:
+            dangling = (
+                (self.in_string and self.string_is_key)
+                or token_cut
+                or (not self.in_string and self.token_start < 0 and top.state in ("colon", "value"))
+            )
+            if dangling:
+                body = body[:top.key_start - self.start]
+
+        body = body.rstrip(WHITESPACE)
+        if body.endswith(","):
+            body = body[:-1]
+
+        closers = "".join("}" if c.kind == "{" else "]" for c in reversed(self.stack))
+        return body + closers
+
+    def _load(self) -> Tuple[Optional[Any], bool]:
+        """(valor, si hubo que quitar comas colgantes para parsearlo)"""
+        candidate = self._repaired_text()
+        if candidate is None:
+            return None, False
+        try:
+            return json.loads(candidate), False
+        except ValueError:
+            pass
+        # Comas colgantes ({"a": 1,}) son el error más común en JSON "casi válido"
+        try:
+            return json.loads(TRAILING_COMMA_RE.sub(r"\1", candidate)), True
+        except ValueError:
+            return None, False
+
+    def snapshot(self) -> Optional[Any]:
+        """Mejor intento de valor con lo recibido hasta ahora (None si no hay nada)"""
+        return self._load()[0]
+
+
+# ============================================
+# API DE ALTO NIVEL
+# ============================================
+
+class LLMParseStats:
+    """Contadores de respuestas del LLM: ok, reparadas y perdidas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"ok": 0, "repaired": 0, "failed": 0}
+
+    def record(self, status: str):
+        with self._lock:
+            self.counts[status] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "total": total,
+                "wasted_rate": round(self.counts["failed"] / total, 3) if total else 0.0,
+            }
+
+
+llm_parse_stats = LLMParseStats()
+
+
+def parse_llm_json(text: str, record: bool = True) -> Tuple[Optional[Any], str]:
+    """
+    Parsea la respuesta completa de un LLM
+    Retorna (valor, status) con status "ok", "repaired" o "failed"
+    ("ok" solo si el JSON venía completo y válido tal cual)
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text or "")
+    value, fixed_commas = parser._load()
+
+    if value is None:
+        status = "failed"
+    elif parser.complete and not fixed_commas:
+        status = "ok"
+    else:
+        status = "repaired"
+
+    if record:
+        llm_parse_stats.record(status)
+    return value, status
@@ -0,0 +1,241 @@
+"""
+Métricas de requests y de llamadas a servicios externos (formato Prometheus)
+- MetricsMiddleware (ASGI): latencia por ruta, requests en curso, status y
+  tamaño de request/response
+- track_upstream / instrument_httpx_client: tiempos de Supabase, OpenRouter y
+  Vision; se acumulan también por request (contextvar) y salen en el header
+  Server-Timing
+- Histogramas con cubetas fijas y contadores sin locks: el costo por request
+  es un bisect y unos cuantos incrementos (bajo el GIL se acepta perder algún
+  incremento concurrente de los hilos del threadpool)
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# Tiempos de servicios externos del request actual: {servicio: segundos}
+_upstream_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("upstream_timings", default=None)
+
+
+def current_upstream_services() -> List[str]:
+    """Servicios externos que ha llamado el request actual (en orden de primera llamada)"""
+    return list(_upstream_timings.get() or {})
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # la última es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_size: Dict[Tuple[str, str], Histogram] = {}
+        self.response_size: Dict[Tuple[str, str], Histogram] = {}
+        self.upstream: Dict[Tuple[str, str], Histogram] = {}
+
+    @staticmethod
+    def _histogram(table: dict, key, buckets) -> Histogram:
+        hist = table.get(key)
+        if hist is None:
+            hist = table.setdefault(key, Histogram(buckets))
+        return hist
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, req_bytes: int, resp_bytes: int):
+        key = (method, route)
+        status_key = (method, route, str(status))
+        self.requests[status_key] = self.requests.get(status_key, 0) + 1
+        self._histogram(self.latency, key, LATENCY_BUCKETS).observe(seconds)
+        self._histogram(self.request_size, key, SIZE_BUCKETS).observe(req_bytes)
+        self._histogram(self.response_size, key, SIZE_BUCKETS).observe(resp_bytes)
+
+    def observe_upstream(self, service: str, outcome: str, seconds: float):
+        self._histogram(self.upstream, (service, outcome), LATENCY_BUCKETS).observe(seconds)
+        timings = _upstream_timings.get()
+        if timings is not None:
+            timings[service] = timings.get(service, 0.0) + seconds
+
+    # ---------- Exposición ----------
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP process_uptime_seconds Segundos desde que arrancó el proceso",
+            "# TYPE process_uptime_seconds gauge",
+            f"process_uptime_seconds {time.time() - self.started_at:.3f}",
+            "# HELP http_requests_in_flight Requests HTTP en curso",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests HTTP por ruta y status",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), value in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {value}")
+
+        lines += _render_histograms(
+            "http_request_duration_seconds", "Latencia de requests HTTP", ("method", "route"), self.latency
+        )
+        lines += _render_histograms(
+            "http_request_size_bytes", "Tamaño del body del request", ("method", "route"), self.request_size
+        )
+        lines += _render_histograms(
+            "http_response_size_bytes", "Tamaño del body de la respuesta", ("method", "route"), self.response_size
+        )
+        lines += _render_histograms(
+            "upstream_call_duration_seconds", "Latencia de servicios externos", ("service", "outcome"), self.upstream
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _render_histograms(name: str, help_text: str, label_names: Iterable[str], table: dict) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, hist in sorted(table.items()):
+        labels = dict(zip(label_names, key))
+        cumulative = 0
+        for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_labels(**labels, le=le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+# ---------- Servicios externos ----------
+
+@contextmanager
+def track_upstream(service: str):
+    """with track_upstream("google_vision"): ... (funciona en código sync y async)"""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        metrics.observe_upstream(service, outcome, time.perf_counter() - start)
+
+
+def _outcome(status_code: int) -> str:
+    return "ok" if status_code < 500 else "error"
+
+
+def httpx_event_hooks(service: str) -> dict:
+    """Hooks para httpx.Client: miden hasta recibir los headers de la respuesta"""
+    def on_request(request):
+        request.extensions["metrics_start"] = time.perf_counter()
+
+    def on_response(response):
+        start = response.request.extensions.get("metrics_start")
+        if start is not None:
+            metrics.observe_upstream(service, _outcome(response.status_code), time.perf_counter() - start)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def async_httpx_event_hooks(service: str) -> dict:
+    """Mismo que httpx_event_hooks para httpx.AsyncClient"""
+    sync_hooks = httpx_event_hooks(service)
+
+    async def on_request(request):
+        sync_hooks["request"][0](request)
+
+    async def on_response(response):
+        sync_hooks["response"][0](response)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def instrument_httpx_client(client, service: str):
+    """Agrega los hooks a un httpx.Client ya creado (p. ej. el de postgrest)"""
+    hooks = client.event_hooks
+    for event, callbacks in httpx_event_hooks(service).items():
+        hooks[event] = list(hooks.get(event, [])) + callbacks
+    client.event_hooks = hooks
+
+
+# ---------- Middleware ----------
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _upstream_timings.set(timings)
+        status = 500
+        response_bytes = 0
+        request_bytes = 0
+
+        async def receive_wrapper():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings:
+                    server_timing = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+                    message = {**message, "headers": list(message["headers"]) + [
+                        (b"server-timing", server_timing.encode("latin-1"))
+                    ]}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            metrics.in_flight -= 1
+            _upstream_timings.reset(token)
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                time.perf_counter() - start,
+                request_bytes,
+                response_bytes,
+            )
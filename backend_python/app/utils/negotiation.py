@@ -0,0 +1,64 @@
+"""
+Negociación de formato de respuesta
+- Accept: application/msgpack -> MessagePack (más compacto y barato de
+  serializar que JSON); cualquier otro Accept sigue recibiendo JSON
+- Si msgpack no está instalado se responde JSON siempre
+- Con model, el JSON pasa por la ruta rápida de app/utils/serialization
+  cuando RESPONSE_SERIALIZATION lo activa
+- Toda respuesta negociada (JSON o msgpack) lleva Vary: Accept, para que un
+  cache compartido no le sirva a un cliente el formato del otro
+"""
+
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.utils.serialization import fast_response, get_adapter
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+VARY_HEADERS = {"Vary": "Accept"}
+
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def wants_msgpack(request: Request) -> bool:
+    if not MSGPACK_AVAILABLE:
+        return False
+    accept = request.headers.get("accept", "")
+    return any(media in accept for media in MSGPACK_MEDIA_TYPES)
+
+
+def negotiated(request: Request, content: Any, model: Optional[Any] = None):
+    """
+    JSON (ruta rápida si RESPONSE_SERIALIZATION la activa) o MsgpackResponse si
+    el cliente lo pidió; siempre una Response para poder poner Vary: Accept
+    model: mismo tipo que el response_model del endpoint, para filtrar igual
+    """
+    msgpack_requested = wants_msgpack(request)
+    if not msgpack_requested and model is not None:
+        response = fast_response(content, model)
+        if isinstance(response, Response):
+            response.headers.update(VARY_HEADERS)
+            return response
+
+    if model is not None:
+        # Mismo filtrado y validación que haría el response_model
+        adapter = get_adapter(model)
+        payload = adapter.dump_python(adapter.validate_python(content), mode="json")
+    else:
+        payload = jsonable_encoder(content)
+    response_class = MsgpackResponse if msgpack_requested else JSONResponse
+    return response_class(payload, headers=VARY_HEADERS)
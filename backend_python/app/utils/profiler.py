@@ -0,0 +1,219 @@
+"""
+Profiler por muestreo para requests lentos (sin sys.setprofile)
+- Un solo hilo muestrea sys._current_frames() cada PROFILER_INTERVAL_MS
+  mientras haya requests perfilándose y reparte la muestra a cada sesión
+- Se activa con el header X-Profile: 1 (o ?profile=1) más X-Profile-Token
+  igual a PROFILER_TOKEN, o automáticamente para las rutas de
+  PROFILER_ROUTES con probabilidad PROFILER_SAMPLE_RATE; las automáticas
+  solo se guardan si tardan más de PROFILER_SLOW_MS
+- Se guardan en formato "collapsed stacks" (flamegraph.pl, speedscope) en
+  PROFILES_DIR, conservando solo los PROFILER_MAX_FILES más recientes
+- El muestreo ve todos los hilos (loop y threadpool): con requests
+  concurrentes el perfil incluye su trabajo también
+"""
+
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Set
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+PROFILES_DIR = Path(os.getenv("PROFILES_DIR", "profiles"))
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_SLOW_MS = float(os.getenv("PROFILER_SLOW_MS", "2000"))
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_ROUTES = tuple(
+    r.strip() for r in os.getenv("PROFILER_ROUTES", "/api/vision/expiry-date,/productivity/insights").split(",")
+    if r.strip()
+)
+PROFILER_MAX_FILES = int(os.getenv("PROFILER_MAX_FILES", "50"))
+PROFILE_SUFFIX = ".folded"
+MAX_STACK_DEPTH = 128
+
+# Hojas de stack que solo indican espera (hilos ociosos del pool, selector del loop)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfileSession:
+    def __init__(self, label: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+
+
+class SamplingProfiler:
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self._sessions: Set[ProfileSession] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, label: str) -> ProfileSession:
+        session = ProfileSession(label)
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session: ProfileSession) -> ProfileSession:
+        with self._lock:
+            self._sessions.discard(session)
+        return session
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            stacks = self._sample(own)
+            for session in sessions:
+                session.samples += 1
+                session.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _sample(own_ident: int) -> List[str]:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            parts = []
+            while frame is not None and len(parts) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            parts.append(names.get(ident, f"thread-{ident}"))
+            stacks.append(";".join(reversed(parts)))
+        return stacks
+
+
+profiler = SamplingProfiler(PROFILER_INTERVAL_MS / 1000)
+
+
+# ---------- Archivos ----------
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", text).strip("-")[:60] or "root"
+
+
+def save_profile(session: ProfileSession, method: str, path: str, duration_ms: float) -> Optional[Path]:
+    if not session.stacks:
+        return None
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    target = PROFILES_DIR / f"{stamp}_{method}_{_slug(path)}_{int(duration_ms)}ms_{session.id}{PROFILE_SUFFIX}"
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text("".join(f"{stack} {count}\n" for stack, count in session.stacks.most_common()))
+    os.replace(tmp, target)
+    _prune_profiles()
+    return target
+
+
+def _prune_profiles():
+    files = sorted(PROFILES_DIR.glob(f"*{PROFILE_SUFFIX}"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-PROFILER_MAX_FILES] if PROFILER_MAX_FILES > 0 else files:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles() -> List[dict]:
+    if not PROFILES_DIR.exists():
+        return []
+    profiles = []
+    for path in sorted(PROFILES_DIR.glob(f"*{PROFILE_SUFFIX}"), key=lambda p: p.stat().st_mtime, reverse=True):
+        stat = path.stat()
+        profiles.append({
+            "name": path.name,
+            "size_bytes": stat.st_size,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stat.st_mtime)),
+        })
+    return profiles
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    """Solo nombres que existen en PROFILES_DIR (evita path traversal)"""
+    if "/" in name or "\\" in name or not name.endswith(PROFILE_SUFFIX):
+        return None
+    path = PROFILES_DIR / name
+    return path if path.is_file() else None
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    # En bytes: con str, compare_digest lanza TypeError si el header no es ASCII
+    return bool(PROFILER_TOKEN) and hmac.compare_digest(
+        (token or "").encode("utf-8"), PROFILER_TOKEN.encode("utf-8")
+    )
+
+
+# ---------- Middleware ----------
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _mode(self, scope) -> Optional[str]:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers") or []}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        requested = headers.get("x-profile") == "1" or query.get("profile") == ["1"]
+        if requested and is_authorized(headers.get("x-profile-token")):
+            return "explicit"
+        if (
+            PROFILER_SAMPLE_RATE > 0
+            and scope["path"].startswith(PROFILER_ROUTES)
+            and random.random() < PROFILER_SAMPLE_RATE
+        ):
+            return "auto"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        mode = self._mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = profiler.start(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and mode == "explicit":
+                message = {**message, "headers": list(message["headers"]) + [
+                    (b"x-profile-id", session.id.encode("latin-1"))
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop(session)
+            duration_ms = (time.perf_counter() - session.started) * 1000
+            if mode == "explicit" or duration_ms >= PROFILER_SLOW_MS:
+                try:
+                    path = await run_in_threadpool(save_profile, session, scope["method"], scope["path"], duration_ms)
+                    if path:
+                        print(f"🔥 Perfil guardado: {path.name} ({session.samples} muestras)")
+                except OSError as e:
+                    print(f"⚠️ No se pudo guardar el perfil: {e}")
@@ -0,0 +1,73 @@
+"""
+Serialización rápida para endpoints de listas (opt-in con RESPONSE_SERIALIZATION)
+- fastapi (default): response_model normal de FastAPI
+- adapter: un TypeAdapter por modelo (construido una vez) valida y escribe el
+  JSON en pydantic-core, sin el recorrido campo por campo de FastAPI
+- trusted: las filas de Supabase se confían; solo se recortan a los campos del
+  modelo y se escriben con orjson (json estándar si no está instalado)
+Benchmark: python -m scripts.bench_serialization
+"""
+
+import json
+import os
+import typing
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+SERIALIZATION_MODES = ("fastapi", "adapter", "trusted")
+RESPONSE_SERIALIZATION = os.getenv("RESPONSE_SERIALIZATION", "fastapi")
+
+
+@lru_cache(maxsize=64)
+def get_adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+@lru_cache(maxsize=64)
+def list_item_fields(model) -> Optional[Tuple[str, ...]]:
+    """List[Modelo] -> campos del modelo; otro tipo -> None (no aplica trusted)"""
+    if typing.get_origin(model) is not list:
+        return None
+    (item,) = typing.get_args(model)
+    if isinstance(item, type) and issubclass(item, BaseModel):
+        return tuple(item.model_fields)
+    return None
+
+
+def dumps(content: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def serialize_json(content: Any, model, mode: str = "adapter") -> bytes:
+    fields = list_item_fields(model) if mode == "trusted" else None
+    if fields is not None:
+        return dumps([{f: row.get(f) for f in fields} for row in content])
+    adapter = get_adapter(model)
+    return adapter.dump_json(adapter.validate_python(content))
+
+
+class FastJSONResponse(Response):
+    """Recibe bytes ya serializados"""
+    media_type = "application/json"
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+
+def fast_response(content: Any, model, mode: Optional[str] = None):
+    """FastJSONResponse según el modo; con "fastapi" regresa content sin tocar"""
+    mode = mode or RESPONSE_SERIALIZATION
+    if mode not in SERIALIZATION_MODES[1:]:
+        return content
+    return FastJSONResponse(serialize_json(content, model, mode))
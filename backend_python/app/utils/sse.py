@@ -0,0 +1,17 @@
+"""
+Helpers para respuestas Server-Sent Events (text/event-stream)
+"""
+
+import json
+from typing import Any
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # evita que nginx acumule el stream
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Serializa un evento SSE con payload JSON"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
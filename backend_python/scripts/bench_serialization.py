@@ -0,0 +1,97 @@
+"""
+Benchmark de serialización de listas: validación por fila (ruta clásica de
+response_model) vs TypeAdapter vs filas confiables con orjson
+Usa filas sintéticas con la forma de Supabase; no toca la base ni la red
+
+Uso (desde backend_python/):
+    python -m scripts.bench_serialization [--rows 10000] [--repeat 15]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas.employee import EmployeeOut
+from app.schemas.flight import FlightOut
+from app.schemas.product import ProductOut
+from app.utils.serialization import ORJSON_AVAILABLE, serialize_json
+
+
+def product_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{i:012d}", "name": f"Producto {i}", "sku": f"SKU-{i:06d}",
+            "category": "Snacks", "price": 12.5 + i % 7, "stock": i % 300, "expiration_days": "2026-12-31",
+            "unit_weight": 0.12, "unit_volume": 0.3, "image_url": None, "created_at": "2025-10-25T10:00:00+00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def flight_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{i:012d}", "flight_number": f"GG{i % 9000:04d}",
+            "flight_type": "International" if i % 3 else "Domestic", "quantity": 150 + i % 120,
+            "arrival_time": "2025-10-25T14:30:00+00:00", "route": "MTY-MEX",
+        }
+        for i in range(n)
+    ]
+
+
+def employee_rows(n: int) -> List[dict]:
+    return [
+        {"id": f"00000000-0000-0000-0000-{i:012d}", "name": f"Empleado {i}", "role": "assembler", "site": "MTY"}
+        for i in range(n)
+    ]
+
+
+def per_row(rows: List[dict], model) -> bytes:
+    """Equivalente a la ruta clásica de response_model: validar fila por fila,
+    jsonable_encoder y json.dumps"""
+    items = [model.model_validate(row) for row in rows]
+    return json.dumps(jsonable_encoder(items), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn, repeat: int):
+    body = fn()  # calentamiento (construye adapters)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara modos de serialización de listas")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    datasets = {
+        "products": (ProductOut, product_rows(args.rows)),
+        "flights": (FlightOut, flight_rows(args.rows)),
+        "employees": (EmployeeOut, employee_rows(args.rows)),
+    }
+    print(f"📊 {args.rows} filas, {args.repeat} repeticiones (orjson: {ORJSON_AVAILABLE})")
+
+    for name, (model, rows) in datasets.items():
+        candidates = {
+            "per_row": lambda: per_row(rows, model),
+            "adapter": lambda: serialize_json(rows, List[model], "adapter"),
+            "trusted": lambda: serialize_json(rows, List[model], "trusted"),
+        }
+        baseline = None
+        for mode, fn in candidates.items():
+            median, size = measure(fn, args.repeat)
+            baseline = baseline or median
+            print(f"   {name:<10} {mode:<8} {median:8.1f} ms  x{baseline / median:5.1f}  {size / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Calibra el modelo de tiempo de ensamblaje con el historial de drawers_assembled
+y guarda los coeficientes versionados (la API los recarga sola al cambiar)
+
+Uso (desde backend_python/):
+    python -m scripts.calibrate_build_time [--out models/build_time_coefficients.json]
+"""
+
+import argparse
+
+from app.services.build_time import BUILD_TIME_COEFFICIENTS_PATH, calibrate_from_supabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra los coeficientes del tiempo de ensamblaje")
+    parser.add_argument("--out", default=BUILD_TIME_COEFFICIENTS_PATH, help="Ruta del archivo JSON")
+    args = parser.parse_args()
+
+    coefficients = calibrate_from_supabase(args.out)
+    print(f"✅ Coeficientes guardados en {args.out}: {coefficients.info()}")
+    print(f"   Métricas: {coefficients.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Entrena el modelo local de demanda y guarda el artefacto
+
+Uso (desde backend_python/):
+    python -m scripts.train_demand_model [--out models/demand_model.npz]
+"""
+
+import argparse
+
+from app.services.prediction import DEMAND_MODEL_PATH, train_from_supabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el modelo de demanda por producto")
+    parser.add_argument("--out", default=DEMAND_MODEL_PATH, help="Ruta del artefacto .npz")
+    args = parser.parse_args()
+
+    model = train_from_supabase(args.out)
+    print(f"✅ Modelo guardado en {args.out}: {model.info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+-- Estadísticas de productividad agregadas en Postgres
+-- Ejecutar en el SQL editor de Supabase (idempotente)
+--
+-- Los drawers se atribuyen a un empleado a través de productivity_logs
+-- (employee_id, drawer_id), que es lo que registra la app móvil.
+
+create index if not exists drawers_assembled_verified_completed_idx
+    on public.drawers_assembled (completed_at)
+    where verified;
+
+create index if not exists productivity_logs_employee_drawer_idx
+    on public.productivity_logs (employee_id, drawer_id);
+
+-- Devuelve conteo, suma, promedio, min, max, percentiles y los últimos
+-- p_recent drawers del empleado. Si p_employee_id es null agrega todo el sitio.
+create or replace function public.get_employee_drawer_stats(
+    p_employee_id uuid,
+    p_since timestamptz,
+    p_recent integer default 10
+)
+returns jsonb
+language sql
+stable
+as $$
+    with drawers as (
+        select d.id, d.drawer_number, d.total_assembly_time_sec, d.completed_at, d.flight_id
+        from public.drawers_assembled d
+        where d.verified
+          and d.completed_at >= p_since
+          and (
+              p_employee_id is null
+              or exists (
+                  select 1
+                  from public.productivity_logs pl
+                  where pl.drawer_id = d.id
+                    and pl.employee_id = p_employee_id
+              )
+          )
+    ),
+    timed as (
+        select total_assembly_time_sec as t
+        from drawers
+        where total_assembly_time_sec > 0
+    ),
+    recent as (
+        select dr.id,
+               dr.drawer_number,
+               dr.total_assembly_time_sec,
+               dr.completed_at,
+               dr.flight_id,
+               jsonb_build_object(
+                   'flight_number', f.flight_number,
+                   'flight_type', f.flight_type
+               ) as flights
+        from drawers dr
+        left join public.flights f on f.id = dr.flight_id
+        order by dr.completed_at desc
+        limit greatest(p_recent, 0)
+    )
+    select jsonb_build_object(
+        'completed_drawers', (select count(*) from drawers),
+        'total_time_seconds', coalesce((select sum(t) from timed), 0),
+        'average_time_seconds', coalesce((select avg(t) from timed), 0),
+        'min_time_seconds', coalesce((select min(t) from timed), 0),
+        'max_time_seconds', coalesce((select max(t) from timed), 0),
+        'p50_time_seconds', (select percentile_cont(0.5) within group (order by t) from timed),
+        'p90_time_seconds', (select percentile_cont(0.9) within group (order by t) from timed),
+        'recent_drawers', coalesce(
+            (select jsonb_agg(to_jsonb(r) order by r.completed_at) from recent r),
+            '[]'::jsonb
+        )
+    );
+$$;
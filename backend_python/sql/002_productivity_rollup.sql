@@ -0,0 +1,289 @@
+-- Rollups diarios de productividad (por empleado y tipo de vuelo)
+-- Ejecutar en el SQL editor de Supabase (idempotente)
+--
+-- Cada fila guarda count, sum, sum of squares, min, max y un histograma
+-- de tiempos de ensamblaje. El histograma usa cubetas de 60 s y la última
+-- cubeta acumula todo lo que supere 60 min (ver app/utils/constants.py).
+
+create table if not exists public.productivity_daily_rollup (
+    id bigint generated always as identity primary key,
+    day date not null,
+    employee_id uuid,
+    flight_type text not null,
+    drawer_count integer not null default 0,
+    sum_sec double precision not null default 0,
+    sum_sq_sec double precision not null default 0,
+    min_sec double precision,
+    max_sec double precision,
+    histogram integer[] not null,
+    updated_at timestamptz not null default now(),
+    unique nulls not distinct (day, employee_id, flight_type)
+);
+
+-- drawer_count cuenta todos los drawers verificados (igual que 001);
+-- timed_count solo los que tienen tiempo > 0, que son los que entran en
+-- sum/min/max/histograma
+alter table public.productivity_daily_rollup
+    add column if not exists timed_count integer not null default 0;
+
+create index if not exists productivity_daily_rollup_employee_day_idx
+    on public.productivity_daily_rollup (employee_id, day);
+
+-- completed_at lo pone el reloj del celular y el productivity_log llega
+-- en otra llamada, después. El watermark va sobre updated_at, que pone el
+-- servidor en cada insert/update de ambas tablas.
+alter table public.drawers_assembled
+    add column if not exists updated_at timestamptz not null default now();
+alter table public.productivity_logs
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists drawers_assembled_updated_at_idx
+    on public.drawers_assembled (updated_at);
+create index if not exists productivity_logs_updated_at_idx
+    on public.productivity_logs (updated_at);
+create index if not exists productivity_logs_drawer_idx
+    on public.productivity_logs (drawer_id);
+
+-- clock_timestamp() y no now(): una transacción larga no debe fechar
+-- sus cambios antes de otros ya procesados
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists drawers_assembled_touch_updated_at on public.drawers_assembled;
+create trigger drawers_assembled_touch_updated_at
+    before insert or update on public.drawers_assembled
+    for each row execute function public.touch_updated_at();
+
+drop trigger if exists productivity_logs_touch_updated_at on public.productivity_logs;
+create trigger productivity_logs_touch_updated_at
+    before insert or update on public.productivity_logs
+    for each row execute function public.touch_updated_at();
+
+create table if not exists public.productivity_rollup_state (
+    id integer primary key default 1 check (id = 1),
+    watermark timestamptz not null default '1970-01-01'
+);
+
+-- Watermark sobre updated_at (el de arriba era sobre completed_at)
+alter table public.productivity_rollup_state
+    add column if not exists changes_watermark timestamptz not null default '1970-01-01';
+
+insert into public.productivity_rollup_state (id) values (1)
+on conflict (id) do nothing;
+
+-- updated_at solo ve la fila como queda: si un drawer cambia de día, se
+-- borra, o se borra/mueve su productivity_log, el día viejo no aparece en
+-- ningún updated_at. Estos triggers lo anotan aquí (como sync_tombstones
+-- en 004) y el refresh lo recalcula con el mismo watermark.
+create table if not exists public.productivity_rollup_dirty_days (
+    id bigint generated always as identity primary key,
+    day date not null,
+    marked_at timestamptz not null default clock_timestamp()
+);
+
+create index if not exists productivity_rollup_dirty_days_marked_idx
+    on public.productivity_rollup_dirty_days (marked_at);
+
+create or replace function public.mark_rollup_day_drawer()
+returns trigger
+language plpgsql
+as $$
+begin
+    if old.completed_at is not null
+       and (tg_op = 'DELETE' or old.completed_at is distinct from new.completed_at) then
+        insert into public.productivity_rollup_dirty_days (day)
+        values ((old.completed_at at time zone 'UTC')::date);
+    end if;
+    return null;
+end;
+$$;
+
+create or replace function public.mark_rollup_day_log()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'DELETE'
+       or old.drawer_id is distinct from new.drawer_id
+       or old.employee_id is distinct from new.employee_id then
+        insert into public.productivity_rollup_dirty_days (day)
+        select (d.completed_at at time zone 'UTC')::date
+        from public.drawers_assembled d
+        where d.id = old.drawer_id
+          and d.completed_at is not null;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists drawers_assembled_mark_rollup_day on public.drawers_assembled;
+create trigger drawers_assembled_mark_rollup_day
+    after update or delete on public.drawers_assembled
+    for each row execute function public.mark_rollup_day_drawer();
+
+drop trigger if exists productivity_logs_mark_rollup_day on public.productivity_logs;
+create trigger productivity_logs_mark_rollup_day
+    after update or delete on public.productivity_logs
+    for each row execute function public.mark_rollup_day_log();
+
+-- Recalcula los días (de completed_at) de los drawers que cambiaron, o cuyo
+-- productivity_log llegó, después del watermark, más los días anotados en
+-- productivity_rollup_dirty_days, y lo avanza. Solo toma
+-- cambios con más de p_lag_seconds para no saltarse transacciones que
+-- todavía no hacen commit. Es idempotente: se puede llamar las veces que sea.
+drop function if exists public.refresh_productivity_rollup();
+
+create or replace function public.refresh_productivity_rollup(p_lag_seconds integer default 10)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_watermark timestamptz;
+    v_upper timestamptz := clock_timestamp() - make_interval(secs => p_lag_seconds);
+    v_new_watermark timestamptz;
+    v_days date[];
+begin
+    select changes_watermark into v_watermark
+    from public.productivity_rollup_state
+    where id = 1
+    for update;
+
+    with changed as (
+        select d.id, d.updated_at as changed_at
+        from public.drawers_assembled d
+        where d.updated_at > v_watermark
+          and d.updated_at <= v_upper
+        union all
+        select pl.drawer_id, pl.updated_at
+        from public.productivity_logs pl
+        where pl.updated_at > v_watermark
+          and pl.updated_at <= v_upper
+    ),
+    touched as (
+        select (d.completed_at at time zone 'UTC')::date as day, c.changed_at
+        from changed c
+        left join public.drawers_assembled d on d.id = c.id
+        union all
+        select dd.day, dd.marked_at
+        from public.productivity_rollup_dirty_days dd
+        where dd.marked_at > v_watermark
+          and dd.marked_at <= v_upper
+    )
+    select array_agg(distinct t.day) filter (where t.day is not null),
+           max(t.changed_at)
+    into v_days, v_new_watermark
+    from touched t;
+
+    if v_new_watermark is null then
+        return jsonb_build_object('days_refreshed', 0, 'watermark', v_watermark);
+    end if;
+
+    if v_days is not null then
+        delete from public.productivity_daily_rollup
+        where day = any(v_days);
+
+        with src as (
+            select (d.completed_at at time zone 'UTC')::date as day,
+                   pl.employee_id,
+                   coalesce(f.flight_type, 'Unknown') as flight_type,
+                   case when d.total_assembly_time_sec > 0
+                        then d.total_assembly_time_sec::double precision end as t
+            from public.drawers_assembled d
+            left join public.flights f on f.id = d.flight_id
+            -- Una fila por empleado con log del drawer (el EXISTS de 001);
+            -- sin logs queda con employee_id null
+            left join lateral (
+                select distinct employee_id
+                from public.productivity_logs
+                where drawer_id = d.id
+            ) pl on true
+            where d.verified
+              and (d.completed_at at time zone 'UTC')::date = any(v_days)
+        ),
+        hist as (
+            select day, employee_id, flight_type,
+                   least(floor(t / 60)::int, 60) as bucket,
+                   count(*)::int as n
+            from src
+            where t is not null
+            group by 1, 2, 3, 4
+        ),
+        dense as (
+            select g.day, g.employee_id, g.flight_type,
+                   array_agg(coalesce(h.n, 0) order by b.bucket) as histogram
+            from (select distinct day, employee_id, flight_type from src) g
+            cross join generate_series(0, 60) as b(bucket)
+            left join hist h
+                on h.day = g.day
+               and h.employee_id is not distinct from g.employee_id
+               and h.flight_type = g.flight_type
+               and h.bucket = b.bucket
+            group by g.day, g.employee_id, g.flight_type
+        )
+        insert into public.productivity_daily_rollup
+            (day, employee_id, flight_type, drawer_count, timed_count,
+             sum_sec, sum_sq_sec, min_sec, max_sec, histogram)
+        select s.day, s.employee_id, s.flight_type,
+               count(*), count(s.t),
+               coalesce(sum(s.t), 0), coalesce(sum(s.t * s.t), 0), min(s.t), max(s.t),
+               dn.histogram
+        from src s
+        join dense dn
+            on dn.day = s.day
+           and dn.employee_id is not distinct from s.employee_id
+           and dn.flight_type = s.flight_type
+        group by s.day, s.employee_id, s.flight_type, dn.histogram;
+    end if;
+
+    delete from public.productivity_rollup_dirty_days
+    where marked_at <= v_new_watermark;
+
+    update public.productivity_rollup_state
+    set changes_watermark = v_new_watermark
+    where id = 1;
+
+    return jsonb_build_object(
+        'days_refreshed', coalesce(array_length(v_days, 1), 0),
+        'watermark', v_new_watermark
+    );
+end;
+$$;
+
+-- Últimos p_limit drawers del empleado (para tendencias y prompt del AI)
+create or replace function public.get_employee_recent_drawers(
+    p_employee_id uuid,
+    p_since timestamptz,
+    p_limit integer default 10
+)
+returns jsonb
+language sql
+stable
+as $$
+    select coalesce(jsonb_agg(to_jsonb(r) order by r.completed_at), '[]'::jsonb)
+    from (
+        select d.id,
+               d.drawer_number,
+               d.total_assembly_time_sec,
+               d.completed_at,
+               d.flight_id,
+               jsonb_build_object(
+                   'flight_number', f.flight_number,
+                   'flight_type', f.flight_type
+               ) as flights
+        from public.productivity_logs pl
+        join public.drawers_assembled d on d.id = pl.drawer_id
+        left join public.flights f on f.id = d.flight_id
+        where pl.employee_id = p_employee_id
+          and d.verified
+          and d.completed_at >= p_since
+        order by d.completed_at desc
+        limit greatest(p_limit, 0)
+    ) r;
+$$;
@@ -0,0 +1,34 @@
+-- Idempotencia para la ingesta en lote de scanned_products
+-- Ejecutar en el SQL editor de Supabase (idempotente)
+--
+-- idempotency_key = sha1(barcode | drawer_id | scanned_at) calculado por el
+-- backend (o enviado por el cliente). El índice único hace que los
+-- reintentos de la app móvil no dupliquen filas: el insert usa
+-- on conflict (idempotency_key) do nothing. Las filas viejas quedan en NULL
+-- y no chocan entre sí.
+--
+-- flight_id: la ingesta en lote lo guarda cuando el cliente lo manda (la
+-- app móvil no lo escribe; su vuelo sale del drawer). Las filas existentes
+-- se completan desde drawers_assembled.
+
+alter table public.scanned_products
+    add column if not exists barcode text,
+    add column if not exists image_url text,
+    add column if not exists idempotency_key text,
+    add column if not exists flight_id uuid;
+
+update public.scanned_products s
+set flight_id = d.flight_id
+from public.drawers_assembled d
+where s.flight_id is null
+  and s.drawer_id = d.id
+  and d.flight_id is not null;
+
+create unique index if not exists scanned_products_idempotency_key_idx
+    on public.scanned_products (idempotency_key);
+
+create index if not exists scanned_products_drawer_idx
+    on public.scanned_products (drawer_id);
+
+create index if not exists scanned_products_flight_idx
+    on public.scanned_products (flight_id);
@@ -0,0 +1,68 @@
+-- Sincronización delta para la app móvil (/sync/products, /sync/flights)
+-- Ejecutar en el SQL editor de Supabase (idempotente)
+--
+-- products y flights llevan updated_at (mantenido por trigger) y los
+-- borrados dejan una fila en sync_tombstones. El cliente guarda un cursor
+-- (updated_at + id del último cambio y el id del último tombstone) y solo
+-- descarga lo que cambió después.
+
+alter table public.products
+    add column if not exists updated_at timestamptz not null default now();
+alter table public.flights
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists products_updated_at_idx on public.products (updated_at, id);
+create index if not exists flights_updated_at_idx on public.flights (updated_at, id);
+
+-- clock_timestamp() y no now(): una transacción larga no debe fechar
+-- sus cambios antes de otros ya sincronizados
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists products_touch_updated_at on public.products;
+create trigger products_touch_updated_at
+    before insert or update on public.products
+    for each row execute function public.touch_updated_at();
+
+drop trigger if exists flights_touch_updated_at on public.flights;
+create trigger flights_touch_updated_at
+    before insert or update on public.flights
+    for each row execute function public.touch_updated_at();
+
+create table if not exists public.sync_tombstones (
+    id bigint generated always as identity primary key,
+    table_name text not null,
+    row_id text not null,
+    deleted_at timestamptz not null default clock_timestamp()
+);
+
+create index if not exists sync_tombstones_table_id_idx
+    on public.sync_tombstones (table_name, id);
+
+create or replace function public.record_tombstone()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into public.sync_tombstones (table_name, row_id)
+    values (tg_table_name, old.id::text);
+    return old;
+end;
+$$;
+
+drop trigger if exists products_tombstone on public.products;
+create trigger products_tombstone
+    after delete on public.products
+    for each row execute function public.record_tombstone();
+
+drop trigger if exists flights_tombstone on public.flights;
+create trigger flights_tombstone
+    after delete on public.flights
+    for each row execute function public.record_tombstone();
@@ -0,0 +1,216 @@
+-- Agregados precalculados para los dashboards (/analytics)
+-- Ejecutar en el SQL editor de Supabase (idempotente)
+--
+-- Cada tabla se refresca por cubetas (hora o día): se recalculan solo las
+-- cubetas que tienen filas nuevas desde el watermark, igual que
+-- refresh_productivity_rollup. Los watermarks van sobre columnas que pone el
+-- servidor: ingested_at para scans (la app móvil sube scans offline con
+-- scanned_at atrasado) y updated_at de drawers_assembled / productivity_logs
+-- (sql/002) para drawers, cuyo completed_at viene del celular y cuyo log
+-- llega después. Las cubetas siguen siendo las de scanned_at / completed_at.
+-- scanned_products.flight_id viene de sql/003.
+
+alter table public.scanned_products
+    add column if not exists ingested_at timestamptz not null default now();
+
+create index if not exists scanned_products_ingested_at_idx
+    on public.scanned_products (ingested_at);
+create index if not exists scanned_products_scanned_at_idx
+    on public.scanned_products (scanned_at);
+create index if not exists quarantine_items_created_at_idx
+    on public.quarantine_items (created_at);
+
+-- Scans por hora (UTC), vuelo y estado de caducidad
+create table if not exists public.analytics_scans_hourly (
+    hour timestamp not null,
+    flight_id uuid,
+    status text not null,
+    scans integer not null default 0,
+    unique nulls not distinct (hour, flight_id, status)
+);
+
+-- Scans y productos en cuarentena por día y producto
+create table if not exists public.analytics_product_daily (
+    day date not null,
+    product_id uuid,
+    scans integer not null default 0,
+    quarantined integer not null default 0,
+    unique nulls not distinct (day, product_id)
+);
+
+-- Drawers completados por día y site (site del empleado que lo armó)
+create table if not exists public.analytics_drawers_daily (
+    day date not null,
+    site text,
+    drawers integer not null default 0,
+    verified integer not null default 0,
+    timed integer not null default 0,
+    sum_build_sec double precision not null default 0,
+    unique nulls not distinct (day, site)
+);
+
+create table if not exists public.analytics_rollup_state (
+    id integer primary key default 1 check (id = 1),
+    scans_watermark timestamptz not null default '1970-01-01',
+    quarantine_watermark timestamptz not null default '1970-01-01',
+    drawers_watermark timestamptz not null default '1970-01-01',
+    refreshed_at timestamptz
+);
+
+-- Watermark de drawers sobre updated_at (el de arriba era sobre completed_at)
+alter table public.analytics_rollup_state
+    add column if not exists drawer_changes_watermark timestamptz not null default '1970-01-01';
+
+insert into public.analytics_rollup_state (id) values (1)
+on conflict (id) do nothing;
+
+-- p_full: reinicia los watermarks y recalcula todo el historial
+-- p_lag_seconds: solo toma filas con esa antigüedad, para no saltarse
+-- transacciones que todavía no hacen commit
+drop function if exists public.refresh_analytics_aggregates(boolean);
+
+create or replace function public.refresh_analytics_aggregates(
+    p_full boolean default false,
+    p_lag_seconds integer default 10
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_state public.analytics_rollup_state;
+    v_upper timestamptz := clock_timestamp() - make_interval(secs => p_lag_seconds);
+    v_hours timestamp[];
+    v_scan_days date[];
+    v_quarantine_days date[];
+    v_product_days date[];
+    v_drawer_days date[];
+    v_new_scans timestamptz;
+    v_new_quarantine timestamptz;
+    v_new_drawers timestamptz;
+begin
+    if p_full then
+        update public.analytics_rollup_state
+        set scans_watermark = '1970-01-01',
+            quarantine_watermark = '1970-01-01',
+            drawer_changes_watermark = '1970-01-01'
+        where id = 1;
+    end if;
+
+    select * into v_state
+    from public.analytics_rollup_state
+    where id = 1
+    for update;
+
+    -- ---------- Scans por hora ----------
+    select array_agg(distinct date_trunc('hour', scanned_at at time zone 'UTC')), max(ingested_at)
+    into v_hours, v_new_scans
+    from public.scanned_products
+    where ingested_at > v_state.scans_watermark
+      and ingested_at <= v_upper
+      and scanned_at is not null;
+
+    if v_hours is not null then
+        delete from public.analytics_scans_hourly
+        where hour = any(v_hours);
+
+        insert into public.analytics_scans_hourly (hour, flight_id, status, scans)
+        select date_trunc('hour', s.scanned_at at time zone 'UTC'),
+               coalesce(s.flight_id, d.flight_id),
+               case when s.status = 'ok' then 'valid' else coalesce(s.status, 'unknown') end,
+               count(*)
+        from public.scanned_products s
+        left join public.drawers_assembled d on d.id = s.drawer_id
+        where date_trunc('hour', s.scanned_at at time zone 'UTC') = any(v_hours)
+        group by 1, 2, 3;
+
+        select array_agg(distinct h::date) into v_scan_days from unnest(v_hours) as h;
+    end if;
+
+    -- ---------- Cuarentena y scans por producto ----------
+    select array_agg(distinct (created_at at time zone 'UTC')::date), max(created_at)
+    into v_quarantine_days, v_new_quarantine
+    from public.quarantine_items
+    where created_at > v_state.quarantine_watermark
+      and created_at <= v_upper;
+
+    select array_agg(distinct d) into v_product_days
+    from unnest(coalesce(v_scan_days, '{}') || coalesce(v_quarantine_days, '{}')) as d;
+
+    if v_product_days is not null then
+        delete from public.analytics_product_daily
+        where day = any(v_product_days);
+
+        insert into public.analytics_product_daily (day, product_id, scans, quarantined)
+        select coalesce(s.day, q.day), coalesce(s.product_id, q.product_id),
+               coalesce(s.scans, 0), coalesce(q.quarantined, 0)
+        from (
+            select (scanned_at at time zone 'UTC')::date as day, product_id, count(*)::int as scans
+            from public.scanned_products
+            where (scanned_at at time zone 'UTC')::date = any(v_product_days)
+            group by 1, 2
+        ) s
+        full outer join (
+            select (created_at at time zone 'UTC')::date as day, product_id, count(*)::int as quarantined
+            from public.quarantine_items
+            where (created_at at time zone 'UTC')::date = any(v_product_days)
+            group by 1, 2
+        ) q on q.day = s.day and q.product_id is not distinct from s.product_id;
+    end if;
+
+    -- ---------- Drawers por site ----------
+    -- Drawers que cambiaron o cuyo productivity_log (y con él el site) llegó
+    with changed as (
+        select d.id, d.updated_at as changed_at
+        from public.drawers_assembled d
+        where d.updated_at > v_state.drawer_changes_watermark
+          and d.updated_at <= v_upper
+        union all
+        select pl.drawer_id, pl.updated_at
+        from public.productivity_logs pl
+        where pl.updated_at > v_state.drawer_changes_watermark
+          and pl.updated_at <= v_upper
+    )
+    select array_agg(distinct (d.completed_at at time zone 'UTC')::date)
+               filter (where d.completed_at is not null),
+           max(c.changed_at)
+    into v_drawer_days, v_new_drawers
+    from changed c
+    left join public.drawers_assembled d on d.id = c.id;
+
+    if v_drawer_days is not null then
+        delete from public.analytics_drawers_daily
+        where day = any(v_drawer_days);
+
+        insert into public.analytics_drawers_daily (day, site, drawers, verified, timed, sum_build_sec)
+        select (d.completed_at at time zone 'UTC')::date,
+               e.site,
+               count(*),
+               count(*) filter (where d.verified),
+               count(*) filter (where d.total_assembly_time_sec > 0),
+               coalesce(sum(d.total_assembly_time_sec) filter (where d.total_assembly_time_sec > 0), 0)
+        from public.drawers_assembled d
+        left join lateral (
+            select employee_id
+            from public.productivity_logs
+            where drawer_id = d.id
+            limit 1
+        ) pl on true
+        left join public.employees e on e.id = pl.employee_id
+        where (d.completed_at at time zone 'UTC')::date = any(v_drawer_days)
+        group by 1, 2;
+    end if;
+
+    update public.analytics_rollup_state
+    set scans_watermark = coalesce(v_new_scans, scans_watermark),
+        quarantine_watermark = coalesce(v_new_quarantine, quarantine_watermark),
+        drawer_changes_watermark = coalesce(v_new_drawers, drawer_changes_watermark),
+        refreshed_at = now()
+    where id = 1;
+
+    return jsonb_build_object(
+        'hours_refreshed', coalesce(array_length(v_hours, 1), 0),
+        'product_days_refreshed', coalesce(array_length(v_product_days, 1), 0),
+        'drawer_days_refreshed', coalesce(array_length(v_drawer_days, 1), 0)
+    );
+end;
+$$;
@@ -0,0 +1,132 @@
+"""
+Servidor OpenRouter simulado (uvicorn en un hilo, puerto libre)
+Cada test encola las respuestas que debe dar /chat/completions, en orden
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from collections import deque
+
+import pytest
+import uvicorn
+
+
+class MockOpenRouter:
+    """
+    Respuestas soportadas (dicts en self.responses):
+    - {"status": 503}                          error con body JSON
+    - {"content": "hola", "delay": 0.2}        chat completion normal
+    - {"chunks": ["a", "b"], "disconnect": True} stream SSE; disconnect
+      corta la conexión después de los chunks (sin [DONE])
+    """
+
+    def __init__(self):
+        self.responses = deque()
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.url = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        self.requests.append(json.loads(body or b"{}"))
+        spec = self.responses.popleft() if self.responses else {"status": 500}
+
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(spec.get("delay", 0))
+            if "chunks" in spec:
+                await self._stream(send, spec)
+            elif "status" in spec:
+                await self._json(send, spec["status"], {"error": {"message": "mock error"}})
+            else:
+                await self._json(send, 200, {
+                    "choices": [{"message": {"role": "assistant", "content": spec.get("content", "")}}]
+                })
+        finally:
+            self.active -= 1
+
+    @staticmethod
+    async def _json(send, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _stream(send, spec: dict):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream")],
+        })
+        await send({"type": "http.response.body", "body": b": OPENROUTER PROCESSING\n\n", "more_body": True})
+        for chunk in spec["chunks"]:
+            event = {"choices": [{"delta": {"content": chunk}}]}
+            await send({
+                "type": "http.response.body",
+                "body": f"data: {json.dumps(event)}\n\n".encode("utf-8"),
+                "more_body": True,
+            })
+        if spec.get("disconnect"):
+            # Excepción con la respuesta ya iniciada: uvicorn cierra el socket
+            raise RuntimeError("mock disconnect")
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+
+@pytest.fixture(scope="session")
+def _mock_server():
+    app = MockOpenRouter()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="critical"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("El servidor simulado no arrancó")
+        time.sleep(0.01)
+    app.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    yield app
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def openrouter(_mock_server):
+    # Los requests que un test dejó por timeout siguen vivos en el servidor
+    deadline = time.time() + 5
+    while _mock_server.active and time.time() < deadline:
+        time.sleep(0.01)
+    _mock_server.responses.clear()
+    _mock_server.requests.clear()
+    _mock_server.max_active = 0
+    return _mock_server
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
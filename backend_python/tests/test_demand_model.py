@@ -0,0 +1,42 @@
+from app.services.prediction import DemandModel, FlightFeatures, build_training_samples
+
+FLIGHTS = [
+    {"id": "f1", "route": "MEX-JFK", "arrival_time": "2025-03-01T08:30:00+00:00", "quantity": 100},
+    {"id": "f2", "route": "MEX-MAD", "arrival_time": "2025-03-02T09:00:00+00:00", "quantity": 120},
+    {"id": "f3", "route": "JFK-MEX", "arrival_time": "2025-03-02T21:00:00+00:00", "quantity": 90},
+]
+DRAWERS = [{"id": "d1", "flight_id": "f1"}, {"id": "d2", "flight_id": "f2"}, {"id": "d3", "flight_id": "f3"}]
+CONTENT = [
+    {"drawer_id": "d1", "product_id": "p1", "quantity": 40},
+    {"drawer_id": "d2", "product_id": "p1", "quantity": 50},
+    {"drawer_id": "d3", "product_id": "p2", "quantity": 30},
+]
+
+
+def _train() -> DemandModel:
+    samples = build_training_samples(FLIGHTS, DRAWERS, CONTENT, [])
+    return DemandModel.fit(samples, {"p1": "Café", "p2": "Agua"})
+
+
+def test_route_and_request_share_group_keys():
+    from_row = FlightFeatures.from_flight_row(FLIGHTS[0])
+    from_request = FlightFeatures.from_request("México", "05:00", "Mañana", 100)
+    assert (from_row.origin, from_row.time_of_day) == ("mexico", "mañana")
+    assert (from_request.origin, from_request.time_of_day) == ("mexico", "mañana")
+
+
+def test_request_for_trained_flight_hits_group_level():
+    model = _train()
+    assert model.match_level(FlightFeatures.from_request("mexico", "05:00", "mañana", 100)) == "origin_tod"
+    assert model.match_level(FlightFeatures.from_request("USA", "04:30", "tarde", 100)) == "origin"
+    assert model.match_level(FlightFeatures.from_request("Japón", "13:00", "noche", 100)) is None
+
+
+def test_group_rate_differs_from_global():
+    model = _train()
+    mexico, usa = model.predict_rates([
+        FlightFeatures.from_request("México", "05:00", "mañana", 100),
+        FlightFeatures.from_request("Estados Unidos", "05:00", "noche", 100),
+    ])
+    p1 = model.product_index["p1"]
+    assert mexico[p1] > model.global_rate[p1] > usa[p1]
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_client import LLMClient, LLMError
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{"role": "user", "content": "hola"}]
+
+
+@pytest.fixture
+async def make_client(openrouter):
+    clients = []
+
+    def factory(**kwargs):
+        options = {"max_retries": 2, "backoff_base": 0.0, "timeout": 5.0, **kwargs}
+        client = LLMClient(openrouter.url, "test-key", **options)
+        clients.append(client)
+        return client
+
+    yield factory
+    for client in clients:
+        await client.aclose()
+
+
+async def _chat(client, **kwargs):
+    return await client.chat(MESSAGES, model="mock", max_tokens=10, temperature=0, **kwargs)
+
+
+async def _collect(client):
+    return [c async for c in client.stream_chat(MESSAGES, model="mock", max_tokens=10, temperature=0)]
+
+
+async def test_retries_429_and_5xx_then_succeeds(openrouter, make_client):
+    openrouter.responses.extend([{"status": 429}, {"status": 503}, {"content": "listo"}])
+    client = make_client()
+
+    assert await _chat(client) == "listo"
+    assert len(openrouter.requests) == 3
+    assert client.counters["retries"] == 2
+    assert client.counters["errors"] == 0
+
+
+async def test_gives_up_after_retry_cap(openrouter, make_client):
+    openrouter.responses.extend([{"status": 500}] * 5)
+    client = make_client(max_retries=2)
+
+    with pytest.raises(LLMError) as exc_info:
+        await _chat(client)
+    assert exc_info.value.status_code == 500
+    assert len(openrouter.requests) == 3
+    assert client.counters["errors"] == 1
+
+
+async def test_non_retryable_status_is_not_retried(openrouter, make_client):
+    openrouter.responses.extend([{"status": 400}, {"content": "no debería llegar"}])
+    client = make_client()
+
+    with pytest.raises(LLMError) as exc_info:
+        await _chat(client)
+    assert exc_info.value.status_code == 400
+    assert len(openrouter.requests) == 1
+
+
+async def test_timeout_is_retried_and_then_raises(openrouter, make_client):
+    openrouter.responses.extend([{"content": "tarde", "delay": 1.0}] * 2)
+    client = make_client(max_retries=1)
+
+    with pytest.raises(LLMError, match="transport error"):
+        await _chat(client, timeout=0.2)
+    assert len(openrouter.requests) == 2
+
+
+async def test_timeout_then_success(openrouter, make_client):
+    openrouter.responses.extend([{"content": "tarde", "delay": 1.0}, {"content": "a tiempo"}])
+    client = make_client()
+
+    assert await _chat(client, timeout=0.3) == "a tiempo"
+
+
+async def test_semaphore_limits_concurrent_calls(openrouter, make_client):
+    openrouter.responses.extend([{"content": str(i), "delay": 0.2} for i in range(6)])
+    client = make_client(max_concurrency=2)
+
+    results = await asyncio.gather(*(_chat(client) for _ in range(6)))
+    assert sorted(results) == [str(i) for i in range(6)]
+    assert openrouter.max_active == 2
+
+
+async def test_stream_yields_chunks_in_order(openrouter, make_client):
+    openrouter.responses.append({"chunks": ["Hola", ", ", "mundo"]})
+    client = make_client()
+
+    assert await _collect(client) == ["Hola", ", ", "mundo"]
+    assert client.counters["streams"] == 1
+
+
+async def test_stream_retries_before_first_chunk(openrouter, make_client):
+    openrouter.responses.extend([{"status": 503}, {"chunks": ["ok"]}])
+    client = make_client()
+
+    assert await _collect(client) == ["ok"]
+    assert len(openrouter.requests) == 2
+    assert client.counters["retries"] == 1
+
+
+async def test_stream_disconnect_mid_stream_raises_without_retry(openrouter, make_client):
+    openrouter.responses.extend([{"chunks": ["parcial", " texto"], "disconnect": True}, {"chunks": ["otra vez"]}])
+    client = make_client()
+
+    received = []
+    with pytest.raises(LLMError, match="transport error"):
+        async for chunk in client.stream_chat(MESSAGES, model="mock", max_tokens=10, temperature=0):
+            received.append(chunk)
+    # Lo ya entregado no se repite: no hay reintento una vez que empezó
+    assert received == ["parcial", " texto"]
+    assert len(openrouter.requests) == 1
+    assert client.counters["errors"] == 1
+
+
+async def test_stream_backoff_releases_semaphore(openrouter, make_client):
+    openrouter.responses.extend([{"status": 503}, {"content": "rápido"}, {"chunks": ["ok"]}])
+    client = make_client(max_concurrency=1)
+    client._backoff = lambda attempt: 0.5
+
+    stream = asyncio.ensure_future(_collect(client))
+    await asyncio.sleep(0.2)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    # La llamada normal no espera a que termine el backoff del stream
+    assert await _chat(client) == "rápido"
+    assert loop.time() - started < 0.4
+    assert await stream == ["ok"]
+
+
+async def test_stream_hold_time_is_bounded(openrouter, make_client):
+    openrouter.responses.append({"chunks": ["a", "b", "c"]})
+    client = make_client(max_concurrency=1, max_stream_seconds=0.1)
+
+    received = []
+    with pytest.raises(LLMError, match="exceeded"):
+        async for chunk in client.stream_chat(MESSAGES, model="mock", max_tokens=10, temperature=0):
+            received.append(chunk)
+            await asyncio.sleep(0.2)
+    assert received == ["a"]
+    openrouter.responses.append({"content": "libre"})
+    assert await _chat(client) == "libre"
+
+
+async def test_unconfigured_client_fails_fast(openrouter):
+    client = LLMClient(openrouter.url, None)
+
+    with pytest.raises(LLMError, match="not configured"):
+        await _chat(client)
+    assert openrouter.requests == []